@@ -0,0 +1,220 @@
+"""Admission control for CPU-heavy endpoints.
+
+A single ``AdmissionController`` bounds how many gate attempts and reports
+run at once. ``reserved`` of its slots can only be taken by priority (admin,
+report and photo enrollment) requests, so a burst at the gates cannot starve them. Requests
+that find no free slot wait in a short queue, served round-robin across
+gates so one busy gate cannot hold back the others. A full queue or a wait
+longer than ``max_wait`` fails fast with 503 and a ``Retry-After`` estimate.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, Request
+from app import metrics, settings
+
+# Header a gate uses to identify itself; falls back to the client address
+GATE_ID_HEADER = "x-gate-id"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency with a per-key fair wait queue.
+
+    Args:
+        name: metrics label
+        capacity: concurrent slots
+        reserved: slots only priority requests may use
+        queue_size: waiting (non-priority) requests allowed in total
+        per_key_queue: waiting requests allowed per key (gate)
+        max_wait: seconds a request may wait for a slot
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        capacity: int,
+        reserved: int = 0,
+        queue_size: int = 16,
+        per_key_queue: int = 4,
+        max_wait: float = 2.0,
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.reserved = min(reserved, capacity - 1)
+        self.queue_size = queue_size
+        self.per_key_queue = per_key_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._priority: deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold_seconds = 1.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._priority) + sum(len(w) for w in self._waiters.values())
+
+    def _has_room(self, priority: bool) -> bool:
+        limit = self.capacity if priority else self.capacity - self.reserved
+        return self.in_use < limit
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain."""
+        estimate = self._hold_seconds * (self.queued + 1) / self.capacity
+        return max(1, min(30, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.ADMISSION_REJECTIONS.inc(pool=self.name, reason=reason)
+        return AdmissionRejected(reason, self.retry_after())
+
+    def _update_gauges(self) -> None:
+        metrics.ADMISSION_IN_USE.set(self.in_use, pool=self.name)
+        metrics.ADMISSION_QUEUE_LENGTH.set(self.queued, pool=self.name)
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        if self._priority and self._has_room(priority=True):
+            return self._priority.popleft()
+        if self._waiters and self._has_room(priority=False):
+            # Round-robin: serve the gate that has waited longest for a turn
+            key, waiters = self._waiters.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiters[key] = waiters
+            return waiter
+        return None
+
+    def _release(self) -> None:
+        self.in_use -= 1
+        while (waiter := self._next_waiter()) is not None:
+            # The slot passes straight to the waiter
+            self.in_use += 1
+            waiter.set_result(None)
+        self._update_gauges()
+
+    def _remove_waiter(self, key: str, waiter: asyncio.Future, priority: bool) -> None:
+        if priority:
+            self._priority.remove(waiter)
+            return
+        waiters = self._waiters[key]
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[key]
+
+    async def _acquire(self, key: str, priority: bool) -> None:
+        # Queued requests go first; a free slot is only taken directly when
+        # nobody eligible for it is waiting.
+        if self._has_room(priority) and not self._priority and (priority or not self._waiters):
+            self.in_use += 1
+            metrics.ADMISSION_WAIT_SECONDS.observe(0.0, pool=self.name)
+            self._update_gauges()
+            return
+
+        if not priority:
+            if self.queued >= self.queue_size:
+                raise self._reject("queue_full")
+            if len(self._waiters.get(key, ())) >= self.per_key_queue:
+                raise self._reject("gate_queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        if priority:
+            self._priority.append(waiter)
+        else:
+            self._waiters.setdefault(key, deque()).append(waiter)
+        self._update_gauges()
+
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await asyncio.shield(waiter)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # Granted just as the wait ended; hand the slot on
+                self._release()
+            else:
+                waiter.cancel()
+                self._remove_waiter(key, waiter, priority)
+                self._update_gauges()
+            if isinstance(e, TimeoutError):
+                raise self._reject("timeout")
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, pool=self.name)
+
+    @asynccontextmanager
+    async def slot(self, key: str = "", *, priority: bool = False) -> AsyncIterator[None]:
+        """Holds a slot for the enclosed block.
+
+        Raises:
+            AdmissionRejected: if no slot frees up in time
+        """
+        await self._acquire(key, priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - start
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+            self._release()
+
+
+controller = AdmissionController(
+    "recognition",
+    capacity=settings.ADMISSION_CAPACITY,
+    reserved=settings.ADMISSION_RESERVED,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    per_key_queue=settings.ADMISSION_PER_GATE_QUEUE,
+    max_wait=settings.ADMISSION_MAX_WAIT,
+)
+
+
+def _overloaded(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def gate_id(request: Request) -> str:
+    """The gate a request comes from: its ``X-Gate-Id``, else the client address."""
+    return request.headers.get(GATE_ID_HEADER) or (request.client.host if request.client else "")
+
+
+async def gate_admission(request: Request) -> AsyncIterator[None]:
+    """Dependency holding a gate slot for the duration of the request."""
+    try:
+        async with controller.slot(gate_id(request)):
+            yield
+    except AdmissionRejected as e:
+        raise _overloaded(e)
+
+
+@asynccontextmanager
+async def priority_slot() -> AsyncIterator[None]:
+    """Holds a slot that may be a reserved one for the enclosed block.
+
+    Raises:
+        HTTPException: 503 if no slot frees up in time
+    """
+    try:
+        async with controller.slot(priority=True):
+            yield
+    except AdmissionRejected as e:
+        raise _overloaded(e)
+
+
+async def priority_admission() -> AsyncIterator[None]:
+    """Dependency for admin and report requests, which may use reserved slots."""
+    async with priority_slot():
+        yield
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, Request, Response, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from app.schemas import UserLogin
-from app.users import get_user_manager, cookie_transport, auth_backend
+from app.users import get_user_manager, cookie_transport, auth_backend, user_cache
 
 auth_router = r = APIRouter()
 
@@ -34,6 +34,9 @@ async def login(
     return response
 
 @r.post("/logout")
-def logout(response: Response):
+def logout(request: Request, response: Response):
+    subject = auth_backend.get_strategy().subject(request.cookies.get("session"))
+    if subject is not None:
+        user_cache.invalidate(subject)
     response.delete_cookie("session")
     return {"detail": "Logged out"}
\ No newline at end of file
@@ -4,12 +4,15 @@ from datetime import date, timedelta
 import secrets
 import hashlib
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from app import crud
+from fastapi.concurrency import run_in_threadpool
+from app import crud, enrollment, gallery
+from app.admission import priority_slot
 from app.db import SessionDep
+from app.ingest import read_image_upload
 from app.schemas import EmployeeUpdate, EmployeeCreate, QRCodeBase
 from app.utils import save_photo, generate_qr_and_send_email
 from app.users import current_user
-from app.models import User
+from app.models import Employee, User
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,7 +25,25 @@ logger = logging.getLogger(__name__)
 employees_router = r = APIRouter(prefix="/employees")
 
 
-@r.post("/", status_code=201)
+async def _normalize_photo(photo: UploadFile) -> enrollment.EnrollmentPhoto:
+    """Reads an uploaded reference photo and brings it into canonical form.
+
+    Face detection and encoding take a recognition slot, like reports do.
+
+    Raises:
+        HTTPException: 413 if the upload is too large, 422 if the photo is
+            unusable, 503 if no recognition slot frees up in time
+    """
+    image = await read_image_upload(photo)
+    try:
+        async with priority_slot():
+            return await run_in_threadpool(enrollment.normalize, image)
+    except enrollment.EnrollmentError as e:
+        logger.error("Reference photo rejected: %s", e)
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@r.post("/", status_code=201, response_model=Employee)
 async def create_employee(
     *,
     user: User = Depends(current_user),
@@ -43,6 +64,9 @@ async def create_employee(
             detail="Employee with this email already exists.",
         )
 
+    # Checked before the employee exists, so a rejected photo leaves nothing behind
+    reference = await _normalize_photo(photo)
+
     created_employee = crud.create_employee(session=session, employee=employee)
     logger.info("Employee created with ID: %s", created_employee.id)
     employee_id = created_employee.id
@@ -50,11 +74,12 @@ async def create_employee(
 
     photo_name = f"user_{created_employee.id}.png"
     try:
-        save_photo(photo_name, photo)
+        save_photo(photo_name, reference.data)
         logger.info("Photo saved as: %s for employee_id=%s", photo_name, employee_id)
     except Exception as e:
         logger.exception("Failed to save photo for employee_id=%s: %s", employee_id, e)
         raise HTTPException(status_code=500, detail="Failed to save photo.")
+    gallery.enroll(session, employee_id, reference.encoding)
 
     employee_in = EmployeeUpdate(photo_path=photo_name)
 
@@ -65,7 +90,9 @@ async def create_employee(
     return updated_employee
 
 
-@r.get("/", status_code=200)
+# Table model instances pass response validation as-is and are serialized
+# straight to JSON bytes by pydantic-core
+@r.get("/", status_code=200, response_model=list[Employee])
 def list_employees(*, user: User = Depends(current_user), session: SessionDep):
     logger.info("User %s requested employee list", getattr(user, "email", str(user)))
     employees = crud.list_employees(session=session)
@@ -75,7 +102,7 @@ def list_employees(*, user: User = Depends(current_user), session: SessionDep):
     return employees
 
 
-@r.put("/{employee_id}", status_code=200)
+@r.put("/{employee_id}", status_code=200, response_model=Employee)
 async def update_employee(
     *,
     user: User = Depends(current_user),
@@ -109,9 +136,10 @@ async def update_employee(
         )
 
     if photo is not None:
+        reference = await _normalize_photo(photo)
         photo_name = f"user_{employee_id}.png"
         try:
-            save_photo(photo_name, photo)
+            save_photo(photo_name, reference.data)
             logger.info(
                 "Photo updated and saved as: %s for employee_id=%s",
                 photo_name,
@@ -123,6 +151,7 @@ async def update_employee(
                 "Failed to save updated photo for employee_id=%s: %s", employee_id, e
             )
             raise HTTPException(status_code=500, detail="Failed to save photo.")
+        gallery.enroll(session, employee_id, reference.encoding)
 
     employee = crud.update_employee(
         session=session, employee_id=employee_id, employee_in=employee_in
@@ -141,6 +170,7 @@ async def delete_employee(
         employee_id,
     )
     crud.delete_employee(session=session, employee_id=employee_id)
+    gallery.forget(employee_id)
     logger.info("Employee deleted: %s", employee_id)
 
 
@@ -1,13 +1,28 @@
 # dostaje qr code i twarz i sprawdza i daje access albo no access i zapisuje entrance/wyjsice
 # generowanie raportu + export do pdfa]
+import functools
+import hashlib
 import logging
+import uuid
 from collections import defaultdict
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, Form, UploadFile, HTTPException, BackgroundTasks
-from app import crud
+from fastapi import APIRouter, Depends, Form, Request, UploadFile, HTTPException, BackgroundTasks
+from sqlmodel import Session
+from app import audit, crud, debounce, gallery, metrics, recognition, settings, tracing
+from app.admission import gate_admission, gate_id, priority_admission
 from app.db import SessionDep
-from app.utils import verify_token, verify_face, save_photo, generate_report_pdf, send_report_email
-from app.models import EntryExitRecord, User
+from app.events import bus
+from app.ingest import read_image_upload
+from app.utils import (
+    FrameQualityError,
+    parse_face_hint,
+    verify_token,
+    save_photo,
+    generate_report_pdf,
+    send_report_email,
+)
+from app.models import Employee, EntryExitRecord, QRCode, User
+from app.schemas import ReportResponse
 from app.users import current_active_user
 
 
@@ -22,65 +37,186 @@ logger = logging.getLogger(__name__)
 entries_router = r = APIRouter(prefix="/entries")
 
 
-@r.post("/", status_code=201)
+def _record_denial(*, record: EntryExitRecord, reason: str) -> None:
+    """Queues the denied attempt for the audit log and counts the denial."""
+    record.denial_reason = reason
+    audit.writer.add(record)
+    metrics.GATE_DECISIONS.inc(result="denied", denial_reason=reason)
+    bus.publish(
+        "gate.denied",
+        employee_id=record.employee_id,
+        attempt_id=record.attempt_id,
+        action="entry" if record.is_entry else "exit",
+        reason=reason,
+    )
+
+
+def _grant_body(*, employee_id: int, action: str, is_present: bool, work_time_minutes: int | None) -> dict:
+    return {
+        "message": f"Access granted - {action}",
+        "employee_id": employee_id,
+        "is_present": is_present,
+        "action": action,
+        "work_time_minutes": work_time_minutes,
+    }
+
+
+def _recent_grant(
+    *, session: Session, employee: Employee, qr_code: QRCode | None, qr_code_token: str, gate: str
+) -> debounce.Decision | None:
+    """A grant for the same employee and gate within the debounce window,
+    made by any process; only offered to a valid QR token."""
+    if qr_code is None or not verify_token(qr_code_token, qr_code.token_hash):
+        return None
+    since = datetime.now() - timedelta(seconds=settings.GATE_DEBOUNCE_SECONDS)
+    record = crud.get_recent_grant(session=session, employee_id=employee.id, gate_id=gate, since=since)
+    if record is None:
+        return None
+    work_time = None
+    if not record.is_entry:
+        work_time = crud.get_work_time_record_by_exit(
+            session=session, employee_id=employee.id, exit_time=record.timestamp
+        )
+    return debounce.Decision(
+        201,
+        _grant_body(
+            employee_id=employee.id,
+            action="entry" if record.is_entry else "exit",
+            is_present=employee.is_present,
+            work_time_minutes=work_time.duration_minutes if work_time else None,
+        ),
+    )
+
+
+@r.post("/", status_code=201, dependencies=[Depends(gate_admission, scope="function")])
 async def gate_access(
     *,
+    request: Request,
     session: SessionDep,
     qr_code_payload: str = Form(...),
     photo: UploadFile,
+    face_box: str | None = Form(None),
+    aligned_crop: bool = Form(False),
 ):
     """Handle employee entry/exit at the gate using QR code and face recognition.
     
     If employee is not present (is_present=False), this is an entry attempt.
     If employee is present (is_present=True), this is an exit attempt.
     On successful exit, a WorkTimeRecord is created with the duration.
+
+    A resubmitted attempt (same employee and gate shortly after a grant, or
+    the same Idempotency-Key) gets the earlier decision back.
+
+    A gate that located the face itself sends ``face_box`` (``"x,y,w,h"`` in
+    photo pixels) or ``aligned_crop`` (the photo is a tight face crop), and
+    the server only checks that there is a face there instead of detecting it.
     """
     logger.info("Gate access attempt received.")
 
-    try:
-        employee_id, qr_code_token = qr_code_payload.split(":")
-    except ValueError:
-        logger.error("Invalid QR code payload format.")
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid QR code payload format.",
-        )
-    try:
-        int(employee_id)
-    except ValueError:
-        logger.error("Invalid employee ID in QR code payload.")
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid QR code payload.",
-        )
+    with metrics.stage("qr_parse"):
+        try:
+            employee_id, qr_code_token = qr_code_payload.split(":")
+        except ValueError:
+            logger.error("Invalid QR code payload format.")
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid QR code payload format.",
+            )
+        try:
+            int(employee_id)
+        except ValueError:
+            logger.error("Invalid employee ID in QR code payload.")
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid QR code payload.",
+            )
     
     employee_id_int = int(employee_id)
     logger.info(f"Processing gate access for employee ID: {employee_id}")
-    qr_code = crud.get_active_qr_code(session=session, employee_id=employee_id_int)
-    employee = crud.get_employee(session=session, employee_id=employee_id_int)
+    with metrics.stage("db_lookup"):
+        qr_code = crud.get_active_qr_code(session=session, employee_id=employee_id_int)
+        employee = crud.get_employee(session=session, employee_id=employee_id_int)
 
-    # Determine if this is an entry or exit based on current presence
+    gate = gate_id(request)
+    return await debounce.decide_once(
+        employee_id=employee_id_int,
+        gate_id=gate,
+        credential=hashlib.sha256(qr_code_token.encode()).hexdigest(),
+        request_id=request.headers.get(debounce.REQUEST_ID_HEADER),
+        decide=functools.partial(
+            _decide,
+            session=session,
+            employee=employee,
+            qr_code=qr_code,
+            qr_code_token=qr_code_token,
+            photo=photo,
+            face_box=face_box,
+            aligned_crop=aligned_crop,
+            gate=gate,
+        ),
+        recent_grant=functools.partial(
+            _recent_grant,
+            session=session,
+            employee=employee,
+            qr_code=qr_code,
+            qr_code_token=qr_code_token,
+            gate=gate,
+        ),
+    )
+
+
+async def _decide(
+    *,
+    session: Session,
+    employee: Employee,
+    qr_code: QRCode | None,
+    qr_code_token: str,
+    photo: UploadFile,
+    face_box: str | None,
+    aligned_crop: bool,
+    gate: str,
+) -> dict:
+    """Verifies the attempt, records it and toggles presence if granted."""
+    employee_id_int = employee.id
+
+    # Determine if this is an entry or exit based on current presence; the
+    # passage is only stored if the employee is still in this state
     is_entry = not employee.is_present
+    open_entry_id = employee.open_entry_id
     action_type = "entry" if is_entry else "exit"
-    logger.info(f"This is an {action_type} attempt for employee ID: {employee_id}")
+    logger.info(f"This is an {action_type} attempt for employee ID: {employee_id_int}")
+
+    # Read the upload once; the same buffer backs snapshots and decoding
+    with metrics.stage("ingest"):
+        frame = await read_image_upload(photo)
+    try:
+        face_hint = parse_face_hint(face_box, aligned_crop, frame.width, frame.height)
+    except ValueError as e:
+        logger.error("Invalid face location: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    if face_hint is None:
+        metrics.FACE_LOCATIONS.inc(source="detected")
+    else:
+        metrics.FACE_LOCATIONS.inc(source="aligned_crop" if aligned_crop else "face_box")
 
-    initial_record = EntryExitRecord(
+    # Written only once decided: synchronously if granted, through the
+    # audit writer if denied
+    record = EntryExitRecord(
+        attempt_id=uuid.uuid4().hex,
         employee_id=employee_id_int,
         timestamp=datetime.now(),
         successful=False,
         is_entry=is_entry,
+        gate_id=gate,
     )
-    record = crud.create_entry_exit_record(session=session, record=initial_record)
-    save_photo(f"{action_type}_attempt_{record.id}.png", photo)
-
-    # Reset stream after saving attempt snapshot for downstream processing
-    if hasattr(photo, "file"):
-        photo.file.seek(0)
+    # Link the request trace to the audit record for post-mortems
+    tracing.set_attribute("entry_exit_record.attempt_id", record.attempt_id)
+    with metrics.stage("photo_save"):
+        save_photo(f"{action_type}_attempt_{record.attempt_id}.png", frame)
 
     if employee.photo_path is None:
         logger.error("Employee has no photo for face verification.")
-        record.denial_reason = "User has no photo in the system."
-        crud.update_entry_exit_record(session=session, record=record)
+        _record_denial(record=record, reason="User has no photo in the system.")
         raise HTTPException(
             status_code=404,
             detail="Employee has no photo. Please update profile with a photo.",
@@ -88,71 +224,97 @@ async def gate_access(
 
     if qr_code is None:
         logger.error("No active QR code found for this employee.")
-        record.denial_reason = "User has no active QR code."
-        crud.update_entry_exit_record(session=session, record=record)
+        _record_denial(record=record, reason="User has no active QR code.")
         raise HTTPException(
             status_code=400,
             detail="No active QR code found for this employee.",
         )
 
-    if not verify_token(qr_code_token, qr_code.token_hash):
+    with metrics.stage("token_check"):
+        token_valid = verify_token(qr_code_token, qr_code.token_hash)
+    if not token_valid:
         logger.error("Invalid QR code token provided.")
-        record.denial_reason = "Invalid QR code token."
-        crud.update_entry_exit_record(session=session, record=record)
+        _record_denial(record=record, reason="Invalid QR code token.")
         raise HTTPException(
             status_code=401,
             detail="Invalid QR code token.",
         )
     print("employee photo path:", employee.photo_path)
     # Zamienic photo na camera frame
-    if not verify_face(employee.photo_path, photo):
+    with metrics.stage("gallery"):
+        templates = await gallery.load(session, employee)
+    try:
+        face_match = await recognition.match(templates, frame, face_hint)
+    except recognition.RecognitionUnavailable as e:
+        logger.error("Recognition worker unavailable: %s", e)
+        _record_denial(record=record, reason="Face recognition unavailable.")
+        raise HTTPException(
+            status_code=503,
+            detail="Face recognition is temporarily unavailable.",
+        )
+    except FrameQualityError as e:
+        logger.error("Camera frame rejected by quality gate: %s", e.reason)
+        _record_denial(record=record, reason=e.message)
+        raise HTTPException(
+            status_code=422,
+            detail=e.message,
+        )
+    face_verified = face_match is not None and face_match.distance <= settings.FACE_MATCH_TOLERANCE
+    if not face_verified:
         logger.error("Face verification failed.")
-        record.denial_reason = "Face verification failed."
-        crud.update_entry_exit_record(session=session, record=record)
+        _record_denial(record=record, reason="Face verification failed.")
         raise HTTPException(
             status_code=401,
             detail="Face verification failed.",
         )
 
-    if hasattr(photo, "file"):
-        photo.file.seek(0)
-    save_photo(f"user_{employee.id}.png", photo)
-    
-    # Mark record as successful
-    record.successful = True
-    crud.update_entry_exit_record(session=session, record=record)
-    
-    # Toggle presence status
-    new_presence = crud.toggle_employee_presence(session=session, employee_id=employee_id_int)
-    
-    # If this was an exit (employee was present, now is not), create work time record
-    work_time_record = None
-    if not is_entry:  # This was an exit
-        last_entry = crud.get_last_successful_entry(session=session, employee_id=employee_id_int)
-        if last_entry:
-            work_time_record = crud.create_work_time_record(
-                session=session,
-                employee_id=employee_id_int,
-                entry_time=last_entry.timestamp,
-                exit_time=record.timestamp,
-            )
-            logger.info(
-                f"Work time record created for employee {employee_id}: "
-                f"{work_time_record.duration_minutes} minutes"
+    # Committed with the passage below, so a passage that fails with 409
+    # does not teach the gallery either
+    with metrics.stage("gallery_update"):
+        gallery.learn(session, employee_id_int, face_match)
+
+    with metrics.stage("commit"):
+        record.successful = True
+        try:
+            work_time_record = crud.record_gate_passage(
+                session=session, record=record, open_entry_id=open_entry_id
             )
+        except HTTPException:
+            logger.error("Presence of employee %s changed during the attempt.", employee_id_int)
+            record.successful = False
+            _record_denial(record=record, reason="Presence changed by a concurrent attempt.")
+            raise
+    if work_time_record is not None:
+        logger.info(
+            f"Work time record created for employee {employee_id_int}: "
+            f"{work_time_record.duration_minutes} minutes"
+        )
+    new_presence = is_entry
+
+    metrics.GATE_DECISIONS.inc(result="granted")
+    bus.publish(
+        "gate.granted",
+        employee_id=employee_id_int,
+        attempt_id=record.attempt_id,
+        action=action_type,
+    )
+    bus.publish("presence.changed", employee_id=employee_id_int, is_present=new_presence)
+    logger.info(f"Gate access granted for employee ID: {employee_id_int} ({action_type})")
     
-    logger.info(f"Gate access granted for employee ID: {employee_id} ({action_type})")
-    
-    return {
-        "message": f"Access granted - {action_type}",
-        "employee_id": employee_id_int,
-        "is_present": new_presence,
-        "action": action_type,
-        "work_time_minutes": work_time_record.duration_minutes if work_time_record else None,
-    }
+    return _grant_body(
+        employee_id=employee_id_int,
+        action=action_type,
+        is_present=new_presence,
+        work_time_minutes=work_time_record.duration_minutes if work_time_record else None,
+    )
 
 
-@r.post("/generate-raport", status_code=200)
+@r.post(
+    "/generate-raport",
+    status_code=200,
+    response_model=ReportResponse,
+    dependencies=[Depends(priority_admission, scope="function")],
+)
 async def generate_raport(
     *,
     session: SessionDep,
@@ -167,33 +329,35 @@ async def generate_raport(
     """
     logger.info(f"Report generation requested for last {days} days.")
     
-    # Get all work time records for the period
-    records = crud.get_work_time_records(
-        session=session,
-        timedelta_days=days,
-    )
-    
-    # Aggregate hours per employee
-    employee_hours: dict[int, int] = defaultdict(int)  # employee_id -> total_minutes
-    for record in records:
-        employee_hours[record.employee_id] += record.duration_minutes
-    
-    # Build report data with employee info
-    report_data = []
-    for employee_id, total_minutes in employee_hours.items():
-        employee = crud.get_employee(session=session, employee_id=employee_id)
-        report_data.append({
-            "employee_id": employee_id,
-            "first_name": employee.first_name,
-            "last_name": employee.last_name,
-            "total_hours": total_minutes / 60,  # Convert to hours
-        })
-    
-    # Sort by employee_id
-    report_data.sort(key=lambda x: x["employee_id"])
-    
+    with metrics.REPORT_SECONDS.time(stage="data"):
+        # Get all work time records for the period
+        records = crud.get_work_time_records(
+            session=session,
+            timedelta_days=days,
+        )
+
+        # Aggregate hours per employee
+        employee_hours: dict[int, int] = defaultdict(int)  # employee_id -> total_minutes
+        for record in records:
+            employee_hours[record.employee_id] += record.duration_minutes
+
+        # Build report data with employee info
+        report_data = []
+        for employee_id, total_minutes in employee_hours.items():
+            employee = crud.get_employee(session=session, employee_id=employee_id)
+            report_data.append({
+                "employee_id": employee_id,
+                "first_name": employee.first_name,
+                "last_name": employee.last_name,
+                "total_hours": total_minutes / 60,  # Convert to hours
+            })
+
+        # Sort by employee_id
+        report_data.sort(key=lambda x: x["employee_id"])
+
     # Generate PDF
-    pdf_content = generate_report_pdf(report_data, days)
+    with metrics.REPORT_SECONDS.time(stage="pdf"):
+        pdf_content = generate_report_pdf(report_data, days)
     
     # Send email in background
     background_tasks.add_task(
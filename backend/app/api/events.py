@@ -0,0 +1,47 @@
+import logging
+from collections.abc import AsyncIterator
+from typing import Annotated
+from fastapi import APIRouter, Depends, Header
+from fastapi.sse import EventSourceResponse, ServerSentEvent
+from app.db import SessionDep
+from app.events import bus
+from app.users import current_active_user
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+
+events_router = r = APIRouter(prefix="/events")
+
+
+@r.get("/stream", response_class=EventSourceResponse)
+async def stream_events(
+    *,
+    user: User = Depends(current_active_user),
+    session: SessionDep,
+    last_event_id: Annotated[str | None, Header()] = None,
+) -> AsyncIterator[ServerSentEvent]:
+    """Stream gate decisions and presence changes as server-sent events.
+
+    Reconnecting clients send ``Last-Event-ID`` and receive the events they
+    missed, or a ``reset`` event if those are no longer available.
+    """
+    logger.info(
+        "User %s opened event stream (last_event_id=%s)",
+        getattr(user, "email", str(user)),
+        last_event_id,
+    )
+    # The session was only needed for authentication; release its connection
+    # instead of holding it for the lifetime of the stream
+    session.close()
+
+    subscription = bus.subscribe(last_event_id)
+    try:
+        async for event in subscription:
+            yield ServerSentEvent(
+                id=event.id,
+                event=event.type,
+                data={**event.data, "timestamp": event.timestamp},
+            )
+    finally:
+        bus.unsubscribe(subscription)
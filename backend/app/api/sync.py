@@ -0,0 +1,72 @@
+import hmac
+import logging
+from typing import Annotated
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from app import gate_events, settings, sync
+from app.admission import gate_id
+from app.db import SessionDep
+from app.schemas import GateEventBatch, GateEventBatchResult
+
+logger = logging.getLogger(__name__)
+
+
+sync_router = r = APIRouter(prefix="/sync")
+
+
+def gate_key(x_gate_key: Annotated[str | None, Header()] = None) -> None:
+    """Dependency admitting gate devices with a configured ``X-Gate-Key``."""
+    if not settings.GATE_API_KEYS:
+        raise HTTPException(status_code=403, detail="Gate sync is not enabled.")
+    if x_gate_key is None or not any(
+        hmac.compare_digest(x_gate_key.encode(), key.encode()) for key in settings.GATE_API_KEYS
+    ):
+        raise HTTPException(status_code=401, detail="Invalid gate key.")
+
+
+@r.get("/", status_code=200, dependencies=[Depends(gate_key)])
+def get_sync_feed(
+    *,
+    request: Request,
+    session: SessionDep,
+    since: int | None = None,
+) -> Response:
+    """Return a snapshot of gate data, or the changes after version ``since``.
+
+    msgpack if the client accepts ``application/msgpack``, JSON otherwise.
+    """
+    if since is None:
+        feed = sync.snapshot(session)
+    else:
+        feed = sync.changes_since(session, since)
+    logger.info(
+        "Gate %s synced from version %s to %s (%d employees, full=%s)",
+        gate_id(request),
+        since,
+        feed["version"],
+        len(feed["employees"]),
+        feed["full"],
+    )
+    media_type = sync.MSGPACK if sync.MSGPACK in request.headers.get("accept", "") else "application/json"
+    return Response(sync.encode(feed, media_type), media_type=media_type)
+
+
+@r.post("/events", status_code=200, response_model=GateEventBatchResult, dependencies=[Depends(gate_key)])
+def upload_gate_events(
+    *,
+    request: Request,
+    session: SessionDep,
+    batch: GateEventBatch,
+) -> GateEventBatchResult:
+    """Store decisions a gate made on its own, and update presence from them.
+
+    Safe to resend: events already stored are reported as duplicates.
+    """
+    if len(batch.events) > settings.GATE_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.GATE_BATCH_MAX_EVENTS} events per batch.",
+        )
+    gate = gate_id(request)
+    results = gate_events.ingest(session, gate=gate, events=batch.events)
+    logger.info("Gate %s uploaded %d events", gate, len(batch.events))
+    return GateEventBatchResult(results=results)
@@ -0,0 +1,35 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException
+from app import tracing
+from app.db import SessionDep
+from app.users import current_user
+from app.models import EntryExitRecord, User
+
+logger = logging.getLogger(__name__)
+
+
+traces_router = r = APIRouter(prefix="/traces")
+
+
+@r.get("/", status_code=200)
+def find_traces(
+    *,
+    session: SessionDep,
+    user: User = Depends(current_user),
+    entry_exit_record_id: int,
+):
+    """Return the spans of the gate request that created an entry/exit record."""
+    logger.info(
+        "User %s requested trace for entry_exit_record_id=%s",
+        getattr(user, "email", str(user)),
+        entry_exit_record_id,
+    )
+    record = session.get(EntryExitRecord, entry_exit_record_id)
+    if record is not None and record.attempt_id:
+        spans = tracing.get_exporter().find_traces("entry_exit_record.attempt_id", record.attempt_id)
+    else:
+        # Traces recorded before attempts had an attempt_id
+        spans = tracing.get_exporter().find_traces("entry_exit_record.id", entry_exit_record_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No trace found for this record.")
+    return spans
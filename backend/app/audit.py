@@ -0,0 +1,321 @@
+"""Write-behind buffer for audit-only entry/exit records.
+
+Denied gate attempts do not affect any later decision, so instead of an
+insert-commit per attempt they are handed to ``AuditWriter.add`` and written
+in batches: every ``AUDIT_FLUSH_INTERVAL`` seconds, or sooner once
+``AUDIT_BATCH_SIZE`` records are waiting. Batches go in as one multi-row
+INSERT, or through ``COPY`` on Postgres. Successful attempts, presence and
+work time stay synchronous in the gate endpoint.
+
+Each record is also appended to a spill file in ``AUDIT_SPILL_DIR`` before
+``add`` returns, and the file is deleted once its batch has committed. Spill
+files are locked by the process writing them; at startup, files left behind
+by a process that died are inserted (skipping attempts already in the
+database) and removed.
+
+A failed batch is retried on the next flush, ahead of newer ones. A batch the
+database rejects, or one that failed ``AUDIT_MAX_ATTEMPTS`` times, is moved
+to a ``dead-*.jsonl`` file in ``AUDIT_SPILL_DIR`` for an operator to look at,
+so it cannot hold up the batches behind it. Recovery at startup does the same
+with rejected files and leaves the others for the next start.
+"""
+import fcntl
+import io
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine, insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlmodel import Session, select
+
+from app import metrics, settings
+from app.db import engine, is_shared
+from app.models import EntryExitRecord
+from app.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = tuple(name for name in EntryExitRecord.model_fields if name != "id")
+
+
+def _encode(row: dict[str, Any]) -> str:
+    return json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n"
+
+
+def _decode(line: str) -> dict[str, Any]:
+    row = json.loads(line)
+    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+def _is_rejected(error: Exception) -> bool:
+    """True if the database refused the rows, so writing them again cannot work."""
+    return (
+        isinstance(error, DBAPIError)
+        and not isinstance(error, (OperationalError, InterfaceError))
+        and not error.connection_invalidated
+    )
+
+
+def _csv_field(value: Any) -> str:
+    # Unquoted empty is NULL in COPY's CSV format; everything else is quoted
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class _SpillFile:
+    """An append-only JSON-lines file, locked for as long as it is open."""
+
+    def __init__(self, path: Path, fd: int):
+        self.path = path
+        self._fd = fd
+
+    @classmethod
+    def create(cls, path: Path) -> "_SpillFile":
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return cls(path, fd)
+
+    @classmethod
+    def claim(cls, path: Path) -> "_SpillFile | None":
+        """Locks an existing file, or returns None if a live process holds it."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        if os.fstat(fd).st_nlink == 0:
+            # Recovered and removed by another process meanwhile
+            os.close(fd)
+            return None
+        return cls(path, fd)
+
+    def append(self, line: str) -> None:
+        os.write(self._fd, line.encode())
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+        os.close(self._fd)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class AuditWriter:
+    """Batches ``EntryExitRecord`` inserts, backed by spill files.
+
+    Until ``start`` is called, and always for an in-memory database, records
+    are written immediately.
+
+    Args:
+        engine: database to write to
+        spill_dir: directory for spill files
+        batch_size: records that trigger a flush before the interval is up
+        flush_interval: seconds between flushes
+        max_attempts: failed writes before a batch is moved to a dead-letter file
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        *,
+        spill_dir: Path,
+        batch_size: int,
+        flush_interval: float,
+        max_attempts: int = 5,
+    ):
+        self.engine = engine
+        self.spill_dir = Path(spill_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._rows: list[dict[str, Any]] = []
+        self._spill: _SpillFile | None = None
+        # Batches whose write failed and their failed attempts, retried first
+        # on the next flush
+        self._failed: list[tuple[_SpillFile | None, list[dict[str, Any]], int]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._segments = itertools.count()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def buffered(self) -> int:
+        return len(self._rows) + sum(len(rows) for _, rows, _ in self._failed)
+
+    @traced()
+    def add(self, record: EntryExitRecord) -> None:
+        """Queues ``record`` for insertion; it is on disk when this returns."""
+        row = record.model_dump(include=set(_COLUMNS))
+        if self._thread is None:
+            self._write([row])
+            return
+        with self._lock:
+            if self._spill is None:
+                self._spill = _SpillFile.create(
+                    self.spill_dir / f"audit-{os.getpid()}-{next(self._segments)}.jsonl"
+                )
+            self._spill.append(_encode(row))
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        metrics.AUDIT_BUFFERED.set(self.buffered)
+        if full:
+            self._wake.set()
+
+    def _copy(self, session: Session, rows: list[dict[str, Any]]) -> None:
+        data = io.StringIO()
+        for row in rows:
+            data.write(",".join(_csv_field(row[column]) for column in _COLUMNS) + "\n")
+        data.seek(0)
+        cursor = session.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {EntryExitRecord.__tablename__} ({', '.join(_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            data,
+        )
+
+    def _write(self, rows: list[dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        with Session(self.engine) as session:
+            if self.engine.dialect.name == "postgresql":
+                method = "copy"
+                self._copy(session, rows)
+            else:
+                method = "insert"
+                for i in range(0, len(rows), self.batch_size):
+                    session.execute(insert(EntryExitRecord).values(rows[i : i + self.batch_size]))
+            session.commit()
+        metrics.AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        metrics.AUDIT_RECORDS_WRITTEN.inc(len(rows), method=method)
+
+    def flush(self) -> int:
+        """Writes everything buffered; returns the number of records written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                spill, self._spill = self._spill, None
+            batches = self._failed + ([(spill, rows, 0)] if rows else [])
+            self._failed = []
+            written = 0
+            for i, (spill, batch, attempts) in enumerate(batches):
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    metrics.AUDIT_FLUSH_ERRORS.inc()
+                    attempts += 1
+                    if attempts < self.max_attempts and not _is_rejected(e):
+                        logger.exception("Writing %d audit records failed; will retry", len(batch))
+                        self._failed = [(spill, batch, attempts)] + batches[i + 1 :]
+                        break
+                    path = self._dead_letter(batch)
+                    logger.exception("Writing %d audit records failed; moved them to %s", len(batch), path)
+                else:
+                    written += len(batch)
+                if spill is not None:
+                    spill.discard()
+        metrics.AUDIT_BUFFERED.set(self.buffered)
+        return written
+
+    def _dead_letter(self, rows: list[dict[str, Any]]) -> Path:
+        path = self.spill_dir / f"dead-{os.getpid()}-{next(self._segments)}.jsonl"
+        with path.open("a") as file:
+            file.writelines(_encode(row) for row in rows)
+        metrics.AUDIT_RECORDS_DEAD_LETTERED.inc(len(rows))
+        return path
+
+    def recover(self) -> int:
+        """Inserts records from spill files left by processes that died."""
+        recovered = 0
+        for path in sorted(self.spill_dir.glob("audit-*.jsonl")):
+            spill = _SpillFile.claim(path)
+            if spill is None:
+                continue
+            rows = []
+            for line in path.read_text().splitlines():
+                try:
+                    rows.append(_decode(line))
+                except (ValueError, KeyError):
+                    # A line cut short by the crash
+                    logger.warning("Skipping unreadable line in %s", path)
+            try:
+                rows = self._not_yet_written(rows)
+                if rows:
+                    self._write(rows)
+            except Exception as e:
+                metrics.AUDIT_FLUSH_ERRORS.inc()
+                if not _is_rejected(e):
+                    # Left for the next start; the file is unlocked on close
+                    logger.exception("Recovering audit records from %s failed; will retry", path)
+                    spill.close()
+                    continue
+                dead = self._dead_letter(rows)
+                logger.exception("Recovering audit records from %s failed; moved them to %s", path, dead)
+                spill.discard()
+                continue
+            spill.discard()
+            recovered += len(rows)
+        if recovered:
+            logger.info("Recovered %d audit records from %s", recovered, self.spill_dir)
+        return recovered
+
+    def _not_yet_written(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        # The process may have died between commit and deleting the file
+        attempt_ids = [row["attempt_id"] for row in rows if row.get("attempt_id")]
+        if not attempt_ids:
+            return rows
+        with Session(self.engine) as session:
+            stmt = select(EntryExitRecord.attempt_id).where(EntryExitRecord.attempt_id.in_(attempt_ids))
+            written = set(session.exec(stmt).all())
+        return [row for row in rows if row.get("attempt_id") not in written]
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> None:
+        """Recovers spill files and starts the flush thread (once per process)."""
+        if self._thread is not None or not is_shared(self.engine):
+            return
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.recover()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the flush thread and writes what is left."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+
+writer = AuditWriter(
+    engine,
+    spill_dir=settings.AUDIT_SPILL_DIR,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    max_attempts=settings.AUDIT_MAX_ATTEMPTS,
+)
@@ -1,11 +1,15 @@
 from typing import Sequence, Any
+from sqlalchemy import not_, update
 from sqlmodel import Session, select, false, desc
 from datetime import date, datetime
 from fastapi import HTTPException
-from app.models import Employee, QRCode, EntryExitRecord, WorkTimeRecord
+from app.invalidation import mark
+from app.models import Employee, FaceTemplate, QRCode, EntryExitRecord, WorkTimeRecord
 from app.schemas import EmployeeBase, EmployeeUpdate, EmployeeCreate, QRCodeBase
+from app.tracing import traced
 
 
+@traced()
 def create_employee(*, session: Session, employee: EmployeeCreate) -> Employee:
     """Create a new employee.
 
@@ -18,11 +22,14 @@ def create_employee(*, session: Session, employee: EmployeeCreate) -> Employee:
     """
     obj = Employee.model_validate(employee)
     session.add(obj)
+    session.flush()
+    mark(session, "employee", obj.id)
     session.commit()
     session.refresh(obj)
     return obj
 
 
+@traced()
 def list_employees(*, session: Session)-> Sequence[Employee]:
     """List all employees.
 
@@ -36,6 +43,7 @@ def list_employees(*, session: Session)-> Sequence[Employee]:
     return session.exec(stmt).all()
 
 
+@traced()
 def get_employee(*, session: Session, employee_id: int) -> Employee:
     """Get an employee by ID.
 
@@ -55,6 +63,7 @@ def get_employee(*, session: Session, employee_id: int) -> Employee:
         raise HTTPException(404, "Employee not found")
     return employee
 
+@traced()
 def get_employee_by_email(*, session: Session, email: str) -> Employee | None:
     """Get an employee by ID.
 
@@ -73,6 +82,7 @@ def get_employee_by_email(*, session: Session, email: str) -> Employee | None:
     return employee
 
 
+@traced()
 def update_employee(*, session: Session, employee_id: int, employee_in: EmployeeUpdate) -> Employee:
     """Update an employee.
 
@@ -89,12 +99,14 @@ def update_employee(*, session: Session, employee_id: int, employee_in: Employee
         exclude_unset=True, exclude_none=True
     )
     employee.sqlmodel_update(update_data)
+    mark(session, "employee", employee_id)
     session.commit()
     session.refresh(employee)
     return employee
 
 
 
+@traced()
 def delete_employee(*, session: Session, employee_id: int) -> None:
     """Delete an employee.
 
@@ -104,9 +116,73 @@ def delete_employee(*, session: Session, employee_id: int) -> None:
     """
     employee: Employee = get_employee(session=session, employee_id=employee_id)
     session.delete(employee)
+    mark(session, "employee", employee_id)
+    mark(session, "qr_code", employee_id)
+    mark(session, "face_template", employee_id)
     session.commit()
 
 
+@traced()
+def list_face_templates(*, session: Session, employee_id: int) -> Sequence[FaceTemplate]:
+    """List an employee's face templates, oldest first.
+
+    Args:
+        session: database session
+        employee_id: employee ID
+
+    Returns:
+        Sequence[FaceTemplate]: the employee's gallery
+    """
+    stmt = (
+        select(FaceTemplate)
+        .where(FaceTemplate.employee_id == employee_id)
+        .order_by(FaceTemplate.created_at)
+    )
+    return session.exec(stmt).all()
+
+
+@traced()
+def replace_face_templates(
+    *, session: Session, employee_id: int, template: FaceTemplate | None
+) -> None:
+    """Replace an employee's whole gallery, e.g. after a new enrollment photo.
+
+    Args:
+        session: database session
+        employee_id: employee ID
+        template: the new enrollment template, or None to leave it empty
+    """
+    for old in list_face_templates(session=session, employee_id=employee_id):
+        session.delete(old)
+    if template is not None:
+        session.add(template)
+    mark(session, "face_template", employee_id)
+    session.commit()
+
+
+@traced()
+def add_face_template(*, session: Session, template: FaceTemplate, max_size: int) -> None:
+    """Add a gate template, dropping the oldest gate templates beyond ``max_size``.
+
+    The enrollment template is never dropped. Nothing is committed: the
+    template goes in with the caller's transaction.
+
+    Args:
+        session: database session
+        template: new template
+        max_size: gallery size limit, including the enrollment template
+    """
+    session.add(template)
+    session.flush()
+    templates = list_face_templates(session=session, employee_id=template.employee_id)
+    gate_templates = [t for t in templates if t.source != "enrollment"]
+    excess = len(templates) - max_size
+    for old in gate_templates[: max(excess, 0)]:
+        session.delete(old)
+    mark(session, "face_template", template.employee_id)
+
+
+@traced()
 def get_active_qr_code(*, session: Session, employee_id: int) -> QRCode | None:
     stmt = select(QRCode).where(
         QRCode.employee_id == employee_id,
@@ -118,32 +194,39 @@ def get_active_qr_code(*, session: Session, employee_id: int) -> QRCode | None:
     qr_code: QRCode | None = session.exec(stmt).one_or_none()
     return qr_code
 
+@traced()
 def revode_qr_code(*, session: Session, employee_id: int) -> None:
     qr_code = get_active_qr_code(session=session, employee_id=employee_id)
     if qr_code is None:
         return
     qr_code.is_revoked = True
+    mark(session, "qr_code", employee_id)
     session.commit()
 
+@traced()
 def create_qr_code(*, session: Session, qr_code: QRCodeBase) -> QRCode:
     # Deactivate existing active QR codes for the employee
     revode_qr_code(session=session, employee_id=qr_code.employee_id) # Doesnt work?
     obj = QRCode.model_validate(qr_code)
     session.add(obj)
+    mark(session, "qr_code", qr_code.employee_id)
     session.commit()
     session.refresh(obj)
     return obj
 
+@traced()
 def create_entry_exit_record(*, session: Session, record: EntryExitRecord) -> EntryExitRecord:
     session.add(record)
     session.commit()
     session.refresh(record)
     return record
 
+@traced()
 def update_entry_exit_record(*, session: Session, record: EntryExitRecord) -> None:
     session.add(record)
     session.commit()
 
+@traced()
 def get_entry_exit_records(
     *,
     session: Session,
@@ -171,8 +254,9 @@ def get_entry_exit_records(
     return records
 
 
+@traced()
 def toggle_employee_presence(*, session: Session, employee_id: int) -> bool:
-    """Toggle employee presence status.
+    """Toggle employee presence status in a single UPDATE.
     
     Args:
         session: database session
@@ -180,15 +264,84 @@ def toggle_employee_presence(*, session: Session, employee_id: int) -> bool:
         
     Returns:
         bool: New presence status (True = entered, False = exited)
+
+    Raises:
+        HTTPException: 404 if employee not found
     """
-    employee = get_employee(session=session, employee_id=employee_id)
-    employee.is_present = not employee.is_present
-    session.add(employee)
+    stmt = (
+        update(Employee)
+        .where(Employee.id == employee_id)
+        .values(is_present=not_(Employee.is_present), open_entry_id=None)
+        .returning(Employee.is_present)
+    )
+    is_present = session.execute(stmt).scalar_one_or_none()
+    if is_present is None:
+        session.rollback()
+        raise HTTPException(404, "Employee not found")
     session.commit()
-    session.refresh(employee)
-    return employee.is_present
+    return is_present
+
+
+@traced()
+def record_gate_passage(
+    *, session: Session, record: EntryExitRecord, open_entry_id: int | None
+) -> WorkTimeRecord | None:
+    """Store a granted gate passage and move the employee in or out.
+
+    Presence changes with a conditional UPDATE that only matches if the
+    employee is still in the state the gate decided on, so concurrent
+    attempts cannot both go through. An exit closes the work session opened
+    by ``open_entry_id``.
+
+    Args:
+        session: database session
+        record: the granted entry or exit
+        open_entry_id: the employee's ``open_entry_id`` when the attempt was read
+
+    Returns:
+        WorkTimeRecord or None: the closed work session, for exits
+
+    Raises:
+        HTTPException: 409 if another attempt changed presence meanwhile
+    """
+    session.add(record)
+    session.flush()
+    stmt = (
+        update(Employee)
+        .where(
+            Employee.id == record.employee_id,
+            Employee.is_present == (not record.is_entry),
+            Employee.open_entry_id == open_entry_id
+            if open_entry_id is not None
+            else Employee.open_entry_id.is_(None),
+        )
+        .values(is_present=record.is_entry, open_entry_id=record.id if record.is_entry else None)
+        .returning(Employee.id)
+    )
+    if session.execute(stmt).scalar_one_or_none() is None:
+        session.rollback()
+        raise HTTPException(409, "Presence was changed by another attempt. Please try again.")
+
+    work_time_record = None
+    if not record.is_entry:
+        if open_entry_id is not None:
+            entry = session.get(EntryExitRecord, open_entry_id)
+        else:
+            # Present since before work sessions were tracked on the employee
+            entry = get_last_successful_entry(session=session, employee_id=record.employee_id)
+        if entry is not None:
+            work_time_record = _work_time_record(
+                employee_id=record.employee_id, entry_time=entry.timestamp, exit_time=record.timestamp
+            )
+            session.add(work_time_record)
+    session.commit()
+    session.refresh(record)
+    if work_time_record is not None:
+        session.refresh(work_time_record)
+    return work_time_record
 
 
+@traced()
 def get_last_successful_entry(
     *, session: Session, employee_id: int
 ) -> EntryExitRecord | None:
@@ -213,6 +366,58 @@ def get_last_successful_entry(
     return session.exec(stmt).first()
 
 
+@traced()
+def get_recent_grant(
+    *, session: Session, employee_id: int, gate_id: str, since: datetime
+) -> EntryExitRecord | None:
+    """Get the latest successful attempt of an employee at a gate after ``since``.
+
+    Args:
+        session: database session
+        employee_id: employee ID
+        gate_id: gate identifier
+        since: earliest timestamp to consider
+
+    Returns:
+        EntryExitRecord or None if there was no such attempt
+    """
+    stmt = (
+        select(EntryExitRecord)
+        .where(
+            EntryExitRecord.employee_id == employee_id,
+            EntryExitRecord.gate_id == gate_id,
+            EntryExitRecord.successful == True,
+            EntryExitRecord.timestamp >= since,
+        )
+        .order_by(desc(EntryExitRecord.timestamp))
+    )
+    return session.exec(stmt).first()
+
+
+@traced()
+def get_work_time_record_by_exit(
+    *, session: Session, employee_id: int, exit_time: datetime
+) -> WorkTimeRecord | None:
+    """Get the work time record closed by the exit at ``exit_time``."""
+    stmt = select(WorkTimeRecord).where(
+        WorkTimeRecord.employee_id == employee_id,
+        WorkTimeRecord.exit_time == exit_time,
+    )
+    return session.exec(stmt).first()
+
+
+def _work_time_record(*, employee_id: int, entry_time: datetime, exit_time: datetime) -> WorkTimeRecord:
+    duration = exit_time - entry_time
+    return WorkTimeRecord(
+        employee_id=employee_id,
+        date=entry_time.date(),
+        entry_time=entry_time,
+        exit_time=exit_time,
+        duration_minutes=int(duration.total_seconds() // 60),
+    )
+
+
+@traced()
 def create_work_time_record(
     *, session: Session, employee_id: int, entry_time: datetime, exit_time: datetime
 ) -> WorkTimeRecord:
@@ -227,22 +432,14 @@ def create_work_time_record(
     Returns:
         WorkTimeRecord: created work time record
     """
-    duration = exit_time - entry_time
-    duration_minutes = int(duration.total_seconds() // 60)
-    
-    record = WorkTimeRecord(
-        employee_id=employee_id,
-        date=entry_time.date(),
-        entry_time=entry_time,
-        exit_time=exit_time,
-        duration_minutes=duration_minutes,
-    )
+    record = _work_time_record(employee_id=employee_id, entry_time=entry_time, exit_time=exit_time)
     session.add(record)
     session.commit()
     session.refresh(record)
     return record
 
 
+@traced()
 def get_work_time_records(
     *,
     session: Session,
@@ -1,15 +1,42 @@
 from collections.abc import Generator
 from typing import Annotated
 from app.models import Employee, User
+from sqlalchemy import Engine
 from sqlmodel import SQLModel, create_engine, Session
 from fastapi_users_db_sync_sqlalchemy import SQLAlchemyUserDatabase
 from fastapi import Depends
-from app import settings
+from app import metrics, settings
 
 engine = create_engine(settings.DATABASE_URL)
 
+
+def _pool_stats() -> dict[tuple[str, ...], float]:
+    pool = engine.pool
+    stats = {}
+    for state in ("size", "checkedin", "checkedout", "overflow"):
+        getter = getattr(pool, state, None)
+        if callable(getter):
+            stats[(state,)] = float(getter())
+    return stats
+
+
+metrics.Gauge(
+    "db_pool_connections",
+    "Database connection pool statistics by state.",
+    ("state",),
+    callback=_pool_stats,
+)
+
+def is_shared(engine: Engine) -> bool:
+    """False for an in-memory SQLite database, which no other connection sees."""
+    return not (engine.dialect.name == "sqlite" and engine.url.database in (None, "", ":memory:"))
+
+
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    # app.partitions imports this module for the engine
+    from app.partitions import create_tables
+
+    create_tables(engine)
 
 def get_db() -> Generator[Session, None, None]:
     with Session(engine) as session:
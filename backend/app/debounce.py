@@ -0,0 +1,146 @@
+"""Debouncing and idempotent replay of gate decisions.
+
+Gates resubmit the same attempt after a double scan or a network retry. A
+resubmission should get the first answer back, without rerunning face
+recognition or toggling presence a second time. ``decide_once`` looks for a
+previous decision under two keys:
+
+* ``(employee, gate, credential, request id)`` when the gate sends an
+  ``Idempotency-Key`` header: any decision other than a conflict or a 5xx is
+  replayed for ``GATE_IDEMPOTENCY_SECONDS``.
+* ``(employee, gate, credential)``: a grant is replayed for
+  ``GATE_DEBOUNCE_SECONDS``. Denials are not, since a fresh frame may well
+  pass.
+
+The credential is a digest of the QR token the attempt presented, so only
+an attempt with the same token as the granted one gets the grant back; one
+that knows just the employee id is decided afresh.
+
+A resubmission that arrives while the first attempt is still being decided
+waits for its outcome. The cache is per process; the gate endpoint also
+checks the database for a recent grant handled by another worker.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app import metrics, settings
+
+REQUEST_ID_HEADER = "idempotency-key"
+# Set on responses that repeat an earlier decision
+REPLAYED_HEADER = "x-gate-replayed"
+
+
+@dataclass(frozen=True)
+class Decision:
+    status_code: int
+    content: dict[str, Any]
+
+    def response(self) -> JSONResponse:
+        return JSONResponse(self.content, status_code=self.status_code, headers={REPLAYED_HEADER: "true"})
+
+
+class DecisionCache:
+    """Recent decisions by key, plus the decisions still being made."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, tuple[float, Decision]] = OrderedDict()
+        self._pending: dict[Hashable, asyncio.Future[Decision | None]] = {}
+
+    async def get(self, key: Hashable) -> Decision | None:
+        """Returns the decision stored under ``key``, waiting if one is being made."""
+        pending = self._pending.get(key)
+        if pending is not None:
+            decision = await asyncio.shield(pending)
+            if decision is not None:
+                return decision
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def put(self, key: Hashable, decision: Decision, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, decision)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def claim(self, key: Hashable) -> None:
+        """Marks a decision for ``key`` as in progress."""
+        if key not in self._pending:
+            self._pending[key] = asyncio.get_running_loop().create_future()
+
+    def resolve(self, key: Hashable, decision: Decision | None, ttl: float) -> None:
+        """Ends the claim on ``key``, storing ``decision`` unless it is None."""
+        pending = self._pending.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(decision)
+        if decision is not None:
+            self.put(key, decision, ttl)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+cache = DecisionCache(settings.GATE_DECISION_CACHE_SIZE)
+
+
+async def decide_once(
+    *,
+    employee_id: int,
+    gate_id: str,
+    credential: str,
+    request_id: str | None,
+    decide: Callable[[], Awaitable[dict[str, Any]]],
+    recent_grant: Callable[[], Decision | None],
+) -> dict[str, Any] | JSONResponse:
+    """Runs ``decide`` unless a resubmitted attempt can be answered from before.
+
+    Args:
+        credential: digest of the presented QR token, part of every key
+        decide: makes the decision; returns the grant body or raises HTTPException
+        recent_grant: looks up a grant made within the debounce window by
+            another process, or returns None
+    """
+    grant_key = ("grant", employee_id, gate_id, credential)
+    request_key = ("request", employee_id, gate_id, credential, request_id) if request_id else None
+
+    if request_key is not None and (decision := await cache.get(request_key)) is not None:
+        metrics.GATE_REPLAYS.inc(source="request_id")
+        return decision.response()
+    if (decision := await cache.get(grant_key)) is not None:
+        metrics.GATE_REPLAYS.inc(source="debounce")
+        return decision.response()
+    if (decision := recent_grant()) is not None:
+        metrics.GATE_REPLAYS.inc(source="database")
+        cache.put(grant_key, decision, settings.GATE_DEBOUNCE_SECONDS)
+        return decision.response()
+
+    cache.claim(grant_key)
+    if request_key is not None:
+        cache.claim(request_key)
+    grant = denial = None
+    try:
+        body = await decide()
+        grant = Decision(201, body)
+        return body
+    except HTTPException as e:
+        # Conflicts, overload and outages are worth retrying; replay only real
+        # decisions
+        if e.status_code < 500 and e.status_code != 409:
+            denial = Decision(e.status_code, {"detail": e.detail})
+        raise
+    finally:
+        cache.resolve(grant_key, grant, settings.GATE_DEBOUNCE_SECONDS)
+        if request_key is not None:
+            cache.resolve(request_key, grant or denial, settings.GATE_IDEMPOTENCY_SECONDS)
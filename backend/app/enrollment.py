@@ -0,0 +1,74 @@
+"""Normalization of employee reference photos at enrollment.
+
+An uploaded photo is stored in a canonical form, so every later use of it
+decodes a small, upright image:
+
+* the EXIF orientation is applied to the pixels (phone photos are often
+  stored sideways with a rotation tag that OpenCV and dlib handle
+  differently, or not at all),
+* the photo is downscaled so its longer side is at most
+  ``ENROLLMENT_MAX_SIDE`` pixels and stored as RGB PNG,
+* it must show exactly one face of at least ``ENROLLMENT_MIN_FACE_PX``
+  pixels, and that face's encoding becomes the enrollment template.
+
+Photos that fail a check are rejected with ``EnrollmentError`` instead of
+being stored and failing every gate attempt later.
+"""
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+
+from app import settings
+from app.ingest import IngestedImage
+from app.lazy import lazy_module
+
+face_recognition = lazy_module("face_recognition")
+np = lazy_module("numpy")
+
+
+class EnrollmentError(Exception):
+    """Reference photo rejected at enrollment; the message says why."""
+
+
+@dataclass(frozen=True)
+class EnrollmentPhoto:
+    """Canonical reference photo and the encoding of its face."""
+
+    data: bytes  # PNG
+    width: int
+    height: int
+    encoding: np.ndarray
+
+
+def normalize(image: IngestedImage) -> EnrollmentPhoto:
+    """Turns an uploaded photo into the canonical reference photo.
+
+    Raises:
+        EnrollmentError: if the photo is unreadable, or does not show exactly
+            one large enough face
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(image.data)) as opened:
+            photo = ImageOps.exif_transpose(opened).convert("RGB")
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        raise EnrollmentError("Photo is not a readable image.")
+    if max(photo.size) > settings.ENROLLMENT_MAX_SIDE:
+        photo.thumbnail((settings.ENROLLMENT_MAX_SIDE, settings.ENROLLMENT_MAX_SIDE), Image.LANCZOS)
+
+    rgb = np.asarray(photo)
+    faces = face_recognition.face_locations(rgb)
+    if not faces:
+        raise EnrollmentError("No face found in the photo.")
+    if len(faces) > 1:
+        raise EnrollmentError("More than one face in the photo.")
+    top, right, bottom, left = faces[0]
+    if max(right - left, bottom - top) < settings.ENROLLMENT_MIN_FACE_PX:
+        raise EnrollmentError("Face in the photo is too small.")
+    encoding = face_recognition.face_encodings(rgb, faces)[0]
+
+    buffer = io.BytesIO()
+    photo.save(buffer, format="PNG")
+    return EnrollmentPhoto(data=buffer.getvalue(), width=photo.width, height=photo.height, encoding=encoding)
@@ -0,0 +1,296 @@
+"""Publish/subscribe for gate and presence events.
+
+``gate_access`` publishes an event per decision and presence change; each
+dashboard connection to ``/api/events/stream`` holds a ``Subscription``.
+Subscriber queues are bounded: a client that falls ``EVENT_CLIENT_BUFFER``
+events behind is disconnected and resumes from its ``Last-Event-ID`` once
+it reconnects, which replays from the last ``EVENT_HISTORY_SIZE`` events.
+
+On Postgres, events reach the dashboards of every worker and replica:
+publishing takes the next id from the ``event_sequence`` row and sends the
+event with ``NOTIFY <EVENT_CHANNEL>`` in the same transaction, and each
+process's listener thread hands the events to its subscribers in commit
+order. Event ids are then the same in every process, so a client may resume
+on any of them, from events received since that process last connected.
+
+Without Postgres, events stay in the process that published them, and a
+dashboard only sees the gate attempts its own worker handled; run a single
+HTTP worker (``WEB_CONCURRENCY=1``) there.
+
+Event ids are ``<epoch>-<sequence>``, where the epoch identifies this process
+(``shared`` on Postgres). A resume id from another process, or one older than
+the history, is answered with a ``reset`` event telling the client to reload
+its full state.
+"""
+import asyncio
+import dataclasses
+import itertools
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Engine, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlmodel import Session, select
+
+from app import metrics, settings
+from app.db import engine, is_shared
+from app.invalidation import PostgresTransport, Transport
+from app.models import EventSequence
+
+logger = logging.getLogger(__name__)
+
+# Epoch of ids numbered by the database, which every process shares
+SHARED_EPOCH = "shared"
+
+# Upper bound on how long the listener thread waits before checking for stop
+_POLL_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class Event:
+    id: str
+    type: str
+    data: dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+class Subscription:
+    """Bounded queue of events for one client, filled from any thread."""
+
+    def __init__(self, maxsize: int):
+        # Unbounded underneath so the end-of-stream marker always fits;
+        # the bound is enforced in _offer
+        self._queue: asyncio.Queue[Event | None] = asyncio.Queue()
+        self._maxsize = maxsize
+        self._loop = asyncio.get_running_loop()
+        self.overflowed = False
+        # Sequence of the last event the client has; later deliveries of it
+        # or older ones are skipped
+        self.after = 0
+
+    def _offer(self, event: Event | None) -> None:
+        if self.overflowed:
+            return
+        if self._queue.qsize() >= self._maxsize:
+            self.overflowed = True
+            metrics.EVENT_SUBSCRIBERS_DROPPED.inc()
+            # Ends the stream once the reader drains what it has
+            event = None
+        self._queue.put_nowait(event)
+
+    def offer(self, event: Event) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._offer(event)
+        else:
+            self._loop.call_soon_threadsafe(self._offer, event)
+
+    def __aiter__(self) -> AsyncIterator[Event]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Event]:
+        while (event := await self._queue.get()) is not None:
+            yield event
+
+
+class EventBus:
+    """Delivers published events to the subscribers of this process.
+
+    Args:
+        history_size: events kept for resuming clients
+        client_buffer: events a client may fall behind
+        engine: database holding the ``event_sequence`` row (with a transport)
+        transport: carries events to every process, or None to keep them in this one
+    """
+
+    def __init__(
+        self,
+        history_size: int,
+        client_buffer: int,
+        *,
+        engine: Engine | None = None,
+        transport: Transport | None = None,
+    ):
+        self.engine = engine
+        self.transport = transport
+        self.epoch = SHARED_EPOCH if transport is not None else secrets.token_hex(4)
+        self.client_buffer = client_buffer
+        self._history: deque[Event] = deque(maxlen=history_size)
+        self._sequence = itertools.count(1)
+        # Every event after this one is in the history or was trimmed from it
+        self._baseline = 0
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def publish(self, type: str, **data: Any) -> Event:
+        metrics.EVENTS_PUBLISHED.inc(type=type)
+        if self.transport is not None:
+            return self._send(type, data)
+        with self._lock:
+            event = Event(id=f"{self.epoch}-{next(self._sequence)}", type=type, data=data)
+            subscribers = self._append(event)
+        self._offer(subscribers, event)
+        return event
+
+    def _send(self, type: str, data: dict[str, Any]) -> Event:
+        """Sends an event to every process; this one gets it from its listener."""
+        event = Event(id=f"{self.epoch}-0", type=type, data=data)
+        try:
+            with Session(self.engine) as session:
+                # The row lock also orders the notifications by sequence
+                sequence = session.execute(
+                    update(EventSequence)
+                    .where(EventSequence.id == 1)
+                    .values(value=EventSequence.value + 1)
+                    .returning(EventSequence.value)
+                ).scalar_one_or_none()
+                if sequence is None:
+                    session.add(EventSequence(value=1))
+                    sequence = 1
+                event = dataclasses.replace(event, id=f"{self.epoch}-{sequence}")
+                payloads = [json.dumps(dataclasses.asdict(event), separators=(",", ":"))]
+                self.transport.prepare(session, payloads)
+                session.commit()
+        except SQLAlchemyError:
+            # The gate decision is already stored; only dashboards miss it
+            logger.exception("Publishing a %s event failed", type)
+            return event
+        self.transport.committed(payloads)
+        return event
+
+    def receive(self, payload: str) -> None:
+        """Delivers an event sent by any process (this one included)."""
+        event = Event(**json.loads(payload))
+        with self._lock:
+            subscribers = self._append(event)
+        self._offer(subscribers, event)
+
+    def _append(self, event: Event) -> list[Subscription]:
+        self._history.append(event)
+        return list(self._subscribers)
+
+    def _offer(self, subscribers: list[Subscription], event: Event) -> None:
+        sequence = self._sequence_of(event.id)
+        for subscription in subscribers:
+            if sequence > subscription.after:
+                subscription.offer(event)
+
+    @staticmethod
+    def _sequence_of(event_id: str) -> int:
+        return int(event_id.rsplit("-", 1)[1])
+
+    def _replay(self, last_event_id: str) -> list[Event] | None:
+        """Returns the events after ``last_event_id``, or None if some are gone."""
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        last = int(sequence)
+        oldest = self._sequence_of(self._history[0].id) if self._history else self._baseline + 1
+        if oldest > last + 1:
+            return None
+        missed = [e for e in self._history if self._sequence_of(e.id) > last]
+        return missed if len(missed) <= self.client_buffer else None
+
+    def subscribe(self, last_event_id: str | None = None) -> Subscription:
+        """Registers a subscriber, replaying events after ``last_event_id``."""
+        subscription = Subscription(self.client_buffer)
+        with self._lock:
+            if last_event_id:
+                missed = self._replay(last_event_id)
+                if missed is None:
+                    latest = self._history[-1].id if self._history else f"{self.epoch}-{self._baseline}"
+                    missed = [Event(id=latest, type="reset")]
+                    subscription.after = self._sequence_of(latest)
+                else:
+                    subscription.after = self._sequence_of(last_event_id)
+                for event in missed:
+                    subscription._offer(event)
+            self._subscribers.add(subscription)
+        metrics.EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+        metrics.EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def _restart_history(self) -> None:
+        """Forgets the history, whose events before now may have gaps."""
+        with Session(self.engine) as session:
+            baseline = session.exec(select(EventSequence.value)).first() or 0
+        with self._lock:
+            self._history.clear()
+            self._baseline = baseline
+
+    def _seed(self) -> None:
+        try:
+            with Session(self.engine) as session:
+                if session.get(EventSequence, 1) is None:
+                    session.add(EventSequence())
+                    session.commit()
+        except IntegrityError:
+            pass  # Another process created it
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            listener = None
+            try:
+                listener = self.transport.listen()
+                # Events sent while not listening are lost
+                self._restart_history()
+                backoff = 1.0
+                while not self._stop.is_set():
+                    for payload in listener.wait(_POLL_SECONDS):
+                        self.receive(payload)
+            except Exception:
+                logger.exception("Event stream listener failed; reconnecting in %.0fs", backoff)
+                metrics.EVENT_LISTENER_ERRORS.inc()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+    def start(self) -> None:
+        """Starts the listener thread (once per process, after any fork)."""
+        if self.transport is None:
+            if settings.WEB_CONCURRENCY > 1 and is_shared(self.engine):
+                logger.warning(
+                    "Event stream runs without Postgres; dashboards only see events of their own "
+                    "worker. Set WEB_CONCURRENCY=1 to have them see every gate."
+                )
+            return
+        if self._thread is not None:
+            return
+        self._seed()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=_POLL_SECONDS * 5)
+        self._thread = None
+
+
+bus = EventBus(
+    settings.EVENT_HISTORY_SIZE,
+    settings.EVENT_CLIENT_BUFFER,
+    engine=engine,
+    transport=PostgresTransport(engine, settings.EVENT_CHANNEL) if engine.dialect.name == "postgresql" else None,
+)
@@ -0,0 +1,354 @@
+"""Memory-mapped store of face galleries, shared by the worker processes.
+
+Reading every gallery from the database (or decoding enrollment photos) in
+each worker is slow and keeps one copy per process. The index keeps all
+galleries in ``FACE_INDEX_DIR``, in two append-only files per generation:
+
+* ``<generation>.emb``: the encodings, one row of 128 ``FACE_INDEX_DTYPE``
+  values each, opened with ``numpy.memmap`` so that workers share the pages;
+* ``<generation>.idx``: one record per row with the employee id, the
+  version of that employee's gallery and a tombstone flag.
+
+``CURRENT`` names the generation in use. A gallery update appends the whole
+new gallery under the next version, and the latest version of an employee
+wins; removing an employee appends a tombstone. Opening the index reads only
+the side index, 16 bytes per row, so it takes well under a second for 100k
+employees; encodings are paged in as they are matched. Processes pick up
+rows appended by others on their next lookup.
+
+Once superseded rows make up ``FACE_INDEX_COMPACT_RATIO`` of the file, the
+writer copies the live rows into a new generation and points ``CURRENT`` at
+it. The database stays the source of truth: the directory can be deleted at
+any time and fills up again as galleries are loaded.
+
+The files outlive the database they were filled from (a reset or restore
+reuses employee ids), so a process starts out trusting none of the stored
+galleries. ``get`` answers for an employee only once the process has
+written that employee's gallery, which ``gallery.load`` does with what it
+read from the database; an unchanged gallery is not written again. From
+then on, updates by other processes are picked up from the files, and
+invalidation (``evict``, ``clear``) withdraws the trust.
+"""
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from app.lazy import lazy_module
+
+np = lazy_module("numpy")
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SIZE = 128
+TOMBSTONE = 1
+
+# Compaction is not worth it for small files
+_MIN_COMPACT_ROWS = 1024
+# Employees updated since the side index was last sorted; above this it is
+# sorted again
+_OVERLAY_LIMIT = 4096
+# Rows copied at a time when compacting
+_COMPACT_CHUNK = 65536
+
+
+def _record_dtype() -> np.dtype:
+    return np.dtype([("employee_id", "<i8"), ("version", "<i4"), ("flags", "<i4")])
+
+
+@dataclass(frozen=True)
+class _Entry:
+    version: int
+    deleted: bool
+    positions: np.ndarray
+
+
+class FaceIndex:
+    """Galleries by employee id, stored in ``directory``.
+
+    Args:
+        directory: where the index files live; created on first write
+        dtype: ``"float32"`` or ``"float16"`` for stored encodings
+        compact_ratio: share of superseded rows that triggers compaction
+    """
+
+    def __init__(self, directory: Path, *, dtype: str = "float32", compact_ratio: float = 0.5):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported face index dtype: {dtype!r}")
+        self.directory = Path(directory)
+        self.dtype = dtype
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._current_key: tuple[int, int] | None = None
+        self._generation: int | None = None
+        self._idx_file = None
+        self._emb_file = None
+        self._chunks: list[np.ndarray] = []
+        self._rows = 0
+        self._matrix: np.ndarray | None = None
+        # Latest block of every employee as of the last sort, ordered by id
+        self._ids = self._positions = self._versions = self._flags = None
+        # Latest blocks appended since
+        self._overlay: dict[int, _Entry] = {}
+        self._live = 0
+        # Employees whose stored gallery this process checked against the
+        # database (by writing it) since it last changed there
+        self._trusted: set[int] = set()
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    @property
+    def live(self) -> int:
+        return self._live
+
+    def _path(self, generation: int, suffix: str) -> Path:
+        return self.directory / f"{generation:08d}.{suffix}"
+
+    def _row_bytes(self) -> int:
+        return ENCODING_SIZE * np.dtype(self.dtype).itemsize
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / "lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _close_files(self) -> None:
+        for f in (self._idx_file, self._emb_file):
+            if f is not None:
+                f.close()
+        self._idx_file = self._emb_file = self._matrix = None
+
+    def _reset(self) -> None:
+        self._close_files()
+        self._generation = None
+        self._chunks = []
+        self._rows = self._live = 0
+        empty = np.empty(0, dtype=np.int64)
+        self._ids = self._positions = self._versions = self._flags = empty
+        self._overlay = {}
+
+    def _refresh(self) -> None:
+        """Catches up with ``CURRENT`` and rows appended since the last call."""
+        current = self.directory / "CURRENT"
+        try:
+            st = os.stat(current)
+        except FileNotFoundError:
+            if self._current_key is not None or self._ids is None:
+                self._reset()
+                self._current_key = None
+            return
+        key = (st.st_ino, st.st_mtime_ns)
+        if key != self._current_key:
+            generation = int(current.read_text())
+            self._reset()
+            try:
+                self._idx_file = open(self._path(generation, "idx"), "rb")
+                self._emb_file = open(self._path(generation, "emb"), "rb")
+            except FileNotFoundError:
+                # Compacted again between reading CURRENT and opening
+                self._reset()
+                return
+            self._generation = generation
+            self._current_key = key
+        self._read_tail()
+
+    def _read_tail(self) -> None:
+        record_size = _record_dtype().itemsize
+        rows = os.fstat(self._idx_file.fileno()).st_size // record_size
+        if rows <= self._rows:
+            return
+        start = self._rows
+        data = os.pread(self._idx_file.fileno(), (rows - start) * record_size, start * record_size)
+        self._chunks.append(np.frombuffer(data, dtype=_record_dtype()))
+        self._rows = rows
+        self._matrix = np.memmap(self._emb_file, dtype=self.dtype, mode="r", shape=(rows, ENCODING_SIZE))
+        if start == 0 or len(self._overlay) + (rows - start) > _OVERLAY_LIMIT:
+            self._sort()
+        else:
+            self._apply(self._chunks[-1], start)
+
+    def _sort(self) -> None:
+        """Finds the latest block of every employee with one sort of the side index."""
+        started = time.perf_counter()
+        records = np.concatenate(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+        self._chunks = [records]
+        order = np.lexsort((records["version"], records["employee_id"]))
+        ids = records["employee_id"][order]
+        versions = records["version"][order]
+        first = np.r_[True, ids[1:] != ids[:-1]]
+        last = np.r_[first[1:], True]
+        group = np.cumsum(first) - 1
+        keep = versions == versions[last][group]
+        self._ids = ids[keep]
+        self._positions = order[keep]
+        self._versions = versions[keep]
+        self._flags = records["flags"][self._positions]
+        self._overlay = {}
+        self._live = int(np.count_nonzero((self._flags & TOMBSTONE) == 0))
+        logger.debug("Sorted %d face index rows in %.3fs", len(records), time.perf_counter() - started)
+
+    def _apply(self, records: np.ndarray, start: int) -> None:
+        """Adds appended blocks to the overlay."""
+        blocks: dict[int, tuple[int, int, list[int]]] = {}
+        for offset, record in enumerate(records.tolist()):
+            employee_id, version, flags = record
+            block = blocks.get(employee_id)
+            if block is None or block[0] != version:
+                blocks[employee_id] = block = (version, flags, [])
+            block[2].append(start + offset)
+        for employee_id, (version, flags, positions) in blocks.items():
+            previous = self._lookup(employee_id)
+            if previous is not None and not previous.deleted:
+                self._live -= len(previous.positions)
+            deleted = bool(flags & TOMBSTONE)
+            if not deleted:
+                self._live += len(positions)
+            self._overlay[employee_id] = _Entry(version, deleted, np.asarray(positions, dtype=np.int64))
+
+    def _lookup(self, employee_id: int) -> _Entry | None:
+        entry = self._overlay.get(employee_id)
+        if entry is not None:
+            return entry
+        lo = np.searchsorted(self._ids, employee_id, side="left")
+        hi = np.searchsorted(self._ids, employee_id, side="right")
+        if lo == hi:
+            return None
+        return _Entry(int(self._versions[lo]), bool(self._flags[lo] & TOMBSTONE), self._positions[lo:hi])
+
+    def open(self) -> None:
+        """Loads the side index now instead of on the first lookup."""
+        with self._lock:
+            self._refresh()
+
+    def get(self, employee_id: int) -> np.ndarray | None:
+        """Returns the employee's gallery as an (n, 128) float32 array.
+
+        None if the index has no gallery for the employee or this process
+        does not trust it; an empty array if the employee was removed.
+        """
+        with self._lock:
+            if employee_id not in self._trusted:
+                return None
+            self._refresh()
+            entry = self._lookup(employee_id)
+            if entry is None:
+                return None
+            if entry.deleted:
+                return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+            return np.asarray(self._matrix[entry.positions], dtype=np.float32)
+
+    def put(self, employee_id: int, encodings: np.ndarray) -> bool:
+        """Stores the employee's whole gallery; an empty one removes the employee.
+
+        Returns:
+            bool: whether anything was written (False if the index already
+            had the same gallery)
+        """
+        encodings = np.asarray(encodings, dtype=self.dtype).reshape(-1, ENCODING_SIZE)
+        with self._lock, self._file_lock():
+            self._trusted.add(employee_id)
+            self._refresh()
+            entry = self._lookup(employee_id)
+            if len(encodings) == 0:
+                if entry is None or entry.deleted:
+                    return False
+                encodings = np.zeros((1, ENCODING_SIZE), dtype=self.dtype)
+                flags = TOMBSTONE
+            else:
+                if entry is not None and not entry.deleted and np.array_equal(self._matrix[entry.positions], encodings):
+                    return False
+                flags = 0
+            records = np.zeros(len(encodings), dtype=_record_dtype())
+            records["employee_id"] = employee_id
+            records["version"] = entry.version + 1 if entry is not None else 1
+            records["flags"] = flags
+            self._append(records, encodings)
+            self._refresh()
+            if self._rows >= _MIN_COMPACT_ROWS and self._rows - self._live > self.compact_ratio * self._rows:
+                self._compact()
+            return True
+
+    def remove(self, employee_id: int) -> bool:
+        return self.put(employee_id, np.empty((0, ENCODING_SIZE)))
+
+    def _append(self, records: np.ndarray, encodings: np.ndarray) -> None:
+        if self._generation is None:
+            self._write_generation(1, np.empty(0, dtype=_record_dtype()), iter(()))
+            self._refresh()
+        record_size = _record_dtype().itemsize
+        with open(self._path(self._generation, "idx"), "r+b") as idx, open(
+            self._path(self._generation, "emb"), "r+b"
+        ) as emb:
+            # Drops whatever a writer that died mid-append left behind
+            rows = os.fstat(idx.fileno()).st_size // record_size
+            idx.truncate(rows * record_size)
+            emb.truncate(rows * self._row_bytes())
+            # Encodings first: readers only look at rows in the side index
+            emb.seek(0, os.SEEK_END)
+            emb.write(encodings.tobytes())
+            emb.flush()
+            idx.seek(0, os.SEEK_END)
+            idx.write(records.tobytes())
+
+    def _write_generation(self, generation: int, records: np.ndarray, encodings: Iterator[np.ndarray]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self._path(generation, "emb"), "wb") as emb:
+            for chunk in encodings:
+                emb.write(np.asarray(chunk, dtype=self.dtype).tobytes())
+        self._path(generation, "idx").write_bytes(records.tobytes())
+        tmp = self.directory / "CURRENT.tmp"
+        tmp.write_text(str(generation))
+        os.replace(tmp, self.directory / "CURRENT")
+
+    def compact(self) -> None:
+        """Rewrites the live rows into a new generation."""
+        with self._lock, self._file_lock():
+            self._compact()
+
+    def _compact(self) -> None:
+        self._refresh()
+        if self._rows == 0:
+            return
+        self._sort()
+        live = (self._flags & TOMBSTONE) == 0
+        positions = self._positions[live]
+        records = np.zeros(len(positions), dtype=_record_dtype())
+        records["employee_id"] = self._ids[live]
+        records["version"] = self._versions[live]
+        matrix, old, rows = self._matrix, self._generation, self._rows
+        chunks = (matrix[positions[i : i + _COMPACT_CHUNK]] for i in range(0, len(positions), _COMPACT_CHUNK))
+        self._write_generation(old + 1, records, chunks)
+        for suffix in ("idx", "emb"):
+            self._path(old, suffix).unlink(missing_ok=True)
+        logger.info("Compacted face index from %d to %d rows", rows, len(records))
+        self._refresh()
+
+    def evict(self, employee_id: str) -> None:
+        """Distrusts the stored gallery of an employee changed elsewhere."""
+        with self._lock:
+            self._trusted.discard(int(employee_id))
+
+    def clear(self) -> None:
+        """Distrusts every stored gallery until it has been written again."""
+        with self._lock:
+            self._trusted.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_files()
+            self._current_key = None
+            self._ids = None
@@ -0,0 +1,134 @@
+"""Per-employee face template galleries.
+
+An employee is recognised against up to ``FACE_GALLERY_SIZE`` face
+encodings instead of a single reference photo. The gallery starts with the
+encoding of the enrollment photo, made when the photo is uploaded (see
+``app/enrollment.py``). Confident gate matches add the frame's encoding, at
+most once per ``FACE_GALLERY_UPDATE_INTERVAL``. Once the gallery is full, the
+oldest gate template makes room, so the gallery follows gradual changes in
+appearance. The enrollment template is kept, so the gallery cannot drift
+away from the enrolled face.
+
+Employees enrolled before galleries existed get their enrollment template
+on their first gate attempt.
+
+With a database other processes can see, galleries are read from the shared
+``face_index`` file and only go to the database when the index has none or
+another process changed them since.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+from app import crud, invalidation, settings
+from app.db import engine, is_shared
+from app.face_index import FaceIndex
+from app.lazy import lazy_module
+from app.models import Employee, FaceTemplate
+from app.utils.face import FaceMatch, encode_face
+from app.utils.files import _get_upload_path
+
+np = lazy_module("numpy")
+face_recognition = lazy_module("face_recognition")
+
+ENCODING_SIZE = 128
+
+# None for an in-memory database, whose galleries are gone on restart
+index = (
+    FaceIndex(
+        settings.FACE_INDEX_DIR,
+        dtype=settings.FACE_INDEX_DTYPE,
+        compact_ratio=settings.FACE_INDEX_COMPACT_RATIO,
+    )
+    if is_shared(engine)
+    else None
+)
+if index is not None:
+    invalidation.register("face_template", evict=index.evict, clear=index.clear)
+
+
+def to_array(templates: list[FaceTemplate]) -> np.ndarray:
+    """Stacks template encodings into an (n, 128) float32 array."""
+    if not templates:
+        return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+    return np.frombuffer(b"".join(t.encoding for t in templates), dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+
+def _template(employee_id: int, encoding: np.ndarray, *, quality: float, source: str) -> FaceTemplate:
+    return FaceTemplate(
+        employee_id=employee_id,
+        encoding=np.asarray(encoding, dtype=np.float32).tobytes(),
+        quality=quality,
+        source=source,
+        created_at=datetime.now(),
+    )
+
+
+def encode_file(photo_path: str) -> np.ndarray | None:
+    """Encodes the face in a stored enrollment photo (None if there is none)."""
+    return encode_face(face_recognition.load_image_file(_get_upload_path(photo_path)))
+
+
+def enroll(session: Session, employee_id: int, encoding: np.ndarray | None) -> None:
+    """Starts the employee's gallery over from a new enrollment encoding."""
+    template = None
+    if encoding is not None:
+        template = _template(employee_id, encoding, quality=1.0, source="enrollment")
+    crud.replace_face_templates(session=session, employee_id=employee_id, template=template)
+    if index is not None:
+        index.put(employee_id, to_array([template] if template is not None else []))
+
+
+def forget(employee_id: int) -> None:
+    """Drops a deleted employee's gallery from the index."""
+    if index is not None:
+        index.remove(employee_id)
+
+
+async def load(session: Session, employee: Employee) -> np.ndarray:
+    """Returns the employee's gallery as an (n, 128) array.
+
+    Encodes the enrollment photo first if the employee has no templates yet.
+    """
+    if index is not None:
+        cached = index.get(employee.id)
+        if cached is not None and len(cached):
+            return cached
+    templates = list(crud.list_face_templates(session=session, employee_id=employee.id))
+    if not templates and employee.photo_path is not None:
+        encoding = await run_in_threadpool(encode_file, employee.photo_path)
+        if encoding is not None:
+            enroll(session, employee.id, encoding)
+            templates = list(crud.list_face_templates(session=session, employee_id=employee.id))
+    encodings = to_array(templates)
+    if index is not None:
+        await run_in_threadpool(index.put, employee.id, encodings)
+    return encodings
+
+
+def learn(session: Session, employee_id: int, match: FaceMatch) -> bool:
+    """Adds a granted frame's encoding to the gallery if the match was
+    confident and the gallery was not updated recently.
+
+    The template is only added to ``session``; it is stored when the caller
+    commits the gate passage, and dropped with it if the passage rolls back.
+    The committed ``face_template`` mark evicts the employee from the index.
+
+    Returns:
+        bool: whether a template was added
+    """
+    if match.distance > settings.FACE_GALLERY_UPDATE_DISTANCE:
+        return False
+    templates = crud.list_face_templates(session=session, employee_id=employee_id)
+    latest = max((t.created_at for t in templates), default=None)
+    if latest is not None and datetime.now() - latest < timedelta(seconds=settings.FACE_GALLERY_UPDATE_INTERVAL):
+        return False
+    crud.add_face_template(
+        session=session,
+        template=_template(employee_id, match.encoding, quality=1.0 - match.distance, source="gate"),
+        max_size=settings.FACE_GALLERY_SIZE,
+    )
+    return True
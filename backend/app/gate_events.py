@@ -0,0 +1,205 @@
+"""Bulk ingestion of decisions that gates made on their own.
+
+Gates working from the sync feed (``app/sync.py``) upload their decisions in
+batches. ``ingest`` stores a batch in one transaction with a few bulk
+statements, whatever its size:
+
+* Events are identified by their ``client_event_id``, which becomes the
+  record's ``attempt_id``. Events stored before, or repeated in the batch,
+  are reported as duplicates, so a gate can resend a batch it got no answer
+  for.
+* Each employee's events are applied in timestamp order, starting from the
+  presence stored on the employee. A granted entry of an absent employee
+  opens a work session and a granted exit of a present one closes it, just
+  as ``crud.record_gate_passage`` does online.
+* Granted events that contradict that state, or are older than the
+  employee's latest stored passage, are kept for the audit trail as
+  unsuccessful attempts and do not change presence.
+
+The employee rows are locked for the transaction (on Postgres), so a batch
+and online attempts for the same employee take turns.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, update
+from sqlmodel import Session, select
+
+from app import crud, metrics, settings
+from app.events import bus
+from app.models import Employee, EntryExitRecord, WorkTimeRecord
+from app.schemas import GateEvent, GateEventResult
+from app.utils import save_photo
+
+
+@dataclass
+class _Presence:
+    is_present: bool
+    # (record id or None if inserted by this batch, attempt id, timestamp)
+    open_entry: tuple[int | None, str | None, datetime] | None
+    latest: datetime | None
+    changed: bool = False
+
+
+def _presence(session: Session, employees: list[Employee]) -> dict[int, _Presence]:
+    ids = [employee.id for employee in employees]
+    latest = dict(
+        session.exec(
+            select(EntryExitRecord.employee_id, func.max(EntryExitRecord.timestamp))
+            .where(EntryExitRecord.employee_id.in_(ids), EntryExitRecord.successful == True)
+            .group_by(EntryExitRecord.employee_id)
+        ).all()
+    )
+    open_ids = [e.open_entry_id for e in employees if e.is_present and e.open_entry_id is not None]
+    open_times = dict(
+        session.exec(
+            select(EntryExitRecord.id, EntryExitRecord.timestamp).where(EntryExitRecord.id.in_(open_ids))
+        ).all()
+    ) if open_ids else {}
+
+    states = {}
+    for employee in employees:
+        open_entry = None
+        if employee.is_present:
+            if employee.open_entry_id in open_times:
+                open_entry = (employee.open_entry_id, None, open_times[employee.open_entry_id])
+            else:
+                # Present since before work sessions were tracked on the employee
+                entry = crud.get_last_successful_entry(session=session, employee_id=employee.id)
+                if entry is not None:
+                    open_entry = (entry.id, None, entry.timestamp)
+        states[employee.id] = _Presence(employee.is_present, open_entry, latest.get(employee.id))
+    return states
+
+
+def _apply(state: _Presence, event: GateEvent) -> str | None:
+    """Moves ``state`` by a granted event; returns why it did not, if so."""
+    if state.latest is not None and event.timestamp <= state.latest:
+        return "Older than the latest stored passage."
+    if event.is_entry == state.is_present:
+        return "Already present." if event.is_entry else "Not present."
+    state.latest = event.timestamp
+    state.is_present = event.is_entry
+    state.open_entry = (None, event.client_event_id, event.timestamp) if event.is_entry else None
+    state.changed = True
+    return None
+
+
+def ingest(session: Session, *, gate: str, events: list[GateEvent]) -> list[GateEventResult]:
+    """Stores a batch of gate events; returns one result per event, in order."""
+    results: list[GateEventResult | None] = [None] * len(events)
+
+    def resolve(i: int, status: str, reason: str | None = None) -> None:
+        results[i] = GateEventResult(client_event_id=events[i].client_event_id, status=status, reason=reason)
+
+    latest_allowed = datetime.now() + timedelta(seconds=settings.GATE_EVENT_MAX_SKEW)
+    seen: set[str] = set()
+    for i, event in enumerate(events):
+        if event.client_event_id in seen:
+            resolve(i, "duplicate")
+        elif event.timestamp > latest_allowed:
+            resolve(i, "rejected", "Timestamp is in the future.")
+        seen.add(event.client_event_id)
+
+    pending = [i for i in range(len(events)) if results[i] is None]
+    employee_ids = sorted({events[i].employee_id for i in pending})
+    # Locked in id order, so concurrent batches cannot deadlock
+    employees = session.exec(
+        select(Employee).where(Employee.id.in_(employee_ids)).order_by(Employee.id).with_for_update()
+    ).all()
+    stored = set(
+        session.exec(
+            select(EntryExitRecord.attempt_id).where(
+                EntryExitRecord.attempt_id.in_([events[i].client_event_id for i in pending])
+            )
+        ).all()
+    )
+    states = _presence(session, employees)
+
+    by_employee: dict[int, list[int]] = defaultdict(list)
+    for i in pending:
+        event = events[i]
+        if event.employee_id not in states:
+            resolve(i, "rejected", "Unknown employee.")
+        elif event.client_event_id in stored:
+            resolve(i, "duplicate")
+        else:
+            by_employee[event.employee_id].append(i)
+
+    records: list[dict] = []
+    closed: list[tuple[int, tuple[int | None, str | None, datetime], datetime]] = []
+    for employee_id, indexes in by_employee.items():
+        state = states[employee_id]
+        for i in sorted(indexes, key=lambda i: events[i].timestamp):
+            event = events[i]
+            record = {
+                "attempt_id": event.client_event_id,
+                "gate_id": gate,
+                "employee_id": employee_id,
+                "timestamp": event.timestamp,
+                "successful": event.successful,
+                "is_entry": event.is_entry,
+                "denial_reason": event.denial_reason,
+            }
+            records.append(record)
+            if not event.successful:
+                resolve(i, "recorded")
+                continue
+            open_entry = state.open_entry
+            reason = _apply(state, event)
+            if reason is not None:
+                # Not a passage: reports and debounce must not count it
+                record["successful"] = False
+                record["denial_reason"] = f"Granted offline, not applied: {reason}"
+                resolve(i, "recorded", reason)
+                continue
+            if not event.is_entry and open_entry is not None:
+                closed.append((employee_id, open_entry, event.timestamp))
+            resolve(i, "applied")
+
+    record_ids: dict[str, int] = {}
+    if records:
+        stmt = insert(EntryExitRecord).returning(EntryExitRecord.id, sort_by_parameter_order=True)
+        ids = session.execute(stmt, records).scalars().all()
+        record_ids = {record["attempt_id"]: id for record, id in zip(records, ids)}
+    if closed:
+        session.execute(
+            insert(WorkTimeRecord),
+            [
+                {
+                    "employee_id": employee_id,
+                    "date": entry_time.date(),
+                    "entry_time": entry_time,
+                    "exit_time": exit_time,
+                    "duration_minutes": int((exit_time - entry_time).total_seconds() // 60),
+                }
+                for employee_id, (_, _, entry_time), exit_time in closed
+            ],
+        )
+    changed = {employee_id: state for employee_id, state in states.items() if state.changed}
+    if changed:
+        session.execute(
+            update(Employee),
+            [
+                {
+                    "id": employee_id,
+                    "is_present": state.is_present,
+                    "open_entry_id": None
+                    if state.open_entry is None
+                    else state.open_entry[0] or record_ids[state.open_entry[1]],
+                }
+                for employee_id, state in changed.items()
+            ],
+        )
+    session.commit()
+
+    for i, event in enumerate(events):
+        if event.snapshot is not None and results[i].status in ("applied", "recorded"):
+            action = "entry" if event.is_entry else "exit"
+            save_photo(f"{action}_attempt_{event.client_event_id}.png", event.snapshot)
+    for employee_id, state in changed.items():
+        bus.publish("presence.changed", employee_id=employee_id, is_present=state.is_present)
+    for result in results:
+        metrics.GATE_BATCH_EVENTS.inc(status=result.status)
+    return results
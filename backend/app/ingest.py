@@ -0,0 +1,175 @@
+"""Upload ingestion for camera frames and employee photos.
+
+Uploads are read once into a single buffer that is shared by snapshot saving
+and decoding. Byte and pixel limits are enforced while reading, so oversized
+uploads are rejected before they are fully buffered or decoded.
+"""
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import settings
+from app.lazy import lazy_module
+
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+CHUNK_SIZE = 256 * 1024
+# Image headers are probed only within the first MiB of an upload
+PROBE_LIMIT = 1024 * 1024
+# Allowance for the multipart envelope and text form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def _decode_flag(reduction: int) -> int:
+    return {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+    }[reduction]
+
+
+def _probe_dimensions(data: bytes | bytearray) -> tuple[int, int] | None:
+    """Returns (width, height) read from the image header, without decoding."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class IngestedImage:
+    """Raw upload bytes plus the dimensions from the image header.
+
+    ``width`` and ``height`` are 0 when the header could not be parsed.
+    """
+
+    data: bytes
+    width: int = 0
+    height: int = 0
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IngestedImage":
+        width, height = _probe_dimensions(data) or (0, 0)
+        return cls(data=data, width=width, height=height)
+
+    @property
+    def reduction(self) -> int:
+        """Downscale factor applied while decoding (1, 2 or 4)."""
+        longest = max(self.width, self.height)
+        target = settings.FRAME_DECODE_TARGET_SIDE
+        if longest >= 4 * target:
+            return 4
+        if longest >= 2 * target:
+            return 2
+        return 1
+
+    def decode(self) -> np.ndarray | None:
+        """Decodes the image to a BGR array at the reduced resolution."""
+        if not self.data:
+            return None
+        file_bytes = np.frombuffer(self.data, dtype=np.uint8)
+        return cv2.imdecode(file_bytes, _decode_flag(self.reduction))
+
+
+async def read_image_upload(
+    upload: UploadFile,
+    *,
+    max_bytes: int | None = None,
+    max_pixels: int | None = None,
+) -> IngestedImage:
+    """Reads an uploaded image once, enforcing byte and pixel limits.
+
+    Args:
+        upload: uploaded file
+        max_bytes: byte limit, defaults to ``settings.MAX_UPLOAD_BYTES``
+        max_pixels: pixel limit, defaults to ``settings.MAX_UPLOAD_PIXELS``
+
+    Raises:
+        HTTPException: 413 if the upload exceeds a limit
+
+    Returns:
+        IngestedImage: upload bytes and header dimensions
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    max_pixels = settings.MAX_UPLOAD_PIXELS if max_pixels is None else max_pixels
+
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large.")
+
+    await upload.seek(0)
+    buffer = bytearray()
+    dimensions: tuple[int, int] | None = None
+    while chunk := await upload.read(CHUNK_SIZE):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail="Uploaded file is too large.")
+        if dimensions is None and len(buffer) - len(chunk) < PROBE_LIMIT:
+            dimensions = _probe_dimensions(buffer)
+            if dimensions is not None and dimensions[0] * dimensions[1] > max_pixels:
+                raise HTTPException(
+                    status_code=413, detail="Uploaded image has too many pixels."
+                )
+
+    if dimensions is None:
+        dimensions = _probe_dimensions(buffer)
+        if dimensions is not None and dimensions[0] * dimensions[1] > max_pixels:
+            raise HTTPException(
+                status_code=413, detail="Uploaded image has too many pixels."
+            )
+
+    width, height = dimensions or (0, 0)
+    return IngestedImage(data=bytes(buffer), width=width, height=height)
+
+
+class UploadLimitMiddleware:
+    """Rejects upload requests whose body exceeds ``max_body_bytes``.
+
+    Declared ``Content-Length`` values are checked before the body is read;
+    chunked bodies are counted while streaming and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, *, max_body_bytes: int, path_prefixes: tuple[str, ...]):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT")
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_body_bytes:
+                    response = JSONResponse(
+                        {"detail": "Request body is too large."}, status_code=413
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise HTTPException(
+                        status_code=413, detail="Request body is too large."
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
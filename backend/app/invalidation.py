@@ -0,0 +1,372 @@
+"""Cache invalidation across HTTP worker processes and replicas.
+
+Modules with an in-process cache register how to evict from it::
+
+    invalidator.register("user", evict=user_cache.invalidate, clear=user_cache.clear)
+
+and ``crud`` mutations mark what they change on their session::
+
+    mark(session, "employee", employee.id)
+
+When the session commits, the same transaction bumps the entity's row in
+``cache_version`` and, on Postgres, sends ``NOTIFY <CACHE_INVALIDATION_CHANNEL>``
+with the entity, keys and new version. Entities no cache is registered for
+are skipped. Once committed, the local caches are
+evicted right away; every other process evicts when its listener thread
+receives the notification.
+
+Notifications are lost while a listener is disconnected, so the listener
+also reads ``cache_version`` on every (re)connect and every
+``CACHE_VERSION_CHECK_INTERVAL`` seconds, and clears the whole cache of any
+entity whose version moved past the notifications it has seen. On SQLite,
+which has no NOTIFY, that check is the only cross-process channel.
+
+``LocalHub`` stands in for Postgres in tests: invalidators sharing a hub see
+each other's notifications as replicas sharing a database would.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Hashable
+from typing import Any, Protocol
+
+from sqlalchemy import Engine, event, insert, text, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select as sql_select
+
+from app import metrics, settings
+from app.db import engine, is_shared
+from app.models import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+# Notifications list at most this many keys; larger batches clear the entity
+MAX_KEYS_PER_MESSAGE = 200
+
+# Upper bound on how long the listener thread waits before checking for stop
+_POLL_SECONDS = 1.0
+
+
+class Listener(Protocol):
+    def wait(self, timeout: float) -> list[str]: ...
+
+    def close(self) -> None: ...
+
+
+class Transport(Protocol):
+    def prepare(self, session: OrmSession, payloads: list[str]) -> None:
+        """Called inside the committing transaction."""
+
+    def committed(self, payloads: list[str]) -> None:
+        """Called once the transaction has committed."""
+
+    def listen(self) -> Listener: ...
+
+
+class _PostgresListener:
+    def __init__(self, engine: Engine, channel: str):
+        # A dedicated connection, taken out of the pool for good
+        self._connection = engine.raw_connection()
+        self._connection.detach()
+        self._dbapi = self._connection.driver_connection
+        self._dbapi.autocommit = True
+        with self._dbapi.cursor() as cursor:
+            cursor.execute(f'LISTEN "{channel}"')
+
+    def wait(self, timeout: float) -> list[str]:
+        if select.select([self._dbapi], [], [], timeout)[0]:
+            self._dbapi.poll()
+        payloads = [notify.payload for notify in self._dbapi.notifies]
+        del self._dbapi.notifies[:]
+        return payloads
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class PostgresTransport:
+    """Postgres LISTEN/NOTIFY; notifications are delivered on commit."""
+
+    def __init__(self, engine: Engine, channel: str):
+        if not channel.isidentifier():
+            raise ValueError(f"Invalid NOTIFY channel name: {channel!r}")
+        self.engine = engine
+        self.channel = channel
+
+    def prepare(self, session: OrmSession, payloads: list[str]) -> None:
+        for payload in payloads:
+            session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": payload},
+            )
+
+    def committed(self, payloads: list[str]) -> None:
+        pass
+
+    def listen(self) -> _PostgresListener:
+        return _PostgresListener(self.engine, self.channel)
+
+
+class _LocalListener:
+    def __init__(self, hub: "LocalHub"):
+        self._hub = hub
+        self.queue: queue.Queue[str] = queue.Queue()
+
+    def wait(self, timeout: float) -> list[str]:
+        try:
+            payloads = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                payloads.append(self.queue.get_nowait())
+            except queue.Empty:
+                return payloads
+
+    def close(self) -> None:
+        self._hub.detach(self)
+
+
+class LocalHub:
+    """In-process stand-in for LISTEN/NOTIFY."""
+
+    def __init__(self):
+        self._listeners: set[_LocalListener] = set()
+        self._lock = threading.Lock()
+
+    def prepare(self, session: OrmSession, payloads: list[str]) -> None:
+        pass
+
+    def committed(self, payloads: list[str]) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            for payload in payloads:
+                listener.queue.put(payload)
+
+    def listen(self) -> _LocalListener:
+        listener = _LocalListener(self)
+        with self._lock:
+            self._listeners.add(listener)
+        return listener
+
+    def detach(self, listener: _LocalListener) -> None:
+        with self._lock:
+            self._listeners.discard(listener)
+
+
+class Invalidator:
+    """Evicts registered caches when marked entities change in any process.
+
+    Args:
+        engine: database holding the ``cache_version`` table
+        transport: notification transport, or None for version checks only
+        check_interval: seconds between version checks (0 disables them)
+    """
+
+    def __init__(self, engine: Engine, transport: Transport | None = None, *, check_interval: float):
+        self.engine = engine
+        self.transport = transport
+        self.check_interval = check_interval
+        self._handlers: dict[str, list[tuple[Callable[[str], None], Callable[[], None]]]] = defaultdict(list)
+        # Latest cache_version this process has caught up with, per entity
+        self._seen: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pending_key = ("invalidation.pending", id(self))
+        self._versions_key = ("invalidation.versions", id(self))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        event.listen(OrmSession, "before_commit", self._before_commit)
+        event.listen(OrmSession, "after_commit", self._after_commit)
+        event.listen(OrmSession, "after_soft_rollback", self._after_rollback)
+
+    def register(self, entity: str, *, evict: Callable[[str], None], clear: Callable[[], None]) -> None:
+        """Registers a cache keyed by ``entity`` ids (as strings)."""
+        self._handlers[entity].append((evict, clear))
+
+    def mark(self, session: OrmSession, entity: str, key: Hashable | None = None) -> None:
+        """Invalidates ``key`` (or every key if None) of ``entity`` when ``session`` commits."""
+        pending: dict[str, set[str] | None] = session.info.setdefault(self._pending_key, {})
+        if key is None or (entity in pending and pending[entity] is None):
+            pending[entity] = None
+        else:
+            pending.setdefault(entity, set()).add(str(key))
+
+    def pending(self, session: OrmSession) -> dict[str, set[str] | None]:
+        """What ``session`` has marked so far, by entity (None for every key)."""
+        return session.info.get(self._pending_key, {})
+
+    def evict(self, entity: str, keys: list[str] | None, *, source: str) -> None:
+        """Evicts ``keys`` (or everything if None) from the caches of ``entity``."""
+        for evict, clear in self._handlers.get(entity, ()):
+            try:
+                if keys is None:
+                    clear()
+                else:
+                    for key in keys:
+                        evict(key)
+            except Exception:
+                logger.exception("Evicting %s from a cache failed", entity)
+        metrics.CACHE_INVALIDATIONS.inc(entity=entity, source=source)
+
+    def _advance(self, entity: str, version: int) -> None:
+        """Records ``version`` as seen if it directly follows the last one seen.
+
+        After a gap the entity stays behind, so the next version check clears it.
+        """
+        with self._lock:
+            if self._seen.get(entity) == version - 1:
+                self._seen[entity] = version
+
+    def _bump(self, session: OrmSession, entity: str) -> int:
+        version = session.execute(
+            update(CacheVersion)
+            .where(CacheVersion.entity == entity)
+            .values(version=CacheVersion.version + 1)
+            .returning(CacheVersion.version)
+        ).scalar_one_or_none()
+        if version is None:
+            session.execute(insert(CacheVersion).values(entity=entity, version=1))
+            version = 1
+        return version
+
+    def _before_commit(self, session: OrmSession) -> None:
+        pending = session.info.get(self._pending_key)
+        if not pending:
+            return
+        # Marks of entities no process caches only feed the sync change log
+        # (app/sync.py); they need no version or notification
+        versions = {entity: self._bump(session, entity) for entity in pending if entity in self._handlers}
+        if not versions:
+            return
+        session.info[self._versions_key] = versions
+        if self.transport is not None:
+            self.transport.prepare(session, self._payloads(pending, versions))
+
+    @staticmethod
+    def _payloads(pending: dict[str, set[str] | None], versions: dict[str, int]) -> list[str]:
+        payloads = []
+        for entity, version in versions.items():
+            keys = pending[entity]
+            if keys is not None and len(keys) > MAX_KEYS_PER_MESSAGE:
+                keys = None
+            message = {"entity": entity, "keys": sorted(keys) if keys is not None else None, "version": version}
+            payloads.append(json.dumps(message, separators=(",", ":")))
+        return payloads
+
+    def _after_commit(self, session: OrmSession) -> None:
+        pending = session.info.pop(self._pending_key, None)
+        versions = session.info.pop(self._versions_key, None)
+        if not pending or versions is None:
+            return
+        for entity, version in versions.items():
+            keys = pending[entity]
+            self.evict(entity, sorted(keys) if keys is not None else None, source="local")
+            self._advance(entity, version)
+        if self.transport is not None:
+            self.transport.committed(self._payloads(pending, versions))
+
+    def _after_rollback(self, session: OrmSession, previous_transaction: Any) -> None:
+        session.info.pop(self._pending_key, None)
+        session.info.pop(self._versions_key, None)
+
+    def receive(self, payload: str) -> None:
+        """Handles one notification from another process (or this one)."""
+        message: dict[str, Any] = json.loads(payload)
+        self.evict(message["entity"], message["keys"], source="notify")
+        self._advance(message["entity"], message["version"])
+
+    def check_versions(self) -> None:
+        """Clears the caches of entities changed by notifications this process missed."""
+        with Session(self.engine) as session:
+            rows = session.exec(sql_select(CacheVersion)).all()
+        for row in rows:
+            with self._lock:
+                seen = self._seen.get(row.entity)
+                self._seen[row.entity] = max(row.version, seen or 0)
+            # The first check only sets the baseline
+            if seen is not None and row.version > seen:
+                self.evict(row.entity, None, source="version_check")
+
+    def seed(self) -> None:
+        """Creates missing ``cache_version`` rows of registered entities, so
+        commits only ever update them."""
+        with Session(self.engine) as session:
+            existing = set(session.exec(sql_select(CacheVersion.entity)).all())
+            for entity in list(self._handlers):
+                if entity not in existing:
+                    session.add(CacheVersion(entity=entity))
+            session.commit()
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            listener = None
+            try:
+                if self.transport is not None:
+                    listener = self.transport.listen()
+                if self.check_interval > 0:
+                    # Catches up with anything sent while not listening
+                    self.check_versions()
+                    next_check = time.monotonic() + self.check_interval
+                else:
+                    next_check = float("inf")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    timeout = max(0.0, min(next_check - time.monotonic(), _POLL_SECONDS))
+                    if listener is None:
+                        self._stop.wait(timeout)
+                    else:
+                        for payload in listener.wait(timeout):
+                            self.receive(payload)
+                    if time.monotonic() >= next_check:
+                        self.check_versions()
+                        next_check = time.monotonic() + self.check_interval
+            except Exception:
+                logger.exception("Cache invalidation listener failed; reconnecting in %.0fs", backoff)
+                metrics.CACHE_LISTENER_ERRORS.inc()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+    def start(self) -> None:
+        """Starts the listener thread (once per process, after any fork)."""
+        if self._thread is not None or not is_shared(self.engine):
+            return
+        if self.transport is None and self.check_interval <= 0:
+            return
+        self.seed()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=_POLL_SECONDS * 5)
+        self._thread = None
+
+    def close(self) -> None:
+        """Stops the listener and detaches from session events."""
+        self.stop()
+        event.remove(OrmSession, "before_commit", self._before_commit)
+        event.remove(OrmSession, "after_commit", self._after_commit)
+        event.remove(OrmSession, "after_soft_rollback", self._after_rollback)
+
+
+invalidator = Invalidator(
+    engine,
+    PostgresTransport(engine, settings.CACHE_INVALIDATION_CHANNEL)
+    if engine.dialect.name == "postgresql"
+    else None,
+    check_interval=settings.CACHE_VERSION_CHECK_INTERVAL,
+)
+mark = invalidator.mark
+register = invalidator.register
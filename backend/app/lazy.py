@@ -0,0 +1,37 @@
+"""Deferred imports for heavy dependencies.
+
+``cv2``, ``numpy`` and ``face_recognition`` (which loads the dlib models)
+take seconds to import. Modules on the request path bind them through
+``lazy_module`` so that the import happens on first attribute access instead
+of at application start.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_target"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_target"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """Returns ``name`` if already imported, otherwise a lazy proxy for it."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -1,15 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from app.users import fastapi_users, auth_backend
 from contextlib import asynccontextmanager
 import uvicorn
 import os
-from app import settings
+from app import audit, events, invalidation, metrics, partitions, settings, tracing, warmup
 from app.api.employees import employees_router
 from app.api.entries import entries_router
 from app.api.auth import auth_router
+from app.api.traces import traces_router
+from app.api.events import events_router
+from app.api.sync import sync_router
 from app.db import init_db, engine
+from app.ingest import UploadLimitMiddleware, FORM_OVERHEAD_BYTES
 from app.schemas import UserRead, UserCreate
 from sqlmodel import Session, select
 from fastapi_users_db_sync_sqlalchemy import SQLAlchemyUserDatabase
@@ -21,12 +28,8 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup logic
-    init_db()
-    
-    # Create admin user if it doesn't exist
+async def _ensure_admin_user():
+    """Creates the admin user from ADMIN_EMAIL/ADMIN_PASSWORD if missing."""
     with Session(engine) as session:
         user_db = SQLAlchemyUserDatabase(session, User)
         user_manager = UserManager(user_db)
@@ -36,7 +39,6 @@ async def lifespan(app: FastAPI):
 
         if not ADMIN_EMAIL or not ADMIN_PASSWORD:
             logger.warning('ADMIN_EMAIL and ADMIN_PASSWORD environment variables are not set. Skipping admin user creation.')
-            yield
             return
         
         logger.info('Checking for admin user existence: %s', ADMIN_EMAIL)
@@ -51,9 +53,31 @@ async def lifespan(app: FastAPI):
             logger.info('Created admin user with email %s', ADMIN_EMAIL)
         else:
             logger.info('Admin user already exists.')
-    
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup logic
+    init_db()
+    await _ensure_admin_user()
+    invalidation.invalidator.start()
+    events.bus.start()
+    audit.writer.start()
+    partitions.maintainer.start()
+
+    # No-op when gunicorn already prepared the models in the master process
+    if settings.PRELOAD_MODELS:
+        await run_in_threadpool(warmup.prepare)
+    warmup.mark_ready()
+
     yield
 
+    warmup.mark_not_ready()
+    invalidation.invalidator.stop()
+    events.bus.stop()
+    audit.writer.stop()
+    partitions.maintainer.stop()
+
 
 app = FastAPI(
     title="SecureEntryBackend",
@@ -78,6 +102,29 @@ app.add_middleware(
     expose_headers=["set-cookie"],
 )
 
+# Cap upload request bodies before multipart parsing buffers them
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_body_bytes=settings.MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+    path_prefixes=("/api/entries", "/api/employees"),
+)
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_body_bytes=settings.GATE_BATCH_MAX_BYTES,
+    path_prefixes=("/api/sync/events",),
+)
+
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_LEVEL,
+)
+
+if settings.SERVER_TIMING:
+    app.add_middleware(metrics.ServerTimingMiddleware)
+app.add_middleware(metrics.InFlightMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+
 # Serve uploaded photos
 uploads_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
 os.makedirs(uploads_dir, exist_ok=True)
@@ -86,6 +133,9 @@ app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 
 app.include_router(router=employees_router, prefix="/api", tags=["employees"])
 app.include_router(router=entries_router, prefix="/api", tags=["entries"])
+app.include_router(router=traces_router, prefix="/api", tags=["traces"])
+app.include_router(router=events_router, prefix="/api", tags=["events"])
+app.include_router(router=sync_router, prefix="/api", tags=["sync"])
 
 app.include_router(
     auth_router,
@@ -109,5 +159,20 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready", status_code=200)
+def readiness_check():
+    """Reports ready once startup, including the optional model warm-up, is done."""
+    if not warmup.is_ready():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
+
+@app.get("/metrics", status_code=200, response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", reload=True, port=8888)
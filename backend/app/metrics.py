@@ -0,0 +1,420 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+Counters, gauges and histograms are plain Python objects guarded by a single
+lock so that recording a sample on the gate hot path costs a dict lookup and
+a few additions. Formatting only happens when ``/metrics`` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import tracing
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+_lock = threading.Lock()
+REGISTRY: list["Counter | Gauge | Histogram"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], key: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> list[str]:
+        with _lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge:
+    """Value that can go up and down.
+
+    If ``callback`` is given it is called on every scrape and must return a
+    mapping of label tuples to values; ``set``/``inc``/``dec`` are unused then.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        callback: Callable[[], dict[tuple[str, ...], float]] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+        self._values: dict[tuple[str, ...], float] = {}
+        REGISTRY.append(self)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> list[str]:
+        if self.callback is not None:
+            values = list(self.callback().items())
+        else:
+            with _lock:
+                values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._values.get(key)
+        return int(sum(series[:-1])) if series else 0
+
+    def sum(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._values.get(key)
+        return series[-1] if series else 0.0
+
+    def mean(self, **labels: str) -> float:
+        count = self.count(**labels)
+        return self.sum(**labels) / count if count else 0.0
+
+    def render(self) -> list[str]:
+        with _lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        lines = []
+        for key, series in values:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+def render() -> str:
+    """Renders every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+GATE_STAGE_SECONDS = Histogram(
+    "gate_stage_seconds",
+    "Time spent in each stage of a gate access attempt.",
+    ("stage",),
+)
+GATE_DECISIONS = Counter(
+    "gate_decisions_total",
+    "Gate access decisions by result and denial reason.",
+    ("result", "denial_reason"),
+)
+GATE_REPLAYS = Counter(
+    "gate_replayed_decisions_total",
+    "Resubmitted gate attempts answered with an earlier decision, by where it was found.",
+    ("source",),
+)
+FRAME_QUALITY_REJECTIONS = Counter(
+    "gate_frame_quality_rejections_total",
+    "Camera frames rejected by the quality gate before face encoding.",
+    ("reason",),
+)
+FACE_RECOGNITION_SECONDS = Histogram(
+    "gate_face_recognition_seconds",
+    "Time spent detecting, encoding and comparing a camera frame.",
+)
+FACE_LOCATIONS = Counter(
+    "gate_face_locations_total",
+    "Camera frames by where the face location came from (detected, face_box, aligned_crop).",
+    ("source",),
+)
+RECOGNITION_SECONDS_SAVED = Counter(
+    "gate_recognition_seconds_saved_total",
+    "Estimated recognition CPU time avoided by quality-gate rejections.",
+)
+REPORT_SECONDS = Histogram(
+    "report_generation_seconds",
+    "Time spent building and rendering work time reports.",
+    ("stage",),
+)
+WARMUP_SECONDS = Gauge(
+    "app_warmup_seconds",
+    "Time spent preloading recognition models and running the warm-up inference.",
+    ("phase",),
+)
+ADMISSION_IN_USE = Gauge(
+    "admission_slots_in_use",
+    "Admission slots currently held.",
+    ("pool",),
+)
+ADMISSION_QUEUE_LENGTH = Gauge(
+    "admission_queue_length",
+    "Requests waiting for an admission slot.",
+    ("pool",),
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Time requests waited for an admission slot.",
+    ("pool",),
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Requests rejected with 503 by admission control.",
+    ("pool", "reason"),
+)
+USER_CACHE_LOOKUPS = Counter(
+    "auth_user_cache_lookups_total",
+    "Authenticated user lookups by cache result.",
+    ("result",),
+)
+EVENTS_PUBLISHED = Counter(
+    "events_published_total",
+    "Gate and presence events published to the event stream.",
+    ("type",),
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "event_stream_subscribers",
+    "Clients connected to the event stream.",
+)
+EVENT_SUBSCRIBERS_DROPPED = Counter(
+    "event_stream_subscribers_dropped_total",
+    "Event stream clients disconnected for falling too far behind.",
+)
+EVENT_LISTENER_ERRORS = Counter(
+    "event_stream_listener_errors_total",
+    "Event stream listener failures (each followed by a reconnect).",
+)
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total",
+    "Local cache evictions by entity and by what triggered them.",
+    ("entity", "source"),
+)
+CACHE_LISTENER_ERRORS = Counter(
+    "cache_invalidation_listener_errors_total",
+    "Cache invalidation listener failures (each followed by a reconnect).",
+)
+AUDIT_BUFFERED = Gauge(
+    "audit_records_buffered",
+    "Audit records waiting to be written, including failed batches.",
+)
+AUDIT_RECORDS_WRITTEN = Counter(
+    "audit_records_written_total",
+    "Audit records written by the buffered writer, by method.",
+    ("method",),
+)
+AUDIT_FLUSH_SECONDS = Histogram(
+    "audit_flush_seconds",
+    "Time to write one batch of buffered audit records.",
+)
+AUDIT_FLUSH_ERRORS = Counter(
+    "audit_flush_errors_total",
+    "Failed audit batch writes (retried on the next flush).",
+)
+AUDIT_RECORDS_DEAD_LETTERED = Counter(
+    "audit_records_dead_lettered_total",
+    "Audit records moved to a dead-letter file after their batch could not be written.",
+)
+PARTITIONS_ARCHIVED = Counter(
+    "partitions_archived_total",
+    "Monthly audit table partitions archived and dropped, by table.",
+    ("table",),
+)
+PARTITION_MAINTENANCE_ERRORS = Counter(
+    "partition_maintenance_errors_total",
+    "Failed partition maintenance runs.",
+)
+GATE_BATCH_EVENTS = Counter(
+    "gate_batch_events_total",
+    "Gate events uploaded in batches, by outcome.",
+    ("status",),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled.",
+)
+
+
+# Per-request stage durations, populated only while ServerTimingMiddleware
+# is handling a request.
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times a gate stage into ``GATE_STAGE_SECONDS`` and the Server-Timing header.
+
+    The stage is also recorded as a ``gate.<name>`` span of the active trace.
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"gate.{name}", root=False):
+            yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Records a gate stage measured elsewhere, e.g. by the recognition worker."""
+    GATE_STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, float]]:
+    """Collects the stage durations recorded in the enclosed block."""
+    timings: dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+class InFlightMiddleware:
+    """Tracks the number of HTTP requests being handled."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+
+class ServerTimingMiddleware:
+    """Adds a ``Server-Timing`` header with the stage durations of a request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with collect_timings() as timings:
+
+            async def send_with_timing(message: Message) -> None:
+                if message["type"] == "http.response.start" and timings:
+                    value = ", ".join(
+                        f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()
+                    )
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", value.encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
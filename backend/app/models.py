@@ -13,6 +13,26 @@ class User(SQLModel, table=True):
     is_superuser: bool = False
     is_verified: bool = False
 
+class CacheVersion(SQLModel, table=True):
+    """Per-entity change counter, bumped by every commit that invalidates it."""
+    __tablename__ = "cache_version"
+    entity: str = Field(primary_key=True)
+    version: int = 0
+
+class EventSequence(SQLModel, table=True):
+    """Id of the last gate event published by any process (a single row)."""
+    __tablename__ = "event_sequence"
+    id: int = Field(default=1, primary_key=True)
+    value: int = 0
+
+class ChangeLog(SQLModel, table=True):
+    """One employee whose gate-relevant state changed; ``id`` is the sync version."""
+    __tablename__ = "change_log"
+    id: int | None = Field(default=None, primary_key=True)
+    entity: str  # "employee", "qr_code" or "face_template"
+    employee_id: int | None = None  # None if every employee may have changed
+    created_at: datetime = Field(index=True)
+
 class Employee(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     email: str = Field(unique=True)
@@ -20,6 +40,17 @@ class Employee(SQLModel, table=True):
     last_name: str
     photo_path: str | None = None
     is_present: bool = False
+    # Entry record that opened the current work session, while present
+    open_entry_id: int | None = Field(default=None, exclude=True)
+
+class FaceTemplate(SQLModel, table=True):
+    """One face encoding in an employee's recognition gallery."""
+    id: int | None = Field(default=None, primary_key=True)
+    employee_id: int = Field(foreign_key="employee.id", ondelete="CASCADE", index=True)
+    encoding: bytes  # 128 float32 values
+    quality: float  # 1 - match distance for gate templates, 1 for the enrollment photo
+    source: str  # "enrollment" or "gate"
+    created_at: datetime
 
 class QRCode(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
@@ -30,6 +61,9 @@ class QRCode(SQLModel, table=True):
 
 class EntryExitRecord(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    # Assigned by the gate endpoint; identifies the attempt before the row exists
+    attempt_id: str | None = Field(default=None, index=True)
+    gate_id: str | None = None
     employee_id: int = Field(foreign_key="employee.id")
     timestamp: datetime
     successful: bool
@@ -0,0 +1,288 @@
+"""Monthly partitions for the audit tables, with archival of old months.
+
+On Postgres, ``entryexitrecord`` (by ``timestamp``) and ``worktimerecord``
+(by ``entry_time``) are created as range-partitioned tables, one partition
+per month plus a default partition for rows outside them. The report and
+gate queries filter on those columns, so the planner only reads the months
+they cover.
+
+``PartitionMaintainer`` keeps the partitions for the current month and the
+next ``PARTITION_MONTHS_AHEAD`` months in place. With
+``PARTITION_RETENTION_MONTHS`` set, it also archives months older than that:
+each partition is copied to ``<PARTITION_ARCHIVE_DIR>/<partition>.csv.gz``,
+then detached and dropped. Maintenance runs at startup and every
+``PARTITION_MAINTENANCE_INTERVAL`` seconds, under an advisory lock so that
+only one process does it at a time.
+
+SQLite has no partitioning: the tables are created as plain tables and
+maintenance does nothing. Tables created on Postgres before partitioning was
+added stay unpartitioned too, until they are migrated by hand.
+
+``create_tables`` also adds the columns and indexes a model gained after its
+table was created, which ``create_all`` leaves out. Such columns must be
+nullable so that existing rows can take them.
+"""
+import gzip
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import Engine, MetaData, PrimaryKeyConstraint, Table, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel
+
+from app import metrics, settings
+from app.db import engine
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> partition key column
+PARTITION_KEYS = {
+    "entryexitrecord": "timestamp",
+    "worktimerecord": "entry_time",
+}
+
+# Serializes maintenance across processes
+_LOCK_ID = 0x70617274
+
+
+def supported(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _month(day: date, offset: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _partitioned_tables() -> list[Table]:
+    """Copies of the partitioned tables with the partition key in the primary key,
+    which Postgres requires of every unique constraint on a partitioned table.
+    """
+    metadata = MetaData()
+    for table in SQLModel.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    tables = []
+    for name, key in PARTITION_KEYS.items():
+        table = metadata.tables[name]
+        table.c[key].primary_key = True
+        table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c[key]))
+        table.c.id.autoincrement = True
+        table.dialect_options["postgresql"]["partition_by"] = f"RANGE ({key})"
+        tables.append(table)
+    return tables
+
+
+def create_tables(engine: Engine) -> None:
+    """Creates missing tables, partitioned where the database supports it,
+    and missing columns and indexes of existing ones."""
+    if not supported(engine):
+        SQLModel.metadata.create_all(engine)
+        _add_missing_columns(engine)
+        return
+    regular = [t for t in SQLModel.metadata.sorted_tables if t.name not in PARTITION_KEYS]
+    SQLModel.metadata.create_all(engine, tables=regular)
+    partitioned = _partitioned_tables()
+    partitioned[0].metadata.create_all(engine, tables=partitioned)
+    with engine.begin() as connection:
+        for table in PARTITION_KEYS:
+            if _is_partitioned(connection, table):
+                connection.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    _add_missing_columns(engine)
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    """Adds model columns and indexes that existing tables lack.
+
+    Raises:
+        RuntimeError: if a missing column is not nullable
+    """
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    # Workers starting together may race to add the same column; SQLite has no
+    # IF NOT EXISTS here, but is not shared between hosts either
+    if_not_exists = "IF NOT EXISTS " if supported(engine) else ""
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Column {table.name}.{column.name} must be added by hand: it is not nullable")
+                logger.info("Adding column %s.%s", table.name, column.name)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {if_not_exists}"
+                        f"{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    logger.info("Creating index %s", index.name)
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _is_partitioned(connection: Connection, table: str) -> bool:
+    return connection.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": table},
+    ).first() is not None
+
+
+def _partitions(connection: Connection, table: str) -> list[str]:
+    rows = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    return [row[0] for row in rows]
+
+
+def _create_partition(connection: Connection, table: str, month: date) -> None:
+    name = partition_name(table, month)
+    key = PARTITION_KEYS[table]
+    bounds = {"start": _month(month), "end": _month(month, 1)}
+    in_range = f"{key} >= :start AND {key} < :end"
+    # Rows for the month may already sit in the default partition, which
+    # Postgres would refuse to attach the new partition over
+    moved = connection.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {in_range})"), bounds
+    ).scalar()
+    if moved:
+        connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {table}_default"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+        )
+    )
+    if moved:
+        connection.execute(text(f"INSERT INTO {name} SELECT * FROM {table}_default WHERE {in_range}"), bounds)
+        connection.execute(text(f"DELETE FROM {table}_default WHERE {in_range}"), bounds)
+        connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT"))
+    logger.info("Created partition %s", name)
+
+
+def _archive_partition(connection: Connection, name: str, archive_dir: Path) -> Path:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.csv.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    cursor = connection.connection.cursor()
+    with gzip.open(tmp, "wb") as f:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+class PartitionMaintainer:
+    """Creates upcoming partitions and archives expired ones.
+
+    Args:
+        engine: database holding the partitioned tables
+        months_ahead: months after the current one to keep partitions for
+        retention_months: months before the current one to keep (0 keeps all)
+        archive_dir: where archived partitions are written
+        interval: seconds between maintenance runs
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        *,
+        months_ahead: int,
+        retention_months: int,
+        archive_dir: Path,
+        interval: float,
+    ):
+        self.engine = engine
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_dir = Path(archive_dir)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run(self, today: date | None = None) -> tuple[list[str], list[Path]]:
+        """Runs maintenance once.
+
+        Returns:
+            the partitions created and the archives written
+        """
+        if not supported(self.engine):
+            return [], []
+        today = today or datetime.now().date()
+        created: list[str] = []
+        archived: list[Path] = []
+        with self.engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _LOCK_ID})
+            for table in PARTITION_KEYS:
+                if not _is_partitioned(connection, table):
+                    continue
+                existing = set(_partitions(connection, table))
+                for offset in range(self.months_ahead + 1):
+                    month = _month(today, offset)
+                    if partition_name(table, month) not in existing:
+                        _create_partition(connection, table, month)
+                        created.append(partition_name(table, month))
+                if self.retention_months > 0:
+                    oldest_kept = partition_name(table, _month(today, -self.retention_months))
+                    for name in sorted(existing):
+                        # Names sort by month; the default partition is never expired
+                        if name == f"{table}_default" or name >= oldest_kept:
+                            continue
+                        archived.append(_archive_partition(connection, name, self.archive_dir))
+                        connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                        connection.execute(text(f"DROP TABLE {name}"))
+                        metrics.PARTITIONS_ARCHIVED.inc(table=table)
+                        logger.info("Archived partition %s to %s", name, archived[-1])
+        return created, archived
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Partition maintenance failed")
+                metrics.PARTITION_MAINTENANCE_ERRORS.inc()
+
+    def start(self) -> None:
+        """Runs maintenance now and then every ``interval`` seconds (Postgres only)."""
+        if self._thread is not None or not supported(self.engine):
+            return
+        try:
+            self.run()
+        except Exception:
+            logger.exception("Partition maintenance failed")
+            metrics.PARTITION_MAINTENANCE_ERRORS.inc()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="partition-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+maintainer = PartitionMaintainer(
+    engine,
+    months_ahead=settings.PARTITION_MONTHS_AHEAD,
+    retention_months=settings.PARTITION_RETENTION_MONTHS,
+    archive_dir=settings.PARTITION_ARCHIVE_DIR,
+    interval=settings.PARTITION_MAINTENANCE_INTERVAL,
+)
@@ -0,0 +1,114 @@
+"""Face matching dispatch for the gate endpoint.
+
+Matching runs either in the HTTP worker's thread pool or, when
+``RECOGNITION_SOCKET`` is set, in the recognition worker service
+(``app.recognition_worker``) reached over a Unix socket. The service replies
+with its stage timings and trace spans, which are recorded here so
+``/metrics``, the Server-Timing header and ``/api/traces`` look the same in
+both modes.
+
+Wire format, both directions: a 4-byte big-endian length followed by a JSON
+header. A request header's ``size`` gives the number of frame bytes that
+follow it, and ``gallery_rows`` the number of float32 face encodings after
+the frame. ``face_box``, if set, is the face location the gate supplied.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import struct
+from typing import Any
+from fastapi.concurrency import run_in_threadpool
+from app import metrics, settings, tracing
+from app.ingest import IngestedImage
+from app.lazy import lazy_module
+from app.utils.face import FaceBox, FaceMatch, FrameQualityError, match_face, record_quality_rejection
+
+np = lazy_module("numpy")
+
+_LENGTH = struct.Struct("!I")
+
+
+class RecognitionUnavailable(Exception):
+    """The recognition worker service could not be reached or timed out."""
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict[str, Any]:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return json.loads(await reader.readexactly(length))
+
+
+def write_message(writer: asyncio.StreamWriter, header: dict[str, Any], payload: bytes = b"") -> None:
+    encoded = json.dumps(header).encode()
+    writer.write(_LENGTH.pack(len(encoded)) + encoded + payload)
+
+
+async def match_face_remote(
+    socket_path: str,
+    gallery: np.ndarray,
+    frame: IngestedImage,
+    face_box: FaceBox | None = None,
+    *,
+    timeout: float | None = None,
+) -> FaceMatch | None:
+    """Matches a frame against a gallery in the recognition worker service.
+
+    Raises:
+        FrameQualityError: if the frame fails the quality gate
+        RecognitionUnavailable: if the service cannot answer in time
+    """
+    timeout = settings.RECOGNITION_TIMEOUT if timeout is None else timeout
+    gallery = np.ascontiguousarray(gallery, dtype=np.float32)
+    header = {
+        "width": frame.width,
+        "height": frame.height,
+        "size": len(frame.data),
+        "gallery_rows": len(gallery),
+        "face_box": face_box,
+        "trace": tracing.inject(),
+    }
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                write_message(writer, header, frame.data + gallery.tobytes())
+                await writer.drain()
+                reply = await read_message(reader)
+            finally:
+                writer.close()
+    except (OSError, TimeoutError, asyncio.IncompleteReadError) as e:
+        raise RecognitionUnavailable(str(e) or type(e).__name__) from e
+
+    for name, seconds in reply.get("stages", {}).items():
+        metrics.record_stage(name, seconds)
+    tracing.record_spans(reply.get("spans", []))
+    if reply.get("recognition_seconds"):
+        metrics.FACE_RECOGNITION_SECONDS.observe(reply["recognition_seconds"])
+
+    if reply["status"] == "rejected":
+        error = FrameQualityError(reply["reason"], reply["message"])
+        record_quality_rejection(error)
+        raise error
+    if reply["status"] != "ok":
+        raise RecognitionUnavailable(reply.get("detail", "Recognition failed."))
+    if reply["match"] is None:
+        return None
+    return FaceMatch(
+        distance=reply["match"]["distance"],
+        encoding=np.asarray(reply["match"]["encoding"], dtype=np.float32),
+    )
+
+
+async def match(gallery: np.ndarray, frame: IngestedImage, face_box: FaceBox | None = None) -> FaceMatch | None:
+    """Matches a frame against an employee's gallery without blocking the event loop.
+
+    With ``face_box`` (see ``parse_face_hint``), a cheap check that there is a
+    face at that location replaces face detection.
+
+    Raises:
+        FrameQualityError: if the frame fails the quality gate
+        RecognitionUnavailable: if the recognition worker service is down
+    """
+    if settings.RECOGNITION_SOCKET:
+        return await match_face_remote(settings.RECOGNITION_SOCKET, gallery, frame, face_box)
+    return await run_in_threadpool(tracing.propagate(match_face), gallery, frame, face_box)
@@ -0,0 +1,166 @@
+"""Recognition worker service.
+
+Serves face matching requests from the HTTP workers over a Unix socket
+(protocol in ``app.recognition``) and runs them in a pool of processes. The
+models are loaded and warmed up once in this process before the pool forks,
+so the recognition processes share them copy-on-write.
+
+    python -m app.recognition_worker --socket /run/recognition/recognition.sock --processes 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any
+from app import metrics, settings, tracing, warmup
+from app.ingest import IngestedImage
+from app.recognition import read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+# One 128-value float32 face encoding
+_ENCODING_BYTES = 128 * 4
+
+
+def match_job(header: dict[str, Any], data: bytes) -> dict[str, Any]:
+    """Runs ``match_face`` for one request and returns the reply header."""
+    import numpy as np
+    from app.utils.face import FrameQualityError, match_face
+
+    size = header["size"]
+    frame = IngestedImage(data=data[:size], width=header["width"], height=header["height"])
+    gallery = np.frombuffer(data[size:], dtype=np.float32).reshape(header["gallery_rows"], -1)
+    face_box = tuple(header["face_box"]) if header.get("face_box") else None
+    recognition_before = metrics.FACE_RECOGNITION_SECONDS.sum()
+    with (
+        tracing.collect_spans() as spans,
+        tracing.span("recognition.match", carrier=header.get("trace")),
+        metrics.collect_timings() as stages,
+    ):
+        try:
+            match = match_face(gallery, frame, face_box)
+            reply = {
+                "status": "ok",
+                "match": None if match is None else {
+                    "distance": match.distance,
+                    "encoding": match.encoding.tolist(),
+                },
+            }
+        except FrameQualityError as e:
+            reply = {"status": "rejected", "reason": e.reason, "message": e.message}
+        except Exception as e:
+            logger.exception("Face matching failed")
+            reply = {"status": "error", "detail": repr(e)}
+    reply["stages"] = stages
+    # This process has no way to show them; the caller exports them with its trace
+    reply["spans"] = [span.to_dict() for span in spans]
+    reply["recognition_seconds"] = metrics.FACE_RECOGNITION_SECONDS.sum() - recognition_before
+    return reply
+
+
+class JobLimiter:
+    """Counts jobs submitted to the pool, up to ``limit`` at a time.
+
+    A slot is held until the job has finished in the pool, including jobs
+    whose client is gone, since those still occupy a process.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+async def handle_connection(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    executor: Executor,
+    limiter: JobLimiter,
+) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        header = await read_message(reader)
+        data = await reader.readexactly(header["size"] + header["gallery_rows"] * _ENCODING_BYTES)
+        if not limiter.try_acquire():
+            # Queueing more would only answer after the client gave up
+            write_message(writer, {"status": "busy", "detail": "Recognition worker is overloaded."})
+            await writer.drain()
+            return
+        job = executor.submit(match_job, header, data)
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(limiter.release))
+        reply_ready = asyncio.wrap_future(job)
+        # The client sends nothing more; EOF means it timed out or went away
+        closed = asyncio.ensure_future(reader.read(1))
+        done, _ = await asyncio.wait({reply_ready, closed}, return_when=asyncio.FIRST_COMPLETED)
+        if reply_ready not in done:
+            # Skipped if still queued; a running job cannot be stopped
+            job.cancel()
+            reply_ready.cancel()
+            return
+        closed.cancel()
+        write_message(writer, reply_ready.result())
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        # Client went away (e.g. timed out); nothing to answer
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str, executor: Executor, max_jobs: int | None = None) -> asyncio.Server:
+    """Starts listening on ``socket_path``; requests run on ``executor``.
+
+    At most ``max_jobs`` requests (default ``RECOGNITION_MAX_JOBS``) are in
+    the pool at once; further requests are answered ``busy`` right away.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    limiter = JobLimiter(settings.RECOGNITION_MAX_JOBS if max_jobs is None else max_jobs)
+    return await asyncio.start_unix_server(
+        lambda reader, writer: handle_connection(reader, writer, executor, limiter),
+        path=socket_path,
+    )
+
+
+async def _main(socket_path: str, processes: int) -> None:
+    warmup.prepare()
+    # Fork after the warm-up so the pool shares the loaded models
+    executor = ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("fork")
+    )
+    server = await serve(socket_path, executor)
+    logger.info("Recognition worker listening on %s with %d processes", socket_path, processes)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    executor.shutdown(cancel_futures=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Face recognition worker service")
+    parser.add_argument("--socket", default=settings.RECOGNITION_SOCKET or "/tmp/recognition.sock")
+    parser.add_argument("--processes", type=int, default=settings.RECOGNITION_PROCESSES)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.socket, args.processes))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, ValidationError, Field
-from datetime import date
+from pydantic import Base64Bytes, BaseModel, EmailStr, ValidationError, Field, field_validator
+from datetime import date, datetime
+from typing import Literal
 from fastapi import Form
 from fastapi.exceptions import RequestValidationError
 from fastapi_users.schemas import BaseUserCreate, BaseUser
@@ -56,6 +57,58 @@ class QRCodeBase(BaseModel):
     token_hash: str
     expires_at: date
 
+class ReportRow(BaseModel):
+    employee_id: int
+    first_name: str
+    last_name: str
+    total_hours: float
+
+
+class ReportResponse(BaseModel):
+    message: str
+    period_days: int
+    start_date: str
+    end_date: str
+    employees_count: int
+    total_hours: float
+    report_data: list[ReportRow]
+
+
+class GateEvent(BaseModel):
+    """A decision a gate made on its own, uploaded later."""
+    client_event_id: str = Field(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    employee_id: int
+    timestamp: datetime
+    is_entry: bool
+    successful: bool
+    denial_reason: str | None = None
+    snapshot: Base64Bytes | None = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def to_local_time(cls, value: datetime) -> datetime:
+        """Stored timestamps are naive local time; convert ones with an offset."""
+        if value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+        return value
+
+
+class GateEventBatch(BaseModel):
+    events: list[GateEvent]
+
+
+class GateEventResult(BaseModel):
+    client_event_id: str
+    # applied: stored and presence updated; recorded: stored only;
+    # duplicate: stored before; rejected: not stored
+    status: Literal["applied", "recorded", "duplicate", "rejected"]
+    reason: str | None = None
+
+
+class GateEventBatchResult(BaseModel):
+    results: list[GateEventResult]
+
+
 class UserLogin(BaseModel):
     username: EmailStr = Field(..., alias="email")
     password: str
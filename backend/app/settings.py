@@ -2,7 +2,6 @@ from pathlib import Path
 import sys
 import os
 from dotenv import load_dotenv
-from fastapi_mail import ConnectionConfig
 
 load_dotenv()
 
@@ -18,23 +17,150 @@ TEST_DATABASE_URL = "sqlite:///memory:test.db"
 
 TESTING = os.getenv("TESTING", "false") == "true"
 
-if not TESTING:
-    mail_config = ConnectionConfig(
-        MAIL_USERNAME=os.getenv("EMAIL_HOST_USER", ""),
-        MAIL_PASSWORD=os.getenv("EMAIL_HOST_PASSWORD", ""),
-        MAIL_FROM=os.getenv("EMAIL_HOST_USER", ""),
-        MAIL_PORT=os.getenv("EMAIL_PORT", 578),
-        MAIL_SERVER=os.getenv("EMAIL_HOST", "smtp.mailtrap.io"),
-        MAIL_STARTTLS=True,
-        MAIL_SSL_TLS=False,
-    )
-else:
-    mail_config = ConnectionConfig(
-        MAIL_USERNAME="test_user",
-        MAIL_PASSWORD="test_password",
-        MAIL_FROM="test@test.com",
-        MAIL_PORT=1025,
-        MAIL_SERVER="localhost",
-        MAIL_STARTTLS=False,
-        MAIL_SSL_TLS=False,
-    )
+# Frame-quality gate applied to camera frames before face encoding.
+# Brightness and sharpness are measured on a grayscale copy downscaled so its
+# longer side is FRAME_QUALITY_WORKING_SIZE pixels; face size is in original
+# frame pixels.
+FRAME_QUALITY_CHECK = os.getenv("FRAME_QUALITY_CHECK", "true") == "true"
+FRAME_QUALITY_WORKING_SIZE = int(os.getenv("FRAME_QUALITY_WORKING_SIZE", 240))
+FRAME_MIN_BRIGHTNESS = float(os.getenv("FRAME_MIN_BRIGHTNESS", 40))
+FRAME_MAX_BRIGHTNESS = float(os.getenv("FRAME_MAX_BRIGHTNESS", 225))
+FRAME_MIN_SHARPNESS = float(os.getenv("FRAME_MIN_SHARPNESS", 60))
+FRAME_MIN_FACE_PX = int(os.getenv("FRAME_MIN_FACE_PX", 80))
+
+# Upload ingestion limits for camera frames and employee photos. Frames whose
+# longer side is at least 2x/4x FRAME_DECODE_TARGET_SIDE are decoded at
+# half/quarter resolution.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", 40_000_000))
+FRAME_DECODE_TARGET_SIDE = int(os.getenv("FRAME_DECODE_TARGET_SIDE", 640))
+
+# Report per-stage gate timings in a Server-Timing response header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false") == "true"
+
+# Request tracing: exporter is "memory" (ring buffer), "jsonl" or "none";
+# TRACE_SAMPLE_RATE is the fraction of requests traced.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "memory")
+TRACE_FILE = os.getenv("TRACE_FILE", str(BASE_DIR / "traces.jsonl"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 4096))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+
+# Load the recognition models and run one inference on WARMUP_IMAGE before
+# the app reports ready (see app/warmup.py and gunicorn.conf.py)
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false") == "true"
+WARMUP_IMAGE = os.getenv("WARMUP_IMAGE", str(BASE_DIR / "app" / "assets" / "warmup_face.png"))
+
+# Face verification runs in a separate recognition worker service
+# (python -m app.recognition_worker) when RECOGNITION_SOCKET is set, and in
+# the HTTP worker's thread pool otherwise.
+RECOGNITION_SOCKET = os.getenv("RECOGNITION_SOCKET", "")
+RECOGNITION_PROCESSES = int(os.getenv("RECOGNITION_PROCESSES", os.cpu_count() or 1))
+RECOGNITION_TIMEOUT = float(os.getenv("RECOGNITION_TIMEOUT", 10))
+# Requests the recognition service holds at once (running or queued for a
+# process); it answers the rest as busy instead of queueing them
+RECOGNITION_MAX_JOBS = int(os.getenv("RECOGNITION_MAX_JOBS", 2 * RECOGNITION_PROCESSES))
+
+# Admission control for gate attempts and reports. ADMISSION_CAPACITY is per
+# HTTP worker process: ADMISSION_RESERVED of its slots are kept for admin and
+# report requests, and by default each of the WEB_CONCURRENCY workers gets an
+# equal share of the RECOGNITION_PROCESSES recognition processes for gate
+# requests, so all workers together cannot queue more recognitions than the
+# pool runs. Gate requests beyond capacity wait up to ADMISSION_MAX_WAIT
+# seconds in a queue shared fairly between gates.
+# WEB_CONCURRENCY has the same default as gunicorn.conf.py.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 2))
+ADMISSION_RESERVED = int(os.getenv("ADMISSION_RESERVED", 1))
+ADMISSION_CAPACITY = int(
+    os.getenv("ADMISSION_CAPACITY", -(-RECOGNITION_PROCESSES // WEB_CONCURRENCY) + ADMISSION_RESERVED)
+)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 16))
+ADMISSION_PER_GATE_QUEUE = int(os.getenv("ADMISSION_PER_GATE_QUEUE", 4))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 2.0))
+
+# Users looked up from the session cookie are cached for USER_CACHE_TTL
+# seconds (0 disables the cache)
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+
+# Responses of at least GZIP_MINIMUM_SIZE bytes are gzip-compressed for
+# clients that accept it
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+
+# Gate event stream: events kept for Last-Event-ID resume, events a
+# dashboard client may fall behind before it is disconnected, and the NOTIFY
+# channel carrying events between processes on Postgres
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", 1024))
+EVENT_CLIENT_BUFFER = int(os.getenv("EVENT_CLIENT_BUFFER", 256))
+EVENT_CHANNEL = os.getenv("EVENT_CHANNEL", "gate_events")
+
+# Cache invalidation across processes (see app/invalidation.py): NOTIFY
+# channel on Postgres, and how often every process compares the
+# cache_version table against what it has seen (0 disables the check)
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("CACHE_VERSION_CHECK_INTERVAL", 30))
+
+# Denied gate attempts are audit-only and written behind: buffered, spilled
+# to AUDIT_SPILL_DIR until committed, and inserted every AUDIT_FLUSH_INTERVAL
+# seconds or AUDIT_BATCH_SIZE records (see app/audit.py). A batch that fails
+# AUDIT_MAX_ATTEMPTS times is moved to a dead-letter file in AUDIT_SPILL_DIR.
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 200))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0))
+AUDIT_SPILL_DIR = Path(os.getenv("AUDIT_SPILL_DIR", str(BASE_DIR / "audit_spill")))
+AUDIT_MAX_ATTEMPTS = int(os.getenv("AUDIT_MAX_ATTEMPTS", 5))
+
+# Resubmitted gate attempts get the earlier decision back (see
+# app/debounce.py): grants per employee and gate for GATE_DEBOUNCE_SECONDS,
+# any decision per Idempotency-Key for GATE_IDEMPOTENCY_SECONDS
+GATE_DEBOUNCE_SECONDS = float(os.getenv("GATE_DEBOUNCE_SECONDS", 3.0))
+GATE_IDEMPOTENCY_SECONDS = float(os.getenv("GATE_IDEMPOTENCY_SECONDS", 60.0))
+GATE_DECISION_CACHE_SIZE = int(os.getenv("GATE_DECISION_CACHE_SIZE", 4096))
+
+# Face templates per employee (see app/gallery.py): the enrollment photo plus
+# up to FACE_GALLERY_SIZE - 1 frames from confident gate matches (distance
+# at most FACE_GALLERY_UPDATE_DISTANCE), at most one per
+# FACE_GALLERY_UPDATE_INTERVAL seconds. Gate frames within FACE_MATCH_TOLERANCE
+# of any template are accepted.
+FACE_MATCH_TOLERANCE = float(os.getenv("FACE_MATCH_TOLERANCE", 0.5))
+FACE_GALLERY_SIZE = int(os.getenv("FACE_GALLERY_SIZE", 5))
+FACE_GALLERY_UPDATE_DISTANCE = float(os.getenv("FACE_GALLERY_UPDATE_DISTANCE", 0.4))
+FACE_GALLERY_UPDATE_INTERVAL = float(os.getenv("FACE_GALLERY_UPDATE_INTERVAL", 6 * 3600))
+
+# Reference photos are stored upright, downscaled so their longer side is at
+# most ENROLLMENT_MAX_SIDE pixels, and only with exactly one face of at least
+# ENROLLMENT_MIN_FACE_PX pixels (see app/enrollment.py)
+ENROLLMENT_MAX_SIDE = int(os.getenv("ENROLLMENT_MAX_SIDE", 800))
+ENROLLMENT_MIN_FACE_PX = int(os.getenv("ENROLLMENT_MIN_FACE_PX", 80))
+
+# Galleries of all employees, memory-mapped by every worker (see
+# app/face_index.py). FACE_INDEX_DTYPE float16 halves the file at a small
+# cost in precision; superseded rows above FACE_INDEX_COMPACT_RATIO of the
+# file trigger compaction.
+FACE_INDEX_DIR = Path(os.getenv("FACE_INDEX_DIR", str(BASE_DIR / "face_index")))
+FACE_INDEX_DTYPE = os.getenv("FACE_INDEX_DTYPE", "float32")
+FACE_INDEX_COMPACT_RATIO = float(os.getenv("FACE_INDEX_COMPACT_RATIO", 0.5))
+
+# Monthly partitions of the audit tables on Postgres (see app/partitions.py):
+# created PARTITION_MONTHS_AHEAD months ahead; months older than
+# PARTITION_RETENTION_MONTHS (0 keeps everything) are archived to
+# PARTITION_ARCHIVE_DIR as gzipped CSV and dropped
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", 0))
+PARTITION_ARCHIVE_DIR = Path(os.getenv("PARTITION_ARCHIVE_DIR", str(BASE_DIR / "archive")))
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 3600))
+
+# Gate sync feed (see app/sync.py): gates authenticate with one of the
+# comma-separated GATE_API_KEYS in X-Gate-Key (the feed is off without any).
+# Changes are kept SYNC_CHANGE_RETENTION seconds; gates further behind, or
+# more than SYNC_MAX_DELTA employees behind, get a full snapshot.
+GATE_API_KEYS = [key for key in os.getenv("GATE_API_KEYS", "").split(",") if key]
+SYNC_CHANGE_RETENTION = float(os.getenv("SYNC_CHANGE_RETENTION", 7 * 24 * 3600))
+SYNC_MAX_DELTA = int(os.getenv("SYNC_MAX_DELTA", 5000))
+
+# Batches of gate decisions uploaded to /api/sync/events (see
+# app/gate_events.py): at most GATE_BATCH_MAX_EVENTS events and
+# GATE_BATCH_MAX_BYTES of body, snapshots included; event timestamps may be
+# up to GATE_EVENT_MAX_SKEW seconds ahead of the server clock
+GATE_BATCH_MAX_EVENTS = int(os.getenv("GATE_BATCH_MAX_EVENTS", 1000))
+GATE_BATCH_MAX_BYTES = int(os.getenv("GATE_BATCH_MAX_BYTES", 64 * 1024 * 1024))
+GATE_EVENT_MAX_SKEW = float(os.getenv("GATE_EVENT_MAX_SKEW", 300))
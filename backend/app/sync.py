@@ -0,0 +1,161 @@
+"""Sync feed that lets gate devices decide locally.
+
+A gate downloads a snapshot of what it needs to check an attempt without
+the backend: per employee, the presence flag, the hashes and expiry dates of
+active QR codes, and the face gallery as float16 encodings. It then polls for
+the changes since the version it holds.
+
+Presence flips with every granted passage, so it is not versioned: every
+feed lists the ids of the employees present at the time it was read.
+
+Every commit that marks an ``employee``, ``qr_code`` or ``face_template``
+for cache invalidation also adds one ``change_log`` row per marked employee
+in the same transaction, so the feed covers exactly what the caches do.
+The row id is the sync version. On Postgres an advisory lock makes the
+ids commit in order, so a gate that has seen version N never misses a
+change numbered below N. A delta lists the current state of every employee
+changed after the given version, plus the ids of employees since deleted.
+A gate gets a full snapshot instead when it is behind the retained log,
+when more than ``SYNC_MAX_DELTA`` employees changed, or when a commit
+marked an entity as a whole.
+
+Feeds are encoded as msgpack, or as JSON with base64 encodings for clients
+that do not accept msgpack.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import msgpack
+from sqlalchemy import delete, event, func, insert, text
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, false, select, true
+
+from app import invalidation, settings
+from app.lazy import lazy_module
+from app.models import ChangeLog, Employee, FaceTemplate, QRCode
+
+np = lazy_module("numpy")
+
+SYNCED_ENTITIES = ("employee", "qr_code", "face_template")
+MSGPACK = "application/msgpack"
+
+# Serializes change log writers on Postgres
+_LOCK_ID = 0x73796E63
+# Old rows are pruned by every commit whose change ids include a multiple of this
+_PRUNE_EVERY = 1000
+
+
+def _record_changes(session: OrmSession) -> None:
+    pending = invalidation.invalidator.pending(session)
+    rows = []
+    now = datetime.now()
+    for entity in SYNCED_ENTITIES:
+        if entity not in pending:
+            continue
+        keys = pending[entity]
+        for key in sorted(keys, key=int) if keys is not None else [None]:
+            rows.append({"entity": entity, "employee_id": int(key) if key is not None else None, "created_at": now})
+    if not rows:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _LOCK_ID})
+    ids = session.execute(insert(ChangeLog).returning(ChangeLog.id), rows).scalars().all()
+    if (min(ids) - 1) // _PRUNE_EVERY != max(ids) // _PRUNE_EVERY:
+        # Always keeps the newest row, which holds the current version
+        cutoff = now - timedelta(seconds=settings.SYNC_CHANGE_RETENTION)
+        session.execute(delete(ChangeLog).where(ChangeLog.created_at < cutoff, ChangeLog.id < min(ids)))
+
+
+event.listen(OrmSession, "before_commit", _record_changes)
+
+
+def current_version(session: Session) -> int:
+    return session.exec(select(func.max(ChangeLog.id))).one() or 0
+
+
+def _present(session: Session) -> list[int]:
+    return list(session.exec(select(Employee.id).where(Employee.is_present == true()).order_by(Employee.id)))
+
+
+def _encodings(templates: list[FaceTemplate]) -> bytes:
+    encodings = np.frombuffer(b"".join(t.encoding for t in templates), dtype=np.float32)
+    return encodings.astype("<f2").tobytes()
+
+
+def _employees(session: Session, employee_ids: list[int] | None) -> list[dict[str, Any]]:
+    """Current feed entries for ``employee_ids``, or for everyone if None."""
+    employees = select(Employee)
+    qr_codes = select(QRCode).where(QRCode.is_revoked == false(), QRCode.expires_at > date.today())
+    templates = select(FaceTemplate).order_by(FaceTemplate.employee_id, FaceTemplate.created_at)
+    if employee_ids is not None:
+        employees = employees.where(Employee.id.in_(employee_ids))
+        qr_codes = qr_codes.where(QRCode.employee_id.in_(employee_ids))
+        templates = templates.where(FaceTemplate.employee_id.in_(employee_ids))
+
+    codes_by_employee: dict[int, list[list[str]]] = defaultdict(list)
+    for qr_code in session.exec(qr_codes):
+        codes_by_employee[qr_code.employee_id].append([qr_code.token_hash, qr_code.expires_at.isoformat()])
+    templates_by_employee: dict[int, list[FaceTemplate]] = defaultdict(list)
+    for template in session.exec(templates):
+        templates_by_employee[template.employee_id].append(template)
+
+    return [
+        {
+            "id": employee.id,
+            "is_present": employee.is_present,
+            "qr_codes": codes_by_employee.get(employee.id, []),
+            "encodings": _encodings(templates_by_employee.get(employee.id, [])),
+        }
+        for employee in session.exec(employees.order_by(Employee.id))
+    ]
+
+
+def snapshot(session: Session) -> dict[str, Any]:
+    """Everything a gate needs, as of the returned version or later."""
+    # Read first: state read afterwards may be newer, and is sent again in
+    # the next delta
+    version = current_version(session)
+    return {
+        "version": version,
+        "full": True,
+        "employees": _employees(session, None),
+        "deleted": [],
+        "present": _present(session),
+    }
+
+
+def changes_since(session: Session, since: int) -> dict[str, Any]:
+    """Employees changed after version ``since``, or a snapshot if that is not possible."""
+    version = current_version(session)
+    if since >= version:
+        return {"version": version, "full": False, "employees": [], "deleted": [], "present": _present(session)}
+    oldest = session.exec(select(func.min(ChangeLog.id))).one()
+    if since < 0 or oldest is None or since < oldest - 1:
+        return snapshot(session)
+    stmt = select(ChangeLog.employee_id).where(ChangeLog.id > since, ChangeLog.id <= version).distinct()
+    changed = session.exec(stmt).all()
+    if None in changed or len(changed) > settings.SYNC_MAX_DELTA:
+        return snapshot(session)
+    employees = _employees(session, list(changed))
+    existing = {employee["id"] for employee in employees}
+    return {
+        "version": version,
+        "full": False,
+        "employees": employees,
+        "deleted": sorted(set(changed) - existing),
+        "present": _present(session),
+    }
+
+
+def encode(feed: dict[str, Any], media_type: str) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb({**feed, "encoding_dtype": "float16"})
+    employees = [
+        {**employee, "encodings": base64.b64encode(employee["encodings"]).decode()} for employee in feed["employees"]
+    ]
+    return json.dumps({**feed, "employees": employees, "encoding_dtype": "float16"}, separators=(",", ":")).encode()
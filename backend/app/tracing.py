@@ -0,0 +1,292 @@
+"""Lightweight request tracing.
+
+A root span is opened per HTTP request by ``TracingMiddleware``; nested
+``span``/``traced`` blocks become its children through a context variable.
+Sampling is decided once per trace (``TRACE_SAMPLE_RATE``); unsampled traces
+cost one context variable lookup per span.
+
+Finished spans go to a pluggable exporter: an in-memory ring buffer by
+default, or a JSON-lines file (``TRACE_EXPORTER=jsonl``). A process working
+for another one (the recognition worker service) continues its trace from an
+``inject`` carrier, gathers its spans with ``collect_spans`` and sends them
+back, and the caller exports them with ``record_spans``.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Protocol
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import settings
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_time: float
+    duration: float = 0.0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+    def find_traces(self, key: str, value: Any) -> list[dict[str, Any]]: ...
+
+
+class RingBufferExporter:
+    """Keeps the most recent ``maxlen`` spans in memory."""
+
+    def __init__(self, maxlen: int):
+        self.spans: deque[Span] = deque(maxlen=maxlen)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def find_traces(self, key: str, value: Any) -> list[dict[str, Any]]:
+        spans = list(self.spans)
+        trace_ids = {s.trace_id for s in spans if s.attributes.get(key) == value}
+        return [s.to_dict() for s in spans if s.trace_id in trace_ids]
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per finished span to ``path``."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a") as file:
+            file.write(line + "\n")
+
+    def find_traces(self, key: str, value: Any) -> list[dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with open(self.path) as file:
+            spans = [json.loads(line) for line in file if line.strip()]
+        trace_ids = {s["trace_id"] for s in spans if s["attributes"].get(key) == value}
+        return [s for s in spans if s["trace_id"] in trace_ids]
+
+
+class NoopExporter:
+    def export(self, span: Span) -> None:
+        pass
+
+    def find_traces(self, key: str, value: Any) -> list[dict[str, Any]]:
+        return []
+
+
+def _exporter_from_settings() -> Exporter:
+    if settings.TRACE_EXPORTER == "jsonl":
+        return JsonLinesExporter(Path(settings.TRACE_FILE))
+    if settings.TRACE_EXPORTER == "none":
+        return NoopExporter()
+    return RingBufferExporter(settings.TRACE_BUFFER_SIZE)
+
+
+_exporter: Exporter = _exporter_from_settings()
+
+
+def get_exporter() -> Exporter:
+    return _exporter
+
+
+def set_exporter(exporter: Exporter) -> None:
+    global _exporter
+    _exporter = exporter
+
+
+# Marks the current context as part of an unsampled trace
+_UNSAMPLED = object()
+_current: ContextVar[Any] = ContextVar("current_span", default=None)
+# Finished spans kept for another process instead of being exported here
+_collected: ContextVar[list[Span] | None] = ContextVar("collected_spans", default=None)
+
+
+def current_span() -> Span | None:
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Sets an attribute on the current span, if the trace is sampled."""
+    span = current_span()
+    if span is not None:
+        span.set_attribute(key, value)
+
+
+def inject() -> dict[str, Any] | None:
+    """Returns a carrier for continuing the current trace in another process."""
+    current = _current.get()
+    if current is None:
+        return None
+    if current is _UNSAMPLED:
+        return {"sampled": False}
+    return {"sampled": True, "trace_id": current.trace_id, "span_id": current.span_id}
+
+
+@contextmanager
+def span(
+    name: str,
+    *,
+    root: bool = True,
+    carrier: dict[str, Any] | None = None,
+    **attributes: Any,
+) -> Iterator[Span | None]:
+    """Records a span around the enclosed block.
+
+    Args:
+        name: span name
+        root: start a new (sampled or not) trace when none is active;
+            with False the block is only traced inside an existing trace
+        carrier: trace context from ``inject`` in another process
+        attributes: initial span attributes
+
+    Yields:
+        Span | None: the recording span, or None when not sampled
+    """
+    parent = _current.get()
+    if carrier is not None:
+        parent = _UNSAMPLED if not carrier.get("sampled") else Span(
+            name="remote",
+            trace_id=carrier["trace_id"],
+            span_id=carrier["span_id"],
+            parent_id=None,
+            start_time=0.0,
+        )
+
+    if parent is _UNSAMPLED or (parent is None and not root):
+        yield None
+        return
+
+    if parent is None and random.random() >= settings.TRACE_SAMPLE_RATE:
+        token = _current.set(_UNSAMPLED)
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+
+    new_span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent is not None else None,
+        start_time=time.time(),
+        attributes=attributes,
+    )
+    token = _current.set(new_span)
+    start = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = repr(e)
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - start
+        _current.reset(token)
+        collected = _collected.get()
+        if collected is not None:
+            collected.append(new_span)
+        else:
+            _exporter.export(new_span)
+
+
+@contextmanager
+def collect_spans() -> Iterator[list[Span]]:
+    """Collects the spans finished in the enclosed block instead of exporting them."""
+    spans: list[Span] = []
+    token = _collected.set(spans)
+    try:
+        yield spans
+    finally:
+        _collected.reset(token)
+
+
+def record_spans(spans: list[dict[str, Any]]) -> None:
+    """Exports spans collected in another process (``Span.to_dict`` form)."""
+    for data in spans:
+        _exporter.export(Span(**data))
+
+
+def traced(name: str | None = None) -> Callable:
+    """Decorator recording a child span for each call within an active trace."""
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, root=False):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=False):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn: Callable) -> Callable:
+    """Binds ``fn`` to the current trace context for running in a thread pool."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class TracingMiddleware:
+    """Opens a root span per HTTP request and returns its id in ``X-Trace-Id``."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            **{"http.method": scope["method"], "http.path": scope["path"]},
+        ) as request_span:
+            if request_span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-trace-id", request_span.trace_id.encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
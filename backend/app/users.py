@@ -1,27 +1,116 @@
+import threading
+import time
 import uuid
+from collections import OrderedDict
 
+import jwt
 from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, IntegerIDMixin, models
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, FastAPIUsers, IntegerIDMixin, exceptions, models
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt
+from sqlalchemy.orm import make_transient_to_detached
 
+from app import invalidation, metrics, settings
 from app.db import get_user_db
 from app.models import User
 
 SECRET = "SECRET"
 
 
+class UserCache:
+    """Users by token subject, each kept for ``ttl`` seconds (LRU-bounded).
+
+    Entries are detached snapshots, not bound to the session that loaded
+    them; ``CachedJWTStrategy`` merges them into the session of the request
+    they are served to.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, User]] = OrderedDict()
+        # Evictions also arrive from the cache invalidation listener thread
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> User | None:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(subject, None)
+                return None
+            self._entries.move_to_end(subject)
+            return entry[1]
+
+    def put(self, subject: str, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        # A commit in the loading request would expire the session's instance
+        snapshot = User(**user.model_dump())
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(ttl=settings.USER_CACHE_TTL, maxsize=settings.USER_CACHE_SIZE)
+invalidation.register("user", evict=user_cache.invalidate, clear=user_cache.clear)
+
+
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> User | None:
+        """Same as ``BaseUserManager.authenticate``, with password hashing in
+        the thread pool so a login does not stall the event loop."""
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Run the hasher to mitigate timing attack
+            await run_in_threadpool(self.password_helper.hash, credentials.password)
+            return None
+
+        verified, updated_password_hash = await run_in_threadpool(
+            self.password_helper.verify_and_update, credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+
+        return user
+
     async def on_after_register(self, user: User, request: Request | None = None):
         print(f"User {user.id} has registered.")
 
+    def _invalidate(self, user: User) -> None:
+        # The change is already committed; this commit only announces it
+        invalidation.mark(self.user_db.session, "user", user.id)
+        self.user_db.session.commit()
+
+    async def on_after_update(self, user: User, update_dict: dict, request: Request | None = None):
+        self._invalidate(user)
+
+    async def on_after_delete(self, user: User, request: Request | None = None):
+        self._invalidate(user)
+
     async def on_after_forgot_password(
         self, user: User, token: str, request: Request | None = None
     ):
@@ -45,8 +134,45 @@ cookie_transport = CookieTransport(
 )
 
 
-def get_jwt_strategy() -> JWTStrategy[models.UP, models.ID]:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+class CachedJWTStrategy(JWTStrategy[models.UP, models.ID]):
+    """JWT strategy that serves the token's user from ``user_cache``."""
+
+    def subject(self, token: str | None) -> str | None:
+        """Returns the token subject (user id), or None if the token is invalid."""
+        if token is None:
+            return None
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+        except jwt.PyJWTError:
+            return None
+        return data.get("sub")
+
+    async def read_token(
+        self, token: str | None, user_manager: BaseUserManager[models.UP, models.ID]
+    ) -> models.UP | None:
+        subject = self.subject(token)
+        if subject is None:
+            return None
+
+        user = user_cache.get(subject)
+        if user is not None:
+            metrics.USER_CACHE_LOOKUPS.inc(result="hit")
+            # A copy in this request's session, without a query
+            return user_manager.user_db.session.merge(user, load=False)
+        metrics.USER_CACHE_LOOKUPS.inc(result="miss")
+
+        try:
+            user = await user_manager.get(user_manager.parse_id(subject))
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+        user_cache.put(subject, user)
+        return user
+
+
+def get_jwt_strategy() -> CachedJWTStrategy[models.UP, models.ID]:
+    return CachedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
 auth_backend: AuthenticationBackend = AuthenticationBackend(
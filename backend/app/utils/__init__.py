@@ -0,0 +1,10 @@
+"""Helpers grouped by concern.
+
+Heavy dependencies (OpenCV, numpy, face_recognition/dlib, reportlab,
+fastapi-mail) are imported lazily by the submodules on first use.
+"""
+from app.utils.face import FrameQualityError, check_frame_quality, parse_face_hint, verify_face
+from app.utils.files import _get_upload_path, save_photo
+from app.utils.mail import generate_qr_and_send_email, get_mail_config, send_report_email
+from app.utils.reports import generate_report_pdf
+from app.utils.tokens import verify_token
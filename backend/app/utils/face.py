@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from fastapi import UploadFile
+from app import metrics, settings
+from app.ingest import IngestedImage
+from app.lazy import lazy_module
+from app.utils.files import _get_upload_path
+
+cv2 = lazy_module("cv2")
+face_recognition = lazy_module("face_recognition")
+np = lazy_module("numpy")
+
+
+class FrameQualityError(Exception):
+    """Camera frame rejected by the quality gate before face encoding.
+
+    ``reason`` is a short machine-readable code used as a metrics label,
+    ``message`` is the human-readable denial reason.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+
+_face_cascade = None
+
+
+def _get_face_cascade():
+    """Returns the OpenCV Haar face cascade, or None if the build lacks it."""
+    global _face_cascade
+    if _face_cascade is None and hasattr(cv2, "CascadeClassifier"):
+        _face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+    return _face_cascade
+
+
+def _detect_faces_fast(gray: np.ndarray, min_size: int) -> list[tuple[int, int, int, int]]:
+    """Returns (x, y, w, h) face boxes found by a cheap detector.
+
+    Uses the OpenCV Haar cascade when the installed build ships it and falls
+    back to dlib's HOG detector on the (already downscaled) frame otherwise.
+
+    Args:
+        gray: grayscale image
+        min_size: smallest face side to look for, in ``gray`` pixels; the
+            cascade skips the window sizes below it, which is most of its work
+    """
+    cascade = _get_face_cascade()
+    if cascade is not None:
+        boxes = cascade.detectMultiScale(gray, 1.2, 3, minSize=(min_size, min_size))
+    else:
+        boxes = [
+            (left, top, right - left, bottom - top)
+            for top, right, bottom, left in face_recognition.face_locations(gray, 1)
+        ]
+    return [tuple(box) for box in boxes if max(box[2], box[3]) >= min_size]
+
+
+# (top, right, bottom, left), the order face_recognition uses
+FaceBox = tuple[int, int, int, int]
+
+
+def parse_face_hint(face_box: str | None, aligned_crop: bool, width: int, height: int) -> FaceBox | None:
+    """Validates a face location supplied by the gate.
+
+    Args:
+        face_box: ``"x,y,w,h"`` in frame pixels, or None
+        aligned_crop: the whole frame is a tight crop of the face
+        width: frame width from the image header (0 if unknown)
+        height: frame height from the image header (0 if unknown)
+
+    Raises:
+        ValueError: if the hint is malformed or does not fit the frame
+
+    Returns:
+        FaceBox | None: the face location, or None without a hint
+    """
+    if face_box is None and not aligned_crop:
+        return None
+    if not width or not height:
+        raise ValueError("Face location given for an unreadable image.")
+    if aligned_crop:
+        if face_box is not None:
+            raise ValueError("Give either a face box or an aligned crop, not both.")
+        x, y, w, h = 0, 0, width, height
+    else:
+        try:
+            x, y, w, h = (int(value) for value in face_box.split(","))
+        except ValueError:
+            raise ValueError("Face box must be four integers: x,y,w,h.") from None
+        if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > width or y + h > height:
+            raise ValueError("Face box lies outside the image.")
+    # Faces are roughly square; anything else is not a face box
+    if not 0.5 <= w / h <= 2:
+        raise ValueError("Face box has an implausible aspect ratio.")
+    return y, x + w, y + h, x
+
+
+def check_frame_quality(
+    frame: np.ndarray,
+    pixel_scale: float = 1.0,
+    face_box: FaceBox | None = None,
+) -> None:
+    """Rejects dark, blurry or faceless frames using cheap OpenCV measures.
+
+    Args:
+        frame: decoded BGR camera frame
+        pixel_scale: original frame pixels per decoded pixel (for frames
+            decoded at reduced resolution)
+        face_box: face location supplied by the gate, in original frame
+            pixels; replaces face detection
+
+    Raises:
+        FrameQualityError: if the frame is unusable for face recognition
+    """
+    height, width = frame.shape[:2]
+    scale = min(1.0, settings.FRAME_QUALITY_WORKING_SIZE / max(height, width))
+    if scale < 1.0:
+        frame = cv2.resize(
+            frame,
+            (max(1, int(width * scale)), max(1, int(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    brightness = float(gray.mean())
+    if brightness < settings.FRAME_MIN_BRIGHTNESS:
+        raise FrameQualityError("too_dark", "Camera frame is too dark.")
+    if brightness > settings.FRAME_MAX_BRIGHTNESS:
+        raise FrameQualityError("too_bright", "Camera frame is overexposed.")
+
+    if cv2.Laplacian(gray, cv2.CV_64F).var() < settings.FRAME_MIN_SHARPNESS:
+        raise FrameQualityError("too_blurry", "Camera frame is too blurry.")
+
+    if face_box is not None:
+        top, right, bottom, left = face_box
+        largest = max(right - left, bottom - top)
+    else:
+        # Faces below the minimum are not looked for and count as no face
+        faces = _detect_faces_fast(gray, int(settings.FRAME_MIN_FACE_PX * scale / pixel_scale))
+        if not faces:
+            raise FrameQualityError("no_face", "No face detected in camera frame.")
+        largest = max(max(w, h) for _, _, w, h in faces) / scale * pixel_scale
+    if largest < settings.FRAME_MIN_FACE_PX:
+        raise FrameQualityError("face_too_small", "Face in camera frame is too small.")
+
+
+# Longer side the region around a gate-supplied face location is scaled to
+# before the cheap detector checks it
+_HINT_WORKING_SIZE = 160
+
+
+def check_face_hint(frame: np.ndarray, face_box: FaceBox) -> None:
+    """Confirms with the cheap detector that a gate-supplied face location
+    holds a face about the size of the location.
+
+    The hint stands in for full face detection, so without this check any
+    image sent with ``aligned_crop`` or a ``face_box`` would be encoded as
+    if it showed a face.
+
+    Args:
+        frame: decoded BGR camera frame
+        face_box: face location in ``frame`` pixels
+
+    Raises:
+        FrameQualityError: if there is no face at the location
+    """
+    height, width = frame.shape[:2]
+    top, right, bottom, left = face_box
+    size = max(right - left, bottom - top)
+    # Detectors need some context around the face
+    margin = size // 4
+    region = frame[max(0, top - margin) : min(height, bottom + margin), max(0, left - margin) : min(width, right + margin)]
+    scale = min(1.0, _HINT_WORKING_SIZE / max(region.shape[:2]))
+    if scale < 1.0:
+        region = cv2.resize(
+            region,
+            (max(1, int(region.shape[1] * scale)), max(1, int(region.shape[0] * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    # A face under half the size of the location does not fill it
+    if not _detect_faces_fast(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY), int(size * scale / 2)):
+        raise FrameQualityError("no_face_at_hint", "No face at the face location given by the gate.")
+
+
+def record_quality_rejection(error: FrameQualityError) -> None:
+    """Counts a quality-gate rejection and the recognition time it saved."""
+    metrics.FRAME_QUALITY_REJECTIONS.inc(reason=error.reason)
+    metrics.RECOGNITION_SECONDS_SAVED.inc(metrics.FACE_RECOGNITION_SECONDS.mean())
+
+
+@dataclass(frozen=True)
+class FaceMatch:
+    """Comparison of a camera frame's face with a gallery of templates."""
+
+    distance: float  # to the closest template
+    encoding: np.ndarray  # of the frame's face, for gallery updates
+
+
+def encode_face(rgb_image: np.ndarray) -> np.ndarray | None:
+    """Returns the encoding of the first face in an RGB image, or None."""
+    encodings = face_recognition.face_encodings(rgb_image)
+    return encodings[0] if encodings else None
+
+
+def _ingested(photo: UploadFile | IngestedImage) -> IngestedImage:
+    if isinstance(photo, IngestedImage):
+        return photo
+    photo.file.seek(0)
+    return IngestedImage.from_bytes(photo.file.read())
+
+
+def _decode_frame(photo: UploadFile | IngestedImage, face_box: FaceBox | None = None) -> np.ndarray | None:
+    """Decodes a camera frame and runs the quality gate on it.
+
+    Raises:
+        FrameQualityError: if the camera frame fails the quality gate
+    """
+    photo = _ingested(photo)
+    with metrics.stage("decode"):
+        camera_frame = photo.decode()
+    if camera_frame is None:
+        return None
+
+    if settings.FRAME_QUALITY_CHECK:
+        try:
+            with metrics.stage("quality"):
+                check_frame_quality(camera_frame, pixel_scale=photo.reduction, face_box=face_box)
+        except FrameQualityError as e:
+            record_quality_rejection(e)
+            raise
+    return camera_frame
+
+
+def _scale_box(face_box: FaceBox, reduction: int, frame: np.ndarray) -> FaceBox:
+    """Maps a box in original pixels onto a frame decoded at ``1/reduction``."""
+    height, width = frame.shape[:2]
+    top, right, bottom, left = (value // reduction for value in face_box)
+    return max(0, top), min(width, right), min(height, bottom), max(0, left)
+
+
+def _match(gallery: np.ndarray, camera_frame: np.ndarray, face_box: FaceBox | None = None) -> FaceMatch | None:
+    rgb_frame = np.ascontiguousarray(camera_frame[:, :, ::-1])
+    if face_box is not None:
+        # Located by the gate and checked by check_face_hint: skips
+        # detection, the most expensive stage
+        face_locations = [face_box]
+    else:
+        with metrics.stage("detect"):
+            face_locations = face_recognition.face_locations(rgb_frame)
+    with metrics.stage("encode"):
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+
+    if not face_encodings:
+        return None
+
+    with metrics.stage("compare"):
+        # One vectorized distance computation against every template
+        distances = face_recognition.face_distance(gallery, face_encodings[0])
+        return FaceMatch(distance=float(distances.min()), encoding=face_encodings[0])
+
+
+def match_face(
+    gallery: np.ndarray,
+    photo: UploadFile | IngestedImage,
+    face_box: FaceBox | None = None,
+) -> FaceMatch | None:
+    """Compares the face in a camera frame with a gallery of face encodings.
+
+    Args:
+        gallery: (n, 128) array of the employee's templates
+        photo: camera frame
+        face_box: face location supplied by the gate, in original frame
+            pixels (see ``parse_face_hint``); replaces face detection once
+            ``check_face_hint`` finds a face there
+
+    Returns:
+        FaceMatch, or None if the gallery is empty or the frame has no face
+
+    Raises:
+        FrameQualityError: if the camera frame fails the quality gate
+    """
+    if len(gallery) == 0:
+        return None
+    photo = _ingested(photo)
+    camera_frame = _decode_frame(photo, face_box)
+    if camera_frame is None:
+        return None
+    if face_box is not None:
+        face_box = _scale_box(face_box, photo.reduction, camera_frame)
+        try:
+            with metrics.stage("hint"):
+                check_face_hint(camera_frame, face_box)
+        except FrameQualityError as e:
+            record_quality_rejection(e)
+            raise
+    with metrics.FACE_RECOGNITION_SECONDS.time():
+        return _match(gallery, camera_frame, face_box)
+
+
+def verify_face(
+    stored_photo_path: str,
+    photo: UploadFile | IngestedImage,
+    tolerance: float = 0.5
+) -> bool:
+    """
+    Porównuje twarz ze zdjęcia z bazy z twarzą z klatki kamery
+
+    Large camera frames are decoded at reduced resolution (see
+    ``IngestedImage.reduction``).
+
+    Raises:
+        FrameQualityError: if the camera frame fails the quality gate
+    """
+    camera_frame = _decode_frame(photo)
+    if camera_frame is None:
+        return False
+
+    with metrics.FACE_RECOGNITION_SECONDS.time():
+        # --- zdjęcie z bazy ---
+        with metrics.stage("reference"):
+            photo_path = _get_upload_path(stored_photo_path)
+            known_encoding = encode_face(face_recognition.load_image_file(photo_path))
+
+        if known_encoding is None:
+            return False
+
+        match = _match(known_encoding[np.newaxis], camera_frame)
+    return match is not None and match.distance <= tolerance
@@ -0,0 +1,27 @@
+import os
+import shutil
+from app import settings
+from app.ingest import IngestedImage
+from app.tracing import traced
+
+
+def _get_upload_path(file_name: str) -> str:
+    if os.environ.get("TESTING"):
+        upload_dir = settings.TEST_UPLOAD_DIR
+    else:
+        upload_dir = settings.UPLOAD_DIR
+    os.makedirs(upload_dir, exist_ok=True)
+    return str(upload_dir / file_name)
+
+
+@traced()
+def save_photo(path_name, photo):
+    """Saves photo (UploadFile, IngestedImage or raw bytes) to uploads folder"""
+    file_path = _get_upload_path(path_name)
+    if isinstance(photo, IngestedImage):
+        photo = photo.data
+    with open(file_path, "wb") as file:
+        if isinstance(photo, (bytes, bytearray)):
+            file.write(photo)
+        else:
+            shutil.copyfileobj(photo.file, file)
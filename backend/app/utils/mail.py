@@ -0,0 +1,99 @@
+import functools
+import io
+import os
+from datetime import datetime, timedelta
+from fastapi import UploadFile
+from app import settings
+from app.lazy import lazy_module
+from app.tracing import traced
+
+fastapi_mail = lazy_module("fastapi_mail")
+
+
+@functools.cache
+def get_mail_config():
+    """Builds the SMTP configuration on first use."""
+    if not settings.TESTING:
+        return fastapi_mail.ConnectionConfig(
+            MAIL_USERNAME=os.getenv("EMAIL_HOST_USER", ""),
+            MAIL_PASSWORD=os.getenv("EMAIL_HOST_PASSWORD", ""),
+            MAIL_FROM=os.getenv("EMAIL_HOST_USER", ""),
+            MAIL_PORT=os.getenv("EMAIL_PORT", 578),
+            MAIL_SERVER=os.getenv("EMAIL_HOST", "smtp.mailtrap.io"),
+            MAIL_STARTTLS=True,
+            MAIL_SSL_TLS=False,
+        )
+    return fastapi_mail.ConnectionConfig(
+        MAIL_USERNAME="test_user",
+        MAIL_PASSWORD="test_password",
+        MAIL_FROM="test@test.com",
+        MAIL_PORT=1025,
+        MAIL_SERVER="localhost",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+    )
+
+
+@traced("email.send_qr_code")
+async def generate_qr_and_send_email(*, recipient: str, token: str) -> None:
+    """Generates QR code image and sends it via email"""
+    import qrcode
+
+    qr_img = qrcode.make(token)
+    qr_img = qr_img.convert("RGB")
+    buffer = io.BytesIO()
+    qr_img.save(buffer, format="PNG")
+    buffer.seek(0)
+
+    upload_file = UploadFile(
+        file=buffer,
+        filename="qrcode.png"
+    )
+    message = fastapi_mail.MessageSchema(
+        subject="Your QR Code",
+        recipients=[recipient],
+        body="Here is your QR code. Check the attachment.",
+        subtype="plain",
+        attachments=[upload_file],
+    )
+
+    fm = fastapi_mail.FastMail(get_mail_config())
+    await fm.send_message(message)
+
+
+@traced("email.send_report")
+async def send_report_email(recipient_email: str, pdf_content: bytes, days: int) -> None:
+    """Send the work time report PDF via email."""
+    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    end_date = datetime.now().strftime('%Y-%m-%d')
+
+    # Wrap bytes into UploadFile to satisfy fastapi-mail validation
+    pdf_file = UploadFile(
+        filename=f"raport_czasu_pracy_{start_date}_{end_date}.pdf",
+        file=io.BytesIO(pdf_content),
+    )
+
+    message = fastapi_mail.MessageSchema(
+        subject=f"Raport Czasu Pracy ({start_date} - {end_date})",
+        recipients=[recipient_email],
+        body=f"""
+        <html>
+        <body>
+            <h2>Raport Czasu Pracy</h2>
+            <p>W załączniku znajduje się raport czasu pracy za ostatnie {days} dni.</p>
+            <p>Okres: {start_date} - {end_date}</p>
+            <p>Raport zawiera podsumowanie godzin pracy wszystkich pracowników.</p>
+            <br>
+            <p style="color: gray; font-size: 12px;">
+                Wiadomość wygenerowana przez SecureEntrySystem.<br>
+                Data wygenerowania: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            </p>
+        </body>
+        </html>
+        """,
+        subtype=fastapi_mail.MessageType.html,
+        attachments=[pdf_file],
+    )
+
+    fm = fastapi_mail.FastMail(get_mail_config())
+    await fm.send_message(message)
@@ -0,0 +1,58 @@
+import io
+from datetime import datetime, timedelta
+
+
+def generate_report_pdf(report_data: list[dict], days: int) -> bytes:
+    """Generate a PDF report with work time summary for the last N days.
+    
+    Args:
+        report_data: List of dicts with employee_id, first_name, last_name, total_hours
+        days: Number of days the report covers
+        
+    Returns:
+        PDF file as bytes
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+    )
+    
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    end_date = datetime.now().strftime('%Y-%m-%d')
+    
+    # Title
+    elements.append(Paragraph("Raport Czasu Pracy", styles['Heading1']))
+    elements.append(Paragraph(f"Okres: {start_date} - {end_date}", styles['Normal']))
+    elements.append(Paragraph(f"Wygenerowano: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+    
+    # Employee rows
+    elements.append(Paragraph("ID | Imię | Nazwisko | Godziny", styles['Heading2']))
+    elements.append(Spacer(1, 10))
+    
+    total_hours = 0
+    for row in report_data:
+        line = f"{row['employee_id']} | {row['first_name']} | {row['last_name']} | {row['total_hours']:.2f} h"
+        elements.append(Paragraph(line, styles['Normal']))
+        total_hours += row['total_hours']
+    
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph(f"SUMA: {total_hours:.2f} h", styles['Heading2']))
+    elements.append(Paragraph(f"Liczba pracowników: {len(report_data)}", styles['Normal']))
+    
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.getvalue()
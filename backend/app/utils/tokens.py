@@ -0,0 +1,7 @@
+import hashlib
+import hmac
+
+
+def verify_token(token: str, stored_hash: str) -> bool:
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    return hmac.compare_digest(token_hash, stored_hash)
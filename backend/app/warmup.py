@@ -0,0 +1,82 @@
+"""Recognition model preloading, warm-up and readiness.
+
+``prepare`` imports OpenCV and face_recognition (loading the dlib models) and
+runs one detection and encoding on a bundled image, so the first gate request
+does not pay for it. Under gunicorn with ``preload_app`` it runs in the master
+process before workers are forked (see ``gunicorn.conf.py``), so the workers
+share the model pages copy-on-write; the lifespan hook then finds it done.
+"""
+import logging
+import threading
+import time
+from app import metrics, settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_prepared = False
+_ready = threading.Event()
+
+
+def preload_models() -> None:
+    """Imports the recognition stack; face_recognition loads the dlib models on import."""
+    import face_recognition  # noqa: F401
+    from app.utils.face import _get_face_cascade
+
+    _get_face_cascade()
+
+
+def warm_up(image_path: str) -> None:
+    """Runs the quality gate, detection and encoding once on ``image_path``."""
+    import cv2
+    import face_recognition
+    import numpy as np
+    from app.utils.face import FrameQualityError, check_frame_quality
+
+    frame = cv2.imread(image_path)
+    if frame is None:
+        raise RuntimeError(f"Cannot read warm-up image {image_path}")
+    try:
+        check_frame_quality(frame)
+    except FrameQualityError:
+        pass
+    rgb = np.ascontiguousarray(frame[:, :, ::-1])
+    locations = face_recognition.face_locations(rgb)
+    face_recognition.face_encodings(rgb, locations)
+
+
+def prepare(image_path: str | None = None) -> None:
+    """Preloads the models and warms them up once per process tree."""
+    global _prepared
+    with _lock:
+        if _prepared:
+            return
+        start = time.perf_counter()
+        preload_models()
+        loaded = time.perf_counter()
+        warm_up(image_path or settings.WARMUP_IMAGE)
+        done = time.perf_counter()
+        metrics.WARMUP_SECONDS.set(loaded - start, phase="preload")
+        metrics.WARMUP_SECONDS.set(done - loaded, phase="inference")
+        logger.info(
+            "Recognition models preloaded in %.2fs, warm-up inference took %.2fs",
+            loaded - start,
+            done - loaded,
+        )
+        _prepared = True
+
+
+def is_prepared() -> bool:
+    return _prepared
+
+
+def mark_ready() -> None:
+    _ready.set()
+
+
+def mark_not_ready() -> None:
+    _ready.clear()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
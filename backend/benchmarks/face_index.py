@@ -0,0 +1,90 @@
+"""Face index benchmark: time to open the index and to look up galleries.
+
+Builds an index of random encodings in a temporary directory, then opens it
+in fresh ``FaceIndex`` objects, as a newly started worker would.
+
+Run from ``backend/``::
+
+    python -m benchmarks.face_index --employees 100000 --templates 5
+    python -m benchmarks.face_index --dtype float16
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app import face_index
+from app.face_index import FaceIndex
+from benchmarks.stats import save_report, summarize
+
+
+def build(directory: Path, employees: int, templates: int, dtype: str) -> None:
+    """Writes one generation directly; ``put`` per employee would take minutes."""
+    records = np.zeros(employees * templates, dtype=face_index._record_dtype())
+    records["employee_id"] = np.repeat(np.arange(1, employees + 1), templates)
+    records["version"] = 1
+    rng = np.random.default_rng(0)
+    chunks = (
+        rng.standard_normal((min(10_000, employees - i), templates * face_index.ENCODING_SIZE)).reshape(
+            -1, face_index.ENCODING_SIZE
+        )
+        for i in range(0, employees, 10_000)
+    )
+    FaceIndex(directory, dtype=dtype)._write_generation(1, records, chunks)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=100_000)
+    parser.add_argument("--templates", type=int, default=5)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        build(directory, args.employees, args.templates, args.dtype)
+
+        opens = []
+        for _ in range(args.repeat):
+            index = FaceIndex(directory, dtype=args.dtype)
+            start = time.perf_counter()
+            index.open()
+            opens.append(time.perf_counter() - start)
+            index.close()
+
+        index = FaceIndex(directory, dtype=args.dtype)
+        index.open()
+        # As if every gallery had been checked against the database already
+        index._trusted.update(range(1, args.employees + 1))
+        lookups = []
+        for employee_id in random.choices(range(1, args.employees + 1), k=args.lookups):
+            start = time.perf_counter()
+            index.get(employee_id)
+            lookups.append(time.perf_counter() - start)
+
+    report = {
+        "employees": args.employees,
+        "rows": args.employees * args.templates,
+        "dtype": args.dtype,
+        "open": summarize(opens),
+        "lookup": summarize(lookups),
+    }
+    print(
+        f"{report['rows']} rows ({args.dtype})\n"
+        f"open    p50={report['open']['p50_ms']:.0f}ms  p99={report['open']['p99_ms']:.0f}ms\n"
+        f"lookup  p50={report['lookup']['p50_ms'] * 1000:.0f}us  p99={report['lookup']['p99_ms'] * 1000:.0f}us"
+    )
+    if args.json:
+        save_report(report, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Profiling helpers producing flame-graph-ready output.
+
+``profiled`` wraps a block in either cProfile (dumps a ``.prof`` file for
+snakeviz, gprof2dot or flameprof) or a small sampling profiler that writes
+folded stacks (``a;b;c <count>``) accepted by flamegraph.pl and speedscope.
+"""
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval.
+
+    Args:
+        interval: seconds between samples
+        thread_id: thread to sample, defaults to the calling thread
+    """
+
+    def __init__(self, interval: float = 0.001, thread_id: int | None = None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                name = f"{Path(code.co_filename).name}:{code.co_name}"
+                # Folded stacks use the last space as the count separator
+                frames.append(name.replace(" ", "_"))
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(mode: str | None, output: Path) -> Iterator[None]:
+    """Profiles the enclosed block.
+
+    Args:
+        mode: ``"cprofile"``, ``"sample"`` or None to disable profiling
+        output: file path without suffix; ``.prof`` or ``.folded`` is appended
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = output.with_suffix(".prof")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path}")
+    elif mode == "sample":
+        sampler = SamplingProfiler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = output.with_suffix(".folded")
+            sampler.write_folded(path)
+            print(
+                f"{sum(sampler.stacks.values())} samples over "
+                f"{time.perf_counter() - started:.1f}s written to {path}"
+            )
+    else:
+        raise ValueError(f"Unknown profiling mode: {mode}")
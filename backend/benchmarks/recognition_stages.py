@@ -0,0 +1,176 @@
+"""Stage-level micro-benchmarks for the face recognition pipeline.
+
+Times every stage of ``verify_face`` (decode, quality gate, detect, encode,
+compare) plus the snapshot write separately, across image sizes and detector
+settings, using the images in ``tests/photos`` and ``uploads``. No camera or
+database is needed.
+
+Run from ``backend/``::
+
+    python -m benchmarks.recognition_stages --sizes 320,640,original --upsample 0,1
+    python -m benchmarks.recognition_stages --profile sample --profile-output prof/stages
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.profiling import profiled
+from benchmarks.stats import save_report, summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_IMAGES = [
+    *sorted((BACKEND_DIR / "tests" / "photos").glob("*.png")),
+    *sorted((BACKEND_DIR / "uploads").glob("*.png")),
+    *sorted((BACKEND_DIR / "uploads").glob("*.jpeg")),
+]
+REFERENCE_PHOTO = BACKEND_DIR / "tests" / "photos" / "user_1.png"
+
+
+def _timed(samples: list[float], fn: Callable, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def bench_image(
+    path: Path,
+    *,
+    size: int | None,
+    upsample: int,
+    model: str,
+    jitters: int,
+    repeat: int,
+    reference_encoding,
+    save_dir: Path,
+) -> dict[str, list[float]]:
+    """Runs every stage ``repeat`` times on one image at one setting.
+
+    Returns:
+        dict[str, list[float]]: stage name -> durations in seconds
+    """
+    import cv2
+    import face_recognition
+    import numpy as np
+    from app.ingest import IngestedImage
+    from app.utils import FrameQualityError, check_frame_quality
+
+    image = cv2.imread(str(path))
+    if size is not None and max(image.shape[:2]) > size:
+        scale = size / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(path.suffix, image)
+    if not ok:
+        raise RuntimeError(f"Cannot re-encode {path}")
+    data = encoded.tobytes()
+    ingested = IngestedImage.from_bytes(data)
+
+    stages: dict[str, list[float]] = {
+        name: []
+        for name in ("decode", "decode_reduced", "quality", "detect", "encode", "compare", "save")
+    }
+    for _ in range(repeat):
+        frame = _timed(stages["decode"], cv2.imdecode, np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        _timed(stages["decode_reduced"], ingested.decode)
+        try:
+            _timed(stages["quality"], check_frame_quality, frame)
+        except FrameQualityError:
+            pass
+        rgb = np.ascontiguousarray(frame[:, :, ::-1])
+        locations = _timed(
+            stages["detect"],
+            face_recognition.face_locations,
+            rgb,
+            number_of_times_to_upsample=upsample,
+            model=model,
+        )
+        encodings = _timed(
+            stages["encode"],
+            face_recognition.face_encodings,
+            rgb,
+            locations,
+            num_jitters=jitters,
+        )
+        if encodings:
+            _timed(stages["compare"], face_recognition.face_distance, [reference_encoding], encodings[0])
+        _timed(stages["save"], (save_dir / path.name).write_bytes, data)
+    return stages
+
+
+def run(args: argparse.Namespace) -> dict:
+    import face_recognition
+
+    reference_encoding = face_recognition.face_encodings(
+        face_recognition.load_image_file(REFERENCE_PHOTO)
+    )[0]
+    images = [Path(p) for p in args.images] if args.images else DEFAULT_IMAGES
+    sizes = [None if s == "original" else int(s) for s in args.sizes.split(",")]
+    upsamples = [int(u) for u in args.upsample.split(",")]
+
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="stage-bench-") as save_dir:
+        with profiled(args.profile, args.profile_output):
+            for size in sizes:
+                for upsample in upsamples:
+                    setting = f"size={size or 'original'} upsample={upsample} model={args.model}"
+                    collected: dict[str, list[float]] = {}
+                    for path in images:
+                        stages = bench_image(
+                            path,
+                            size=size,
+                            upsample=upsample,
+                            model=args.model,
+                            jitters=args.jitters,
+                            repeat=args.repeat,
+                            reference_encoding=reference_encoding,
+                            save_dir=Path(save_dir),
+                        )
+                        for name, samples in stages.items():
+                            collected.setdefault(name, []).extend(samples)
+                    results[setting] = {
+                        name: summarize(samples) for name, samples in collected.items()
+                    }
+    return {"images": [str(p) for p in images], "repeat": args.repeat, "settings": results}
+
+
+def print_report(report: dict) -> None:
+    print(f"{len(report['images'])} images, {report['repeat']} repetitions each")
+    for setting, stages in report["settings"].items():
+        print(f"\n{setting}")
+        print(f"  {'stage':<16}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, summary in stages.items():
+            print(
+                f"  {name:<16}{summary['mean_ms']:>10.2f}"
+                f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*", help="images to use (defaults to tests/photos and uploads)")
+    parser.add_argument("--sizes", default="320,640,original", help="longest-side sizes, comma separated")
+    parser.add_argument("--upsample", default="1", help="detector upsample counts, comma separated")
+    parser.add_argument("--model", default="hog", choices=("hog", "cnn"))
+    parser.add_argument("--jitters", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", choices=("cprofile", "sample"))
+    parser.add_argument("--profile-output", type=Path, default=Path("recognition_stages"))
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Test mail configuration; the recognition pipeline sends no email
+    os.environ.setdefault("TESTING", "true")
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        save_report(report, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Serialization cost of large API responses, before and after response models.
+
+"before" is what FastAPI does for an endpoint without a response model
+(``jsonable_encoder`` then ``json.dumps``); "after" is the response-model path
+(validation through the declared type, then pydantic-core ``dump_json``).
+Gzip time and size are reported for the resulting body.
+
+Run from ``backend/``::
+
+    python -m benchmarks.serialization --employees 10000 --report-rows 10000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.stats import save_report, summarize
+
+
+def _measure(fn: Callable[[], bytes], repeat: int) -> tuple[dict, bytes]:
+    samples = []
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples), body
+
+
+def _gzip(body: bytes, level: int, repeat: int) -> dict:
+    summary, compressed = _measure(lambda: gzip.compress(body, compresslevel=level), repeat)
+    summary["bytes"] = len(compressed)
+    return summary
+
+
+def bench(name: str, payload, response_type, *, repeat: int, level: int) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(response_type)
+    before, before_body = _measure(
+        lambda: json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode(), repeat
+    )
+    after, after_body = _measure(lambda: adapter.dump_json(adapter.validate_python(payload)), repeat)
+    return {
+        "name": name,
+        "before": before,
+        "after": after,
+        "json_bytes": len(after_body),
+        "gzip": _gzip(after_body, level, repeat),
+        "speedup": before["p50_ms"] / after["p50_ms"] if after["p50_ms"] else 0.0,
+        "same_content": json.loads(before_body) == json.loads(after_body),
+    }
+
+
+def employee_list(count: int):
+    from app.models import Employee
+
+    return [
+        Employee(
+            id=i,
+            email=f"employee{i}@example.com",
+            first_name="Jan",
+            last_name=f"Kowalski {i}",
+            photo_path=f"user_{i}.png",
+            is_present=i % 3 == 0,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def report_payload(rows: int) -> dict:
+    data = [
+        {
+            "employee_id": i,
+            "first_name": "Anna",
+            "last_name": f"Nowak {i}",
+            "total_hours": 160 + i % 40 / 3,
+        }
+        for i in range(1, rows + 1)
+    ]
+    return {
+        "message": "Raport za okres 2026-01-01 - 2026-01-31",
+        "period_days": 30,
+        "start_date": "2026-01-01",
+        "end_date": "2026-01-31",
+        "employees_count": rows,
+        "total_hours": sum(row["total_hours"] for row in data),
+        "report_data": data,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--employees", type=int, default=10_000)
+    parser.add_argument("--report-rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    # Test mail configuration; nothing is sent
+    os.environ.setdefault("TESTING", "true")
+    from app import settings
+    from app.models import Employee
+    from app.schemas import ReportResponse
+
+    results = [
+        bench(
+            f"employee list ({args.employees})",
+            employee_list(args.employees),
+            list[Employee],
+            repeat=args.repeat,
+            level=settings.GZIP_LEVEL,
+        ),
+        bench(
+            f"report ({args.report_rows} rows)",
+            report_payload(args.report_rows),
+            ReportResponse,
+            repeat=args.repeat,
+            level=settings.GZIP_LEVEL,
+        ),
+    ]
+
+    print(f"{'payload':<24}{'before ms':>11}{'after ms':>10}{'speedup':>9}{'json KiB':>10}{'gzip KiB':>10}{'gzip ms':>9}")
+    for r in results:
+        print(
+            f"{r['name']:<24}{r['before']['p50_ms']:>11.1f}{r['after']['p50_ms']:>10.1f}"
+            f"{r['speedup']:>8.1f}x{r['json_bytes'] / 1024:>10.0f}"
+            f"{r['gzip']['bytes'] / 1024:>10.0f}{r['gzip']['p50_ms']:>9.1f}"
+        )
+        if not r["same_content"]:
+            print(f"  warning: {r['name']} output differs between before and after")
+    if args.json:
+        save_report({"results": results}, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Cold-start benchmark: time to import the app and to answer ``/health``.
+
+Every measurement runs in a fresh interpreter so nothing is cached in
+``sys.modules``. ``--importtime`` prints the slowest modules from
+``python -X importtime``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --importtime 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.stats import save_report, summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("cv2", "numpy", "face_recognition", "dlib", "reportlab", "fastapi_mail", "PIL")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    status = client.get("/health").status_code
+ready = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "health_s": ready - start,
+    "status": status,
+    "heavy_loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    # Test mail configuration; startup sends no email
+    env.setdefault("TESTING", "true")
+    return env
+
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE % (HEAVY_MODULES,)],
+        cwd=BACKEND_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int) -> list[tuple[int, str]]:
+    """Returns (cumulative microseconds, module) for the slowest imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", type=int, metavar="N", help="print the N slowest imports")
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    report = {
+        "repeat": args.repeat,
+        "import": summarize([run["import_s"] for run in runs]),
+        "health": summarize([run["health_s"] for run in runs]),
+        "heavy_loaded": runs[-1]["heavy_loaded"],
+    }
+    print(
+        f"import app.main  p50={report['import']['p50_ms']:.0f}ms\n"
+        f"first /health    p50={report['health']['p50_ms']:.0f}ms\n"
+        f"heavy modules loaded at startup: {report['heavy_loaded'] or 'none'}"
+    )
+
+    if args.importtime:
+        print(f"\n{'cumulative ms':>14}  module")
+        for cumulative, module in slowest_imports(args.importtime):
+            print(f"{cumulative / 1000:>14.1f}  {module}")
+    if args.json:
+        save_report(report, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
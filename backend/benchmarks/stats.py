@@ -0,0 +1,67 @@
+"""Shared statistics and baseline comparison helpers for benchmarks."""
+import json
+import math
+from pathlib import Path
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples`` (``pct`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Returns count, mean and p50/p95/p99 of ``samples`` in milliseconds.
+
+    Args:
+        samples: durations in seconds
+    """
+    if not samples:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    return {
+        "count": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def save_report(report: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, sort_keys=True))
+
+
+def load_report(path: Path) -> dict:
+    return json.loads(path.read_text())
+
+
+def compare_reports(
+    current: dict, baseline: dict, *, max_regression: float
+) -> list[str]:
+    """Lists metrics in ``current`` that regressed against ``baseline``.
+
+    Latency keys (``*_ms``) regress when they grow by more than
+    ``max_regression`` (a fraction), throughput keys (``*_rps``) when they
+    shrink by more than it. Nested dicts are compared key by key.
+    """
+    regressions: list[str] = []
+
+    def walk(cur: dict, base: dict, prefix: str) -> None:
+        for key, base_value in base.items():
+            name = f"{prefix}{key}"
+            cur_value = cur.get(key)
+            if isinstance(base_value, dict) and isinstance(cur_value, dict):
+                walk(cur_value, base_value, f"{name}.")
+            elif not isinstance(cur_value, (int, float)) or not base_value:
+                continue
+            elif key.endswith("_ms") and cur_value > base_value * (1 + max_regression):
+                regressions.append(f"{name}: {base_value:.2f} -> {cur_value:.2f}")
+            elif key.endswith("_rps") and cur_value < base_value * (1 - max_regression):
+                regressions.append(f"{name}: {base_value:.2f} -> {cur_value:.2f}")
+
+    walk(current, baseline, "")
+    return regressions
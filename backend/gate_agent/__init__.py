@@ -0,0 +1,8 @@
+"""Gate-side agent: reads QR codes from a camera and submits gate attempts.
+
+The agent runs on the gate device. It decodes QR codes locally, crops the
+face from the frame, and uploads only that crop as a JPEG to
+``POST /api/entries/`` over a kept-alive connection. See ``__main__.py`` for
+the command line and ``camera.SimulatedCamera`` for load testing without a
+camera.
+"""
@@ -0,0 +1,75 @@
+"""Runs the gate agent.
+
+Run from ``backend/``::
+
+    # camera 0
+    python -m gate_agent --url http://localhost:8888 --gate-id gate-1
+
+    # load test: 8 simulated gates replaying image files with QR codes in them
+    python -m gate_agent --url http://localhost:8888 --images frames/ \\
+        --loop --fps 5 --workers 8 --cooldown 0 --limit 1000
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from gate_agent.agent import Agent
+from gate_agent.camera import Camera, SimulatedCamera
+from gate_agent.client import GateClient
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8888")
+    parser.add_argument("--gate-id", default="gate-agent")
+    parser.add_argument("--camera", default="0", help="OpenCV device index or stream URL")
+    parser.add_argument("--images", type=Path, nargs="+", help="simulate the camera with these images")
+    parser.add_argument("--fps", type=float, default=0, help="simulated frames per second (0: unpaced)")
+    parser.add_argument("--loop", action="store_true", help="replay the images forever")
+    parser.add_argument("--workers", type=int, default=1, help="simulated gates (with --images)")
+    parser.add_argument("--cooldown", type=float, default=5.0)
+    parser.add_argument("--full-frame", action="store_true", help="upload frames without a detected face")
+    parser.add_argument("--limit", type=int, help="attempts per worker before stopping")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+
+    if args.images is None:
+        cameras = [Camera(int(args.camera) if args.camera.isdigit() else args.camera)]
+    else:
+        cameras = [SimulatedCamera(args.images, fps=args.fps, loop=args.loop) for _ in range(args.workers)]
+
+    agents = []
+    threads = []
+    for i, camera in enumerate(cameras):
+        # Admission and debounce are per gate, so each simulated gate has its own id
+        gate_id = args.gate_id if len(cameras) == 1 else f"{args.gate_id}-{i}"
+        client = GateClient(args.url, gate_id, timeout=args.timeout, retries=args.retries, max_connections=1)
+        agent = Agent(camera, client, cooldown=args.cooldown, full_frame=args.full_frame)
+        agents.append(agent)
+        threads.append(threading.Thread(target=agent.run, args=(args.limit,), name=gate_id, daemon=True))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        pass
+    duration = time.perf_counter() - start
+    for agent in agents:
+        agent.client.close()
+
+    statuses = sum((agent.statuses for agent in agents), Counter())
+    attempts = sum(count for status, count in statuses.items() if status != "no_face")
+    print(f"{attempts} attempts in {duration:.2f}s ({attempts / duration:.2f}/s): {dict(statuses)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Gate attempts from camera frames."""
+import logging
+import time
+from collections import Counter
+
+from gate_agent.camera import Camera, decode_qr
+from gate_agent.client import GateClient
+from gate_agent.face_crop import crop_face, encode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class Agent:
+    """Turns camera frames with a QR code into gate attempts.
+
+    Args:
+        camera: frame source
+        client: backend client
+        cooldown: seconds a QR payload is ignored after it was submitted
+            (the person is still in front of the camera)
+        full_frame: upload the whole frame when no face was found locally
+    """
+
+    def __init__(self, camera: Camera, client: GateClient, *, cooldown: float = 5.0, full_frame: bool = False):
+        self.camera = camera
+        self.client = client
+        self.cooldown = cooldown
+        self.full_frame = full_frame
+        self.statuses: Counter[str] = Counter()
+        self._recent: dict[str, float] = {}
+
+    def process(self, frame) -> int | None:
+        """Submits an attempt for a frame; returns the response status, if any."""
+        payload = decode_qr(frame)
+        if payload is None:
+            return None
+        now = time.monotonic()
+        if now - self._recent.get(payload, -self.cooldown) < self.cooldown:
+            return None
+        crop = crop_face(frame)
+        if crop is None and not self.full_frame:
+            self.statuses["no_face"] += 1
+            return None
+        self._recent = {p: t for p, t in self._recent.items() if now - t < self.cooldown}
+        self._recent[payload] = now
+        if crop is not None:
+            response = self.client.submit(payload, crop.data, face_box=crop.face_box)
+        else:
+            # The backend looks for the face itself
+            response = self.client.submit(payload, encode_frame(frame))
+        self.statuses[str(response.status_code)] += 1
+        logger.info("Attempt %s: %d %s", payload.split(":")[0], response.status_code, response.text[:200])
+        return response.status_code
+
+    def run(self, limit: int | None = None) -> None:
+        """Processes frames until the camera ends or ``limit`` attempts were made."""
+        submitted = 0
+        with self.camera:
+            for frame in self.camera.frames():
+                if self.process(frame) is not None:
+                    submitted += 1
+                    if limit is not None and submitted >= limit:
+                        return
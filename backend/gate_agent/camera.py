@@ -0,0 +1,123 @@
+"""Frame sources and local QR code decoding."""
+from __future__ import annotations
+
+import itertools
+import time
+from pathlib import Path
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+class Camera:
+    """Frames from an OpenCV capture device.
+
+    Args:
+        device: OpenCV device index or stream URL
+        width: requested frame width (the device may pick another)
+        height: requested frame height
+    """
+
+    def __init__(self, device: int | str = 0, *, width: int | None = None, height: int | None = None):
+        self.device = device
+        self.width = width
+        self.height = height
+        self._capture: cv2.VideoCapture | None = None
+
+    def open(self) -> None:
+        capture = cv2.VideoCapture(self.device)
+        if not capture.isOpened():
+            raise RuntimeError(f"Cannot open camera {self.device!r}")
+        if self.width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self._capture = capture
+
+    def read(self) -> np.ndarray | None:
+        """Returns the next BGR frame, or None if the device gave none."""
+        if self._capture is None:
+            self.open()
+        ok, frame = self._capture.read()
+        return frame if ok else None
+
+    def close(self) -> None:
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def frames(self) -> Iterator[np.ndarray]:
+        while (frame := self.read()) is not None:
+            yield frame
+
+    def __enter__(self) -> Camera:
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SimulatedCamera(Camera):
+    """Frames read from image files, for load testing without a camera.
+
+    Args:
+        paths: image files, or directories whose images are used in name order
+        fps: frames per second to pace at (0 for as fast as possible)
+        loop: start over after the last image instead of ending
+    """
+
+    def __init__(self, paths: list[Path], *, fps: float = 0, loop: bool = False):
+        super().__init__()
+        files: list[Path] = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES))
+            else:
+                files.append(path)
+        if not files:
+            raise ValueError("No images to simulate the camera with.")
+        # Decoded once; reading files per frame would limit the load we can generate
+        self._images = [cv2.imread(str(path)) for path in files]
+        self.fps = fps
+        self.loop = loop
+        self._iterator: Iterator[np.ndarray] | None = None
+        self._next_at = 0.0
+
+    def open(self) -> None:
+        self._iterator = itertools.cycle(self._images) if self.loop else iter(self._images)
+        self._next_at = time.monotonic()
+
+    def read(self) -> np.ndarray | None:
+        if self._iterator is None:
+            self.open()
+        if self.fps:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_at = max(self._next_at, time.monotonic() - 1 / self.fps) + 1 / self.fps
+        return next(self._iterator, None)
+
+    def close(self) -> None:
+        self._iterator = None
+
+
+_qr_detector: cv2.QRCodeDetector | None = None
+
+
+def decode_qr(frame: np.ndarray) -> str | None:
+    """Returns the payload of the QR code in a frame, or None."""
+    global _qr_detector
+    if _qr_detector is None:
+        _qr_detector = cv2.QRCodeDetector()
+    payload, points, _ = _qr_detector.detectAndDecode(frame)
+    return payload or None
+
+
+def capture_photo(device: int | str = 0) -> np.ndarray | None:
+    """Takes a single frame from a camera."""
+    with Camera(device) as camera:
+        return camera.read()
@@ -0,0 +1,110 @@
+"""HTTP client submitting gate attempts to the backend."""
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GATE_ID_HEADER = "X-Gate-Id"
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Worth retrying: the backend is overloaded (503 from admission) or restarting
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class GateClient:
+    """Submits gate attempts over pooled keep-alive connections, with retries.
+
+    Every attempt carries an ``Idempotency-Key``, so an attempt retried after
+    a lost response gets the decision already made instead of a second one.
+
+    Args:
+        base_url: backend URL, e.g. ``http://backend:8888``
+        gate_id: sent as ``X-Gate-Id`` (admission and debounce are per gate)
+        timeout: seconds per request
+        retries: retries after the first try
+        backoff: seconds before the first retry, doubled for each next one
+        max_connections: pooled connections kept alive to the backend
+        transport: replaces the network transport (tests)
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        gate_id: str,
+        *,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_connections: int = 4,
+        transport: httpx.BaseTransport | None = None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self._client = httpx.Client(
+            base_url=base_url,
+            headers={GATE_ID_HEADER: gate_id},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport or httpx.HTTPTransport(retries=1),
+        )
+
+    def submit(
+        self,
+        qr_code_payload: str,
+        photo: bytes,
+        *,
+        face_box: str | None = None,
+        filename: str = "face.jpg",
+    ) -> httpx.Response:
+        """Submits an attempt; returns the backend's response.
+
+        ``face_box`` (``"x,y,w,h"`` in photo pixels) lets the backend replace
+        face detection with a check of that region.
+
+        Raises:
+            httpx.TransportError: if the backend could not be reached on any try
+        """
+        headers = {IDEMPOTENCY_HEADER: uuid.uuid4().hex}
+        data = {"qr_code_payload": qr_code_payload}
+        if face_box is not None:
+            data["face_box"] = face_box
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = self._client.post(
+                    "/api/entries/",
+                    data=data,
+                    files={"photo": (filename, photo, "image/jpeg")},
+                    headers=headers,
+                )
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                logger.warning("Gate attempt failed (%s), retrying", e)
+                time.sleep(self.backoff * 2**attempt)
+                continue
+            if response.status_code not in RETRY_STATUSES or last:
+                return response
+            delay = self.backoff * 2**attempt
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            logger.warning("Backend answered %d, retrying in %.2fs", response.status_code, delay)
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self) -> GateClient:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,105 @@
+"""Crops the face out of a camera frame before upload.
+
+A 1080p PNG frame is several megabytes; the JPEG of the face region with a
+margin around it is a few tens of kilobytes. The face box in the crop goes
+along as a hint, so the backend only checks that region for a face instead
+of running its own face detection; the margin gives that check context, and
+the face is not downscaled below what the backend accepts
+(``FRAME_MIN_FACE_PX``, 80 pixels by default).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+_face_cascade: cv2.CascadeClassifier | None = None
+
+
+@dataclass(frozen=True)
+class FaceCrop:
+    """JPEG of a face region and where the face lies in it.
+
+    ``box`` is sent as the ``face_box`` hint, which replaces detection on the backend.
+    """
+
+    data: bytes
+    box: tuple[int, int, int, int]  # x, y, w, h in crop pixels
+
+    @property
+    def face_box(self) -> str:
+        return ",".join(map(str, self.box))
+
+
+def _detect_largest_face(frame: np.ndarray, working_size: int) -> tuple[int, int, int, int] | None:
+    """Returns the (x, y, w, h) box of the largest face, in frame pixels."""
+    global _face_cascade
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    height, width = frame.shape[:2]
+    scale = min(1.0, working_size / max(height, width))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    faces = _face_cascade.detectMultiScale(gray, 1.1, 3)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+    return int(x / scale), int(y / scale), int(w / scale), int(h / scale)
+
+
+def crop_face(
+    frame: np.ndarray,
+    *,
+    margin: float = 0.5,
+    max_side: int = 480,
+    min_face: int = 120,
+    quality: int = 85,
+    working_size: int = 320,
+) -> FaceCrop | None:
+    """JPEG of the largest face in a frame, with a margin around it.
+
+    Args:
+        frame: BGR camera frame
+        margin: fraction of the face size added on each side
+        max_side: longest side of the crop after downscaling
+        min_face: face size the crop is never downscaled below
+        quality: JPEG quality
+        working_size: longest side the frame is downscaled to for detection
+
+    Returns:
+        FaceCrop | None: the crop, or None if no face was found
+    """
+    box = _detect_largest_face(frame, working_size)
+    if box is None:
+        return None
+    x, y, w, h = box
+    height, width = frame.shape[:2]
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    top, left = max(0, y - pad_y), max(0, x - pad_x)
+    crop = frame[top : min(height, y + h + pad_y), left : min(width, x + w + pad_x)]
+
+    scale = min(1.0, max_side / max(crop.shape[:2]))
+    scale = max(scale, min(1.0, min_face / max(w, h)))
+    if scale < 1.0:
+        crop = cv2.resize(
+            crop,
+            (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    ok, data = cv2.imencode(".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        return None
+    box = (int((x - left) * scale), int((y - top) * scale), int(w * scale), int(h * scale))
+    # Rounding must not push the box past the crop, which the backend rejects
+    box = (box[0], box[1], min(box[2], crop.shape[1] - box[0]), min(box[3], crop.shape[0] - box[1]))
+    return FaceCrop(data.tobytes(), box)
+
+
+def encode_frame(frame: np.ndarray, *, quality: int = 85) -> bytes:
+    """JPEG of a whole frame, for when no face was found locally."""
+    ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Frame could not be encoded.")
+    return data.tobytes()
@@ -0,0 +1,27 @@
+"""Gunicorn configuration for multi-worker deployments.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported in the master process (``preload_app``). With
+``PRELOAD_MODELS=true`` the recognition models are loaded and warmed up there
+too, before the workers are forked, so every worker shares the same model
+pages copy-on-write instead of loading a private copy.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+
+
+def when_ready(server):
+    from app import settings, warmup
+
+    if settings.PRELOAD_MODELS:
+        warmup.prepare()
+    # Move everything allocated so far into the permanent generation; the
+    # workers' collector then never touches (and un-shares) those pages.
+    gc.freeze()
@@ -1,7 +1,14 @@
+import shutil
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import metrics, settings
+from app.db import get_db
 from app.main import app
 from app.schemas import UserCreate
-from app.users import get_user_manager
+from app.users import auth_backend, get_user_manager, user_cache
 import asyncio
 
 def test_register_and_login(client: TestClient):
@@ -19,3 +26,67 @@ def test_register_and_login(client: TestClient):
 
     cookies = client.cookies
     assert "session" in cookies
+
+
+def _register_and_login(client: TestClient) -> None:
+    client.post("/auth/register", json={"email": "cached@example.com", "password": "password123"})
+    response = client.post("/auth/login", json={"email": "cached@example.com", "password": "password123"})
+    assert response.status_code == 200
+
+
+def test_authenticated_user_is_cached_until_logout(client: TestClient):
+    user_cache.clear()
+    _register_and_login(client)
+    hits = metrics.USER_CACHE_LOOKUPS.value(result="hit")
+
+    assert client.get("/api/employees/").status_code == 200
+    assert client.get("/api/employees/").status_code == 200
+    assert metrics.USER_CACHE_LOOKUPS.value(result="hit") == hits + 1
+
+    subject = auth_backend.get_strategy().subject(client.cookies.get("session"))
+    assert user_cache.get(subject) is not None
+    client.post("/auth/logout")
+    assert user_cache.get(subject) is None
+
+
+def test_login_rejects_wrong_password(client: TestClient):
+    _register_and_login(client)
+
+    response = client.post("/auth/login", json={"email": "cached@example.com", "password": "wrong"})
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def per_request_client(tmp_path):
+    """A client whose requests each get their own session, as in production."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_session
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
+    engine.dispose()
+    shutil.rmtree(settings.TEST_UPLOAD_DIR, ignore_errors=True)
+
+
+def test_cached_user_survives_commit_of_request_that_loaded_it(per_request_client, monkeypatch):
+    monkeypatch.setenv("TESTING", "true")
+    user_cache.clear()
+    _register_and_login(per_request_client)
+
+    response = per_request_client.post(
+        "/api/employees/",
+        data={"email": "new@example.com", "first_name": "Jan", "last_name": "Kowalski"},
+        files={"photo": ("avatar.png", (settings.TEST_PHOTOS_DIR / "user_1.png").read_bytes(), "image/png")},
+    )
+    assert response.status_code == 201
+    hits = metrics.USER_CACHE_LOOKUPS.value(result="hit")
+
+    assert per_request_client.get("/api/employees/").status_code == 200
+    assert metrics.USER_CACHE_LOOKUPS.value(result="hit") == hits + 1
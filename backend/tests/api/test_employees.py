@@ -7,12 +7,18 @@ from fastapi.testclient import TestClient
 from PIL import Image
 from sqlmodel import select
 
-from app import settings
+from app import admission, settings
+from app.admission import AdmissionController
 from app.models import Employee, QRCode
 from tests.factories import EmployeeFactory
 
 
 def _build_photo():
+    # Enrollment only accepts photos with exactly one face
+    return BytesIO((settings.TEST_PHOTOS_DIR / "user_1.png").read_bytes())
+
+
+def _build_faceless_photo():
     img_buf = BytesIO()
     Image.new("RGB", (10, 10), color=choice(["red", "blue", "white"])).save(
         img_buf, format="JPEG"
@@ -80,6 +86,23 @@ def test_list_employees(client: TestClient, override_auth):
     assert len(data) == 2
 
 
+def test_list_employees_is_gzip_compressed(client: TestClient, override_auth, session):
+    session.add_all(
+        Employee(email=f"bulk{i}@example.com", first_name="Jan", last_name=f"Kowalski {i}")
+        for i in range(100)
+    )
+    session.commit()
+
+    response = client.get("/api/employees/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 100
+    assert set(response.json()[0]) == {
+        "id", "email", "first_name", "last_name", "photo_path", "is_present"
+    }
+
+
 def test_update_employee(client: TestClient, override_auth, session):
     _, created = _create_employee(client)
     employee_id = created["id"]
@@ -203,3 +226,72 @@ def test_generate_and_revoke_qr_code(client: TestClient, override_auth, session,
     qr_codes = session.exec(select(QRCode).where(QRCode.employee_id == employee_id)).all()
     assert qr_codes[0].is_revoked is True
 
+
+
+def test_create_employee_rejects_oversized_upload(client: TestClient, override_auth, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 16)
+    employee_data = EmployeeFactory.build()
+    response = client.post(
+        "/api/employees/",
+        data={
+            "email": employee_data.email,
+            "first_name": employee_data.first_name,
+            "last_name": employee_data.last_name,
+        },
+        files={"photo": ("avatar.jpg", _build_photo(), "image/jpeg")},
+    )
+
+    assert response.status_code == 413
+    assert client.get("/api/employees/").json() == []
+
+
+def test_create_employee_rejects_photo_without_face(client: TestClient, override_auth):
+    employee_data = EmployeeFactory.build()
+    response = client.post(
+        "/api/employees/",
+        data={
+            "email": employee_data.email,
+            "first_name": employee_data.first_name,
+            "last_name": employee_data.last_name,
+        },
+        files={"photo": ("avatar.jpg", _build_faceless_photo(), "image/jpeg")},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "No face found in the photo."
+    assert client.get("/api/employees/").json() == []
+
+
+def test_update_employee_rejects_photo_without_face(client: TestClient, override_auth, session):
+    _, created = _create_employee(client)
+
+    response = client.put(
+        f"/api/employees/{created['id']}",
+        data={"first_name": "New"},
+        files={"photo": ("avatar.jpg", _build_faceless_photo(), "image/jpeg")},
+    )
+
+    assert response.status_code == 422
+    assert session.get(Employee, created["id"]).first_name == created["first_name"]
+
+
+def test_create_employee_waits_for_a_recognition_slot(client: TestClient, override_auth, monkeypatch):
+    busy = AdmissionController("test", capacity=1, max_wait=0.01)
+    busy.in_use = 1
+    monkeypatch.setattr(admission, "controller", busy)
+    employee_data = EmployeeFactory.build()
+
+    response = client.post(
+        "/api/employees/",
+        data={
+            "email": employee_data.email,
+            "first_name": employee_data.first_name,
+            "last_name": employee_data.last_name,
+        },
+        files={"photo": ("avatar.jpg", _build_photo(), "image/jpeg")},
+    )
+
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+    assert busy.queued == 0
+    assert client.get("/api/employees/").json() == []
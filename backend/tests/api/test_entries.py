@@ -1,8 +1,20 @@
+import hashlib
+import shutil
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from io import BytesIO
 
+from PIL import Image
+from sqlalchemy import update
+from sqlmodel import select
+
+import numpy as np
+
+from app import admission, audit, debounce, gallery, settings
+from app.admission import AdmissionController
 from app.main import app
-from app.models import Employee, WorkTimeRecord
+from app.models import Employee, EntryExitRecord, FaceTemplate, QRCode, WorkTimeRecord
+from app.utils.face import FaceMatch
 from app.users import current_active_user
 
 
@@ -80,3 +92,191 @@ async def test_generate_raport_aggregates_and_sends(client, session, monkeypatch
 	# Ensure email send is scheduled with current user email
 	assert captured["sent"]["email"] == "admin@example.com"
 	assert captured["sent"]["days"] == 30
+
+
+def test_gate_access_returns_503_when_overloaded(client, monkeypatch):
+	busy = AdmissionController("recognition", capacity=1, queue_size=0)
+	busy.in_use = 1
+	monkeypatch.setattr(admission, "controller", busy)
+
+	response = client.post(
+		"/api/entries/",
+		data={"qr_code_payload": "1:token"},
+		files={"photo": ("frame.png", b"", "image/png")},
+		headers={"X-Gate-Id": "gate-1"},
+	)
+
+	assert response.status_code == 503
+	assert int(response.headers["retry-after"]) >= 1
+
+
+@pytest.fixture
+def gate_employee(session, monkeypatch):
+	monkeypatch.setattr(debounce, "cache", debounce.DecisionCache(maxsize=16))
+	monkeypatch.setattr(
+		audit,
+		"writer",
+		audit.AuditWriter(session.get_bind(), spill_dir=settings.TEST_UPLOAD_DIR, batch_size=10, flush_interval=1),
+	)
+	employee = Employee(email="gate@example.com", first_name="Jan", last_name="Kowalski", photo_path="user_1.png")
+	session.add(employee)
+	session.commit()
+	session.refresh(employee)
+	session.add(QRCode(
+		employee_id=employee.id,
+		token_hash=hashlib.sha256(b"token").hexdigest(),
+		expires_at=date.today() + timedelta(days=1),
+	))
+	gallery.enroll(session, employee.id, np.zeros(128))
+	yield employee
+	if settings.TEST_UPLOAD_DIR.exists():
+		shutil.rmtree(settings.TEST_UPLOAD_DIR)
+
+
+def _frame() -> bytes:
+	buffer = BytesIO()
+	Image.new("RGB", (10, 10)).save(buffer, format="PNG")
+	return buffer.getvalue()
+
+
+def _submit(client, employee, gate="gate-1", **headers):
+	return client.post(
+		"/api/entries/",
+		data={"qr_code_payload": f"{employee.id}:token"},
+		files={"photo": ("frame.png", _frame(), "image/png")},
+		headers={"X-Gate-Id": gate, **headers},
+	)
+
+
+def test_double_scan_is_granted_once(client, session, gate_employee, monkeypatch):
+	calls = []
+
+	async def match(templates, frame, face_box=None):
+		calls.append(templates)
+		return FaceMatch(distance=0.3, encoding=np.ones(128))
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	first = _submit(client, gate_employee)
+	second = _submit(client, gate_employee)
+	# Another worker would only find the grant in the database
+	debounce.cache.clear()
+	third = _submit(client, gate_employee)
+
+	assert first.status_code == second.status_code == third.status_code == 201
+	assert first.json() == second.json() == third.json()
+	assert second.headers[debounce.REPLAYED_HEADER] == "true"
+	assert len(calls) == 1
+	session.refresh(gate_employee)
+	assert gate_employee.is_present
+	assert len(session.exec(select(EntryExitRecord)).all()) == 1
+
+
+def test_grant_is_not_replayed_to_wrong_token(client, session, gate_employee, monkeypatch):
+	async def match(templates, frame, face_box=None):
+		return FaceMatch(distance=0.3, encoding=np.ones(128))
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	granted = _submit(client, gate_employee)
+	intruder = client.post(
+		"/api/entries/",
+		data={"qr_code_payload": f"{gate_employee.id}:WRONG"},
+		files={"photo": ("frame.png", b"garbage", "image/png")},
+		headers={"X-Gate-Id": "gate-1"},
+	)
+
+	assert granted.status_code == 201
+	assert intruder.status_code == 401
+	assert debounce.REPLAYED_HEADER not in intruder.headers
+
+
+def test_conflicting_passage_does_not_teach_gallery(client, session, gate_employee, monkeypatch):
+	for template in session.exec(select(FaceTemplate)).all():
+		template.created_at -= timedelta(seconds=settings.FACE_GALLERY_UPDATE_INTERVAL)
+		session.add(template)
+	session.commit()
+
+	async def match(templates, frame, face_box=None):
+		# Another gate lets the employee in while this frame is matched
+		session.execute(update(Employee).where(Employee.id == gate_employee.id).values(is_present=True))
+		session.commit()
+		return FaceMatch(distance=0.1, encoding=np.ones(128))
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	response = _submit(client, gate_employee)
+
+	assert response.status_code == 409
+	assert [t.source for t in session.exec(select(FaceTemplate)).all()] == ["enrollment"]
+
+
+def test_denial_is_replayed_for_same_idempotency_key(client, session, gate_employee, monkeypatch):
+	calls = []
+
+	async def match(templates, frame, face_box=None):
+		calls.append(templates)
+		return FaceMatch(distance=0.7, encoding=np.ones(128))
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	first = _submit(client, gate_employee, **{"Idempotency-Key": "attempt-1"})
+	retry = _submit(client, gate_employee, **{"Idempotency-Key": "attempt-1"})
+	rescan = _submit(client, gate_employee)
+
+	assert first.status_code == retry.status_code == rescan.status_code == 401
+	assert retry.headers[debounce.REPLAYED_HEADER] == "true"
+	assert len(calls) == 2
+
+
+def _submit_with_hint(client, employee, **hint):
+	return client.post(
+		"/api/entries/",
+		data={"qr_code_payload": f"{employee.id}:token", **hint},
+		files={"photo": ("frame.png", _frame(), "image/png")},
+		headers={"X-Gate-Id": "gate-1"},
+	)
+
+
+def test_face_location_hint_is_passed_to_matching(client, gate_employee, monkeypatch):
+	face_boxes = []
+
+	async def match(templates, frame, face_box=None):
+		face_boxes.append(face_box)
+		return FaceMatch(distance=0.3, encoding=np.ones(128))
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	response = _submit_with_hint(client, gate_employee, face_box="2,1,8,8")
+
+	assert response.status_code == 201
+	assert face_boxes == [(1, 10, 9, 2)]
+
+
+def test_aligned_crop_without_face_is_denied(client, session, gate_employee):
+	noise = np.random.default_rng(0).integers(60, 200, size=(300, 300, 3), dtype=np.uint8)
+	buffer = BytesIO()
+	Image.fromarray(noise).save(buffer, format="PNG")
+
+	response = client.post(
+		"/api/entries/",
+		data={"qr_code_payload": f"{gate_employee.id}:token", "aligned_crop": "true"},
+		files={"photo": ("frame.png", buffer.getvalue(), "image/png")},
+		headers={"X-Gate-Id": "gate-1"},
+	)
+
+	assert response.status_code == 422
+	session.refresh(gate_employee)
+	assert not gate_employee.is_present
+
+
+def test_invalid_face_location_hint_is_rejected(client, gate_employee, monkeypatch):
+	async def match(templates, frame, face_box=None):
+		raise AssertionError("matching should not run")
+
+	monkeypatch.setattr("app.api.entries.recognition.match", match)
+
+	response = _submit_with_hint(client, gate_employee, face_box="5,5,20,20")
+
+	assert response.status_code == 400
+	assert response.json()["detail"] == "Face box lies outside the image."
@@ -0,0 +1,38 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.events import stream_events
+from app.events import bus
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_event_stream_requires_authentication(client: TestClient):
+    response = client.get("/api/events/stream")
+
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_event_stream_resumes_from_last_event_id(session):
+    first = bus.publish("presence.changed", employee_id=1, is_present=True)
+    bus.publish("presence.changed", employee_id=1, is_present=False)
+
+    stream = stream_events(user=None, session=session, last_event_id=first.id)
+    event = await anext(stream)
+    await stream.aclose()
+
+    assert event.event == "presence.changed"
+    assert event.data["is_present"] is False
+
+
+@pytest.mark.anyio
+async def test_event_stream_sends_reset_for_unknown_event_id(session):
+    stream = stream_events(user=None, session=session, last_event_id="0000-1")
+    event = await anext(stream)
+    await stream.aclose()
+
+    assert event.event == "reset"
@@ -0,0 +1,134 @@
+import base64
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app import crud, settings
+from app.models import EntryExitRecord, WorkTimeRecord
+from tests.factories import EmployeeFactory
+
+GATE_KEY = "gate-secret"
+HEADERS = {"X-Gate-Key": GATE_KEY, "X-Gate-Id": "gate-7"}
+
+
+@pytest.fixture(autouse=True)
+def gate_keys(monkeypatch):
+    monkeypatch.setattr(settings, "GATE_API_KEYS", [GATE_KEY])
+    monkeypatch.setenv("TESTING", "true")
+    yield
+    if settings.TEST_UPLOAD_DIR.exists():
+        shutil.rmtree(settings.TEST_UPLOAD_DIR)
+
+
+@pytest.fixture
+def employee(session):
+    return crud.create_employee(session=session, employee=EmployeeFactory.build())
+
+
+def _event(event_id, employee_id, timestamp, *, is_entry, successful=True, **extra):
+    return {
+        "client_event_id": event_id,
+        "employee_id": employee_id,
+        "timestamp": timestamp.isoformat(),
+        "is_entry": is_entry,
+        "successful": successful,
+        **extra,
+    }
+
+
+def _upload(client, events):
+    response = client.post("/api/sync/events", json={"events": events}, headers=HEADERS)
+    assert response.status_code == 200, response.text
+    return [(r["client_event_id"], r["status"]) for r in response.json()["results"]]
+
+
+def test_batch_applies_events_in_order(client: TestClient, session, employee):
+    start = datetime.now() - timedelta(hours=3)
+    # Uploaded out of order; applied by timestamp
+    events = [
+        _event("exit-1", employee.id, start + timedelta(hours=2), is_entry=False),
+        _event("entry-1", employee.id, start, is_entry=True),
+        _event("denied-1", employee.id, start + timedelta(hours=1), is_entry=False, successful=False,
+               denial_reason="Face verification failed."),
+        _event("entry-2", employee.id, start + timedelta(hours=2, minutes=30), is_entry=True),
+    ]
+
+    assert _upload(client, events) == [
+        ("exit-1", "applied"), ("entry-1", "applied"), ("denied-1", "recorded"), ("entry-2", "applied"),
+    ]
+
+    session.refresh(employee)
+    records = session.exec(select(EntryExitRecord)).all()
+    assert {r.attempt_id for r in records} == {"entry-1", "exit-1", "denied-1", "entry-2"}
+    assert all(r.gate_id == "gate-7" for r in records)
+    assert employee.is_present is True
+    assert employee.open_entry_id == next(r.id for r in records if r.attempt_id == "entry-2")
+    [work_time] = session.exec(select(WorkTimeRecord)).all()
+    assert work_time.duration_minutes == 120
+
+
+def test_resent_batch_is_reported_as_duplicates(client: TestClient, session, employee):
+    now = datetime.now() - timedelta(minutes=5)
+    events = [_event("entry-1", employee.id, now, is_entry=True)]
+    _upload(client, events)
+
+    assert _upload(client, events + events) == [("entry-1", "duplicate"), ("entry-1", "duplicate")]
+    assert len(session.exec(select(EntryExitRecord)).all()) == 1
+
+
+def test_contradicting_and_stale_events_are_only_recorded(client: TestClient, session, employee):
+    now = datetime.now()
+    _upload(client, [_event("entry-1", employee.id, now - timedelta(minutes=10), is_entry=True)])
+
+    results = _upload(client, [
+        _event("entry-2", employee.id, now - timedelta(minutes=5), is_entry=True),
+        _event("exit-old", employee.id, now - timedelta(minutes=20), is_entry=False),
+    ])
+
+    assert results == [("entry-2", "recorded"), ("exit-old", "recorded")]
+    unapplied = session.exec(select(EntryExitRecord).where(EntryExitRecord.attempt_id != "entry-1")).all()
+    assert len(unapplied) == 2
+    assert not any(r.successful for r in unapplied)
+    assert all(r.denial_reason.startswith("Granted offline, not applied") for r in unapplied)
+    session.refresh(employee)
+    assert employee.is_present is True
+    assert session.exec(select(WorkTimeRecord)).all() == []
+
+
+def test_invalid_events_are_rejected(client: TestClient, session, employee):
+    results = _upload(client, [
+        _event("unknown", employee.id + 100, datetime.now(), is_entry=True),
+        _event("future", employee.id, datetime.now() + timedelta(days=1), is_entry=True),
+    ])
+
+    assert results == [("unknown", "rejected"), ("future", "rejected")]
+    assert session.exec(select(EntryExitRecord)).all() == []
+
+
+def test_timestamps_with_offset_are_converted_to_local_time(client: TestClient, session, employee):
+    timestamp = datetime.now().astimezone() - timedelta(minutes=5)
+    event = _event("entry-1", employee.id, timestamp, is_entry=True)
+    event["timestamp"] = timestamp.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+    assert _upload(client, [event]) == [("entry-1", "applied")]
+    [record] = session.exec(select(EntryExitRecord)).all()
+    assert record.timestamp == timestamp.replace(tzinfo=None)
+
+
+def test_snapshots_are_saved(client: TestClient, employee):
+    snapshot = base64.b64encode(b"jpeg bytes").decode()
+    _upload(client, [_event("entry-1", employee.id, datetime.now(), is_entry=True, snapshot=snapshot)])
+
+    assert (settings.TEST_UPLOAD_DIR / "entry_attempt_entry-1.png").read_bytes() == b"jpeg bytes"
+
+
+def test_batch_size_is_limited(client: TestClient, employee, monkeypatch):
+    monkeypatch.setattr(settings, "GATE_BATCH_MAX_EVENTS", 1)
+    events = [_event(f"e{i}", employee.id, datetime.now(), is_entry=True) for i in range(2)]
+
+    response = client.post("/api/sync/events", json={"events": events}, headers=HEADERS)
+
+    assert response.status_code == 413
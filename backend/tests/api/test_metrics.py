@@ -0,0 +1,73 @@
+import hashlib
+import shutil
+from datetime import date, timedelta
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import metrics, settings
+from app.models import Employee, QRCode
+
+
+@pytest.fixture(autouse=True)
+def clean_uploads():
+    yield
+    if settings.TEST_UPLOAD_DIR.exists():
+        shutil.rmtree(settings.TEST_UPLOAD_DIR)
+
+
+def test_metrics_endpoint_renders_prometheus_text(client: TestClient):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE gate_stage_seconds histogram" in response.text
+    assert "# TYPE gate_decisions_total counter" in response.text
+    assert "# TYPE http_requests_in_flight gauge" in response.text
+    assert "# TYPE db_pool_connections gauge" in response.text
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_render_seconds", "Test histogram.", buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(histogram)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    lines = histogram.render()
+
+    assert 'test_render_seconds_bucket{le="0.1"} 1.0' in lines
+    assert 'test_render_seconds_bucket{le="1.0"} 2.0' in lines
+    assert 'test_render_seconds_bucket{le="+Inf"} 3.0' in lines
+    assert "test_render_seconds_count 3.0" in lines
+
+
+def test_gate_denial_is_counted_by_reason(client: TestClient, session):
+    employee = Employee(email="m@example.com", first_name="Jan", last_name="Kowalski", photo_path="p.png")
+    session.add(employee)
+    session.commit()
+    session.refresh(employee)
+    session.add(
+        QRCode(
+            employee_id=employee.id,
+            token_hash=hashlib.sha256(b"right-token").hexdigest(),
+            expires_at=date.today() + timedelta(days=7),
+        )
+    )
+    session.commit()
+    before = metrics.GATE_DECISIONS.value(result="denied", denial_reason="Invalid QR code token.")
+
+    photo = BytesIO()
+    Image.new("RGB", (10, 10)).save(photo, format="PNG")
+    photo.seek(0)
+    response = client.post(
+        "/api/entries/",
+        data={"qr_code_payload": f"{employee.id}:wrong-token"},
+        files={"photo": ("frame.png", photo, "image/png")},
+    )
+
+    assert response.status_code == 401
+    after = metrics.GATE_DECISIONS.value(result="denied", denial_reason="Invalid QR code token.")
+    assert after == before + 1
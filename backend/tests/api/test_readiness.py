@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+
+from app import metrics, settings, warmup
+from app.main import app
+
+
+def test_ready_after_startup(client: TestClient):
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_not_ready_before_startup():
+    warmup.mark_not_ready()
+    # Without the context manager the lifespan hook does not run
+    response = TestClient(app).get("/ready")
+
+    assert response.status_code == 503
+
+
+def test_lifespan_warms_up_models_when_enabled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(settings, "PRELOAD_MODELS", True)
+    monkeypatch.setattr(warmup, "prepare", lambda: calls.append("prepare"))
+
+    with TestClient(app) as c:
+        assert c.get("/ready").status_code == 200
+
+    assert calls == ["prepare"]
+
+
+def test_prepare_runs_warm_up_inference_once(monkeypatch):
+    monkeypatch.setattr(warmup, "_prepared", False)
+
+    warmup.prepare()
+    first = metrics.WARMUP_SECONDS.value(phase="inference")
+    warmup.prepare()
+
+    assert warmup.is_prepared()
+    assert first > 0
+    assert metrics.WARMUP_SECONDS.value(phase="inference") == first
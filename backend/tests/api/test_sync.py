@@ -0,0 +1,132 @@
+import base64
+from datetime import date, timedelta
+
+import msgpack
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from app import crud, gallery, invalidation, settings, sync
+from app.models import ChangeLog, QRCode
+from app.schemas import EmployeeUpdate
+from tests.factories import EmployeeFactory
+
+GATE_KEY = "gate-secret"
+
+
+@pytest.fixture(autouse=True)
+def gate_keys(monkeypatch):
+    monkeypatch.setattr(settings, "GATE_API_KEYS", [GATE_KEY])
+
+
+@pytest.fixture
+def employee(session):
+    employee = crud.create_employee(session=session, employee=EmployeeFactory.build())
+    session.add(QRCode(
+        employee_id=employee.id,
+        token_hash="abc123",
+        expires_at=date.today() + timedelta(days=30),
+    ))
+    session.commit()
+    gallery.enroll(session, employee.id, np.full(128, 0.5))
+    return employee
+
+
+def _sync(client, since=None):
+    params = {} if since is None else {"since": since}
+    response = client.get(
+        "/api/sync/", params=params, headers={"X-Gate-Key": GATE_KEY, "Accept": sync.MSGPACK}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == sync.MSGPACK
+    return msgpack.unpackb(response.content)
+
+
+def test_sync_requires_gate_key(client: TestClient, monkeypatch):
+    assert client.get("/api/sync/").status_code == 401
+    assert client.get("/api/sync/", headers={"X-Gate-Key": "wrong"}).status_code == 401
+
+    monkeypatch.setattr(settings, "GATE_API_KEYS", [])
+    assert client.get("/api/sync/", headers={"X-Gate-Key": GATE_KEY}).status_code == 403
+
+
+def test_snapshot_has_codes_encodings_and_presence(client: TestClient, employee):
+    feed = _sync(client)
+
+    assert feed["full"] is True
+    assert feed["version"] > 0
+    [entry] = feed["employees"]
+    assert entry["id"] == employee.id
+    assert entry["is_present"] is False
+    assert entry["qr_codes"] == [["abc123", (date.today() + timedelta(days=30)).isoformat()]]
+    encodings = np.frombuffer(entry["encodings"], dtype="<f2").reshape(-1, 128)
+    assert encodings.shape == (1, 128)
+    assert encodings[0, 0] == 0.5
+
+
+def test_delta_lists_changed_and_deleted_employees(client: TestClient, session, employee):
+    other = crud.create_employee(session=session, employee=EmployeeFactory.build())
+    version = _sync(client)["version"]
+
+    crud.toggle_employee_presence(session=session, employee_id=employee.id)
+    crud.revode_qr_code(session=session, employee_id=employee.id)
+    crud.delete_employee(session=session, employee_id=other.id)
+    feed = _sync(client, since=version)
+
+    assert feed["full"] is False
+    assert feed["version"] > version
+    [entry] = feed["employees"]
+    assert entry["id"] == employee.id
+    assert entry["is_present"] is True
+    assert entry["qr_codes"] == []
+    assert feed["deleted"] == [other.id]
+    assert feed["present"] == [employee.id]
+
+    assert _sync(client, since=feed["version"])["employees"] == []
+
+
+def test_presence_is_listed_without_logging_changes(client: TestClient, session, employee):
+    version = _sync(client)["version"]
+
+    crud.toggle_employee_presence(session=session, employee_id=employee.id)
+    feed = _sync(client, since=version)
+
+    assert feed["version"] == version
+    assert feed["employees"] == []
+    assert feed["present"] == [employee.id]
+
+
+def test_gate_behind_pruned_log_gets_snapshot(client: TestClient, session, employee):
+    crud.update_employee(session=session, employee_id=employee.id, employee_in=EmployeeUpdate(first_name="Ewa"))
+    oldest = session.get(ChangeLog, 1)
+    session.delete(oldest)
+    session.commit()
+
+    assert _sync(client, since=0)["full"] is True
+
+
+def test_commit_spanning_prune_boundary_prunes_old_changes(session, employee, monkeypatch):
+    monkeypatch.setattr(sync, "_PRUNE_EVERY", 2)
+    monkeypatch.setattr(settings, "SYNC_CHANGE_RETENTION", -1)
+    if sync.current_version(session) % 2 == 0:
+        invalidation.mark(session, "qr_code", employee.id)
+        session.commit()
+
+    # Two changes with an odd first id, so only the second is a multiple
+    first = sync.current_version(session) + 1
+    invalidation.mark(session, "qr_code", employee.id)
+    invalidation.mark(session, "qr_code", employee.id + 1)
+    session.commit()
+
+    assert session.exec(select(func.min(ChangeLog.id))).one() == first
+
+
+def test_json_feed_base64_encodes_encodings(client: TestClient, employee):
+    response = client.get("/api/sync/", headers={"X-Gate-Key": GATE_KEY})
+
+    assert response.headers["content-type"] == "application/json"
+    entry = response.json()["employees"][0]
+    assert len(base64.b64decode(entry["encodings"])) == 128 * 2
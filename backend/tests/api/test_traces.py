@@ -0,0 +1,60 @@
+import shutil
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlmodel import select
+
+from app import audit, settings, tracing
+from app.models import Employee, EntryExitRecord
+
+
+@pytest.fixture(autouse=True)
+def exporter():
+    previous = tracing.get_exporter()
+    ring = tracing.RingBufferExporter(maxlen=1000)
+    tracing.set_exporter(ring)
+    yield ring
+    tracing.set_exporter(previous)
+    if settings.TEST_UPLOAD_DIR.exists():
+        shutil.rmtree(settings.TEST_UPLOAD_DIR)
+
+
+def test_gate_attempt_trace_is_linked_to_record(client: TestClient, session, override_auth, monkeypatch):
+    monkeypatch.setattr(
+        audit,
+        "writer",
+        audit.AuditWriter(session.get_bind(), spill_dir=settings.TEST_UPLOAD_DIR, batch_size=10, flush_interval=1),
+    )
+    employee = Employee(email="t@example.com", first_name="Jan", last_name="Kowalski")
+    session.add(employee)
+    session.commit()
+    session.refresh(employee)
+
+    photo = BytesIO()
+    Image.new("RGB", (10, 10)).save(photo, format="PNG")
+    photo.seek(0)
+    response = client.post(
+        "/api/entries/",
+        data={"qr_code_payload": f"{employee.id}:token"},
+        files={"photo": ("frame.png", photo, "image/png")},
+    )
+    assert response.status_code == 404
+    record = session.exec(select(EntryExitRecord)).one()
+
+    response_trace = client.get("/api/traces/", params={"entry_exit_record_id": record.id})
+
+    assert response_trace.status_code == 200
+    spans = response_trace.json()
+    names = {span["name"] for span in spans}
+    assert "POST /api/entries/" in names
+    assert "app.audit.AuditWriter.add" in names
+    assert "app.utils.files.save_photo" in names
+    assert {span["trace_id"] for span in spans} == {response.headers["x-trace-id"]}
+
+
+def test_unknown_record_has_no_trace(client: TestClient, override_auth):
+    response = client.get("/api/traces/", params={"entry_exit_record_id": 999})
+
+    assert response.status_code == 404
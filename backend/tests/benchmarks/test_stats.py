@@ -0,0 +1,38 @@
+import pytest
+
+from benchmarks.gate_throughput import parse_server_timing
+from benchmarks.stats import compare_reports, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 95) == 95.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+def test_summarize_reports_milliseconds():
+    summary = summarize([0.1, 0.2, 0.3])
+
+    assert summary["count"] == 3
+    assert summary["p50_ms"] == pytest.approx(200.0)
+    assert summary["mean_ms"] == pytest.approx(200.0)
+
+
+def test_compare_reports_flags_latency_and_throughput_regressions():
+    baseline = {"throughput_rps": 10.0, "latency": {"p95_ms": 100.0}, "stages": {"detect": {"p95_ms": 50.0}}}
+    current = {"throughput_rps": 8.0, "latency": {"p95_ms": 105.0}, "stages": {"detect": {"p95_ms": 80.0}}}
+
+    regressions = compare_reports(current, baseline, max_regression=0.10)
+
+    assert any(line.startswith("throughput_rps") for line in regressions)
+    assert any(line.startswith("stages.detect.p95_ms") for line in regressions)
+    assert not any(line.startswith("latency.p95_ms") for line in regressions)
+
+
+def test_parse_server_timing():
+    stages = parse_server_timing("detect;dur=12.5, encode;dur=3")
+
+    assert stages == {"detect": pytest.approx(0.0125), "encode": pytest.approx(0.003)}
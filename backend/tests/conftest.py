@@ -2,11 +2,33 @@ from sqlmodel import SQLModel, Session, create_engine, StaticPool
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app import audit, gallery, invalidation, settings
+from app.face_index import FaceIndex
 from app.db import get_db
 from app.models import User
 from app.users import current_user
 
 
+@pytest.fixture(autouse=True)
+def data_dirs(tmp_path, monkeypatch):
+    """Keeps face index and audit spill files written by tests out of the tree."""
+    monkeypatch.setattr(settings, "FACE_INDEX_DIR", tmp_path / "face_index")
+    monkeypatch.setattr(settings, "AUDIT_SPILL_DIR", tmp_path / "audit_spill")
+    monkeypatch.setattr(audit.writer, "spill_dir", settings.AUDIT_SPILL_DIR)
+    index = None
+    if gallery.index is not None:
+        index = FaceIndex(
+            settings.FACE_INDEX_DIR,
+            dtype=settings.FACE_INDEX_DTYPE,
+            compact_ratio=settings.FACE_INDEX_COMPACT_RATIO,
+        )
+        monkeypatch.setattr(gallery, "index", index)
+        monkeypatch.setitem(invalidation.invalidator._handlers, "face_template", [(index.evict, index.clear)])
+    yield
+    if index is not None:
+        index.close()
+
+
 @pytest.fixture(name="session")
 def session_fixture():
     engine = create_engine(
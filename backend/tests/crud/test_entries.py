@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta
 
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
 from app import crud
-from app.models import Employee, EntryExitRecord
+from app.models import Employee, EntryExitRecord, WorkTimeRecord
 
 
 def test_toggle_employee_presence(session):
@@ -19,6 +23,52 @@ def test_toggle_employee_presence(session):
     assert new_state is False
 
 
+def _passage(employee_id, *, is_entry, timestamp):
+    return EntryExitRecord(employee_id=employee_id, timestamp=timestamp, successful=True, is_entry=is_entry)
+
+
+def test_record_gate_passage_opens_and_closes_work_session(session):
+    emp = Employee(email="e4@example.com", first_name="Ewa", last_name="Lis", photo_path="p4")
+    session.add(emp)
+    session.commit()
+    start = datetime.now() - timedelta(hours=1)
+
+    entry = _passage(emp.id, is_entry=True, timestamp=start)
+    assert crud.record_gate_passage(session=session, record=entry, open_entry_id=None) is None
+    session.refresh(emp)
+    assert emp.is_present is True
+    assert emp.open_entry_id == entry.id
+
+    exit_ = _passage(emp.id, is_entry=False, timestamp=start + timedelta(minutes=45))
+    work_time = crud.record_gate_passage(session=session, record=exit_, open_entry_id=entry.id)
+    session.refresh(emp)
+    assert emp.is_present is False
+    assert emp.open_entry_id is None
+    assert work_time.entry_time == start
+    assert work_time.duration_minutes == 45
+
+
+def test_record_gate_passage_rejects_stale_state(session):
+    emp = Employee(email="e5@example.com", first_name="Adam", last_name="Wolny", photo_path="p5")
+    session.add(emp)
+    session.commit()
+    now = datetime.now()
+    first = _passage(emp.id, is_entry=True, timestamp=now)
+    crud.record_gate_passage(session=session, record=first, open_entry_id=None)
+
+    # A second entry decided on the same read of the employee
+    with pytest.raises(HTTPException) as e:
+        crud.record_gate_passage(
+            session=session, record=_passage(emp.id, is_entry=True, timestamp=now), open_entry_id=None
+        )
+
+    assert e.value.status_code == 409
+    session.refresh(emp)
+    assert emp.open_entry_id == first.id
+    assert len(session.exec(select(EntryExitRecord)).all()) == 1
+    assert session.exec(select(WorkTimeRecord)).all() == []
+
+
 def test_get_last_successful_entry(session):
     emp = Employee(email="e2@example.com", first_name="Anna", last_name="Nowak", photo_path="p2")
     session.add(emp)
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import cv2
+import httpx
+import numpy as np
+import pytest
+import qrcode
+
+from gate_agent.agent import Agent
+from gate_agent.camera import SimulatedCamera, decode_qr
+from gate_agent.client import GateClient
+from gate_agent.face_crop import crop_face
+
+PHOTOS = Path(__file__).resolve().parent.parent / "photos"
+PAYLOAD = "1:token"
+
+
+@pytest.fixture
+def frame() -> np.ndarray:
+    """A 1280x720 frame with the test face on the left and a QR code on the right."""
+    frame = np.full((720, 1280, 3), 255, dtype=np.uint8)
+    frame[60:660, 60:660] = cv2.imread(str(PHOTOS / "user_1_2.png"))
+    code = np.array(qrcode.make(PAYLOAD).get_image().convert("RGB"))[:, :, ::-1]
+    code = cv2.resize(code, (400, 400), interpolation=cv2.INTER_NEAREST)
+    frame[160:560, 800:1200] = code
+    return frame
+
+
+@pytest.fixture
+def frame_file(frame, tmp_path) -> Path:
+    path = tmp_path / "frame.png"
+    cv2.imwrite(str(path), frame)
+    return path
+
+
+def _client(handler, **kwargs) -> GateClient:
+    return GateClient("http://backend", "gate-1", backoff=0, transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_decode_qr(frame):
+    assert decode_qr(frame) == PAYLOAD
+    assert decode_qr(np.full((100, 100, 3), 255, dtype=np.uint8)) is None
+
+
+def test_crop_face_is_smaller_and_keeps_the_face(frame):
+    crop = crop_face(frame, max_side=320)
+
+    assert crop is not None
+    assert len(crop.data) < len(cv2.imencode(".png", frame)[1]) / 10
+    image = cv2.imdecode(np.frombuffer(crop.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert max(image.shape[:2]) <= 320
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    (x, y, w, h), *_ = cascade.detectMultiScale(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 1.1, 3)
+    # The hint matches where the face is in the crop
+    bx, by, bw, bh = crop.box
+    assert abs(bx - x) < w / 5 and abs(by - y) < h / 5 and abs(bw - w) < w / 5
+    assert bx + bw <= image.shape[1] and by + bh <= image.shape[0]
+
+
+def test_crop_face_without_a_face():
+    assert crop_face(np.full((480, 640, 3), 255, dtype=np.uint8)) is None
+
+
+def test_simulated_camera_replays_files(frame_file):
+    camera = SimulatedCamera([frame_file, frame_file])
+    with camera:
+        assert len(list(camera.frames())) == 2
+
+    looping = SimulatedCamera([frame_file.parent], loop=True)
+    with looping:
+        assert all(looping.read() is not None for _ in range(5))
+
+
+def test_client_retries_overload_with_the_same_idempotency_key():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) < 3:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(201, json={"status": "granted"})
+
+    with _client(handler, retries=3) as client:
+        response = client.submit(PAYLOAD, b"jpeg")
+
+    assert response.status_code == 201
+    assert len(requests) == 3
+    assert len({r.headers["idempotency-key"] for r in requests}) == 1
+    assert all(r.headers["x-gate-id"] == "gate-1" for r in requests)
+
+
+def test_client_gives_up_after_retries():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=request)
+
+    with _client(handler, retries=2) as client, pytest.raises(httpx.ConnectError):
+        client.submit(PAYLOAD, b"jpeg")
+
+
+def test_agent_submits_face_crop_once_per_cooldown(frame_file):
+    uploads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        uploads.append(request.read())
+        return httpx.Response(201, json={"status": "granted"})
+
+    camera = SimulatedCamera([frame_file] * 3)
+    agent = Agent(camera, _client(handler), cooldown=60)
+    agent.run()
+
+    assert len(uploads) == 1
+    assert PAYLOAD.encode() in uploads[0]
+    assert b"image/jpeg" in uploads[0]
+    assert b'name="face_box"' in uploads[0]
+    assert agent.statuses == {"201": 1}
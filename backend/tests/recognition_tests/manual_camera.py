@@ -1,5 +1,5 @@
 import cv2
-from infrastructure.camera import capture_photo
+from gate_agent.camera import capture_photo
 
 
 def test_capture_photo_display():
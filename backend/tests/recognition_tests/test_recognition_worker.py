@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from app import metrics, tracing
+from app.gallery import encode_file
+from app.ingest import IngestedImage
+from app.recognition import RecognitionUnavailable, match_face_remote
+from app.recognition_worker import match_job, serve
+from app.settings import TEST_PHOTOS_DIR
+from app.utils import FrameQualityError
+
+
+@pytest.fixture(scope="module")
+def gallery():
+    return encode_file(str(TEST_PHOTOS_DIR / "user_1.png"))[np.newaxis]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def socket_path(tmp_path):
+    path = str(tmp_path / "recognition.sock")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        server = await serve(path, executor)
+        async with server:
+            yield path
+
+
+@pytest.mark.anyio
+async def test_remote_match_of_same_person(socket_path, gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+
+    with metrics.collect_timings() as timings:
+        match = await match_face_remote(socket_path, gallery, frame)
+
+    assert match.distance <= 0.5
+    assert match.encoding.shape == (128,)
+
+    # Stage timings measured by the worker are recorded for this request
+    assert {"decode", "detect", "encode", "compare"} <= timings.keys()
+
+
+@pytest.mark.anyio
+async def test_remote_match_spans_join_the_callers_trace(socket_path, gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+    previous = tracing.get_exporter()
+    exporter = tracing.RingBufferExporter(maxlen=100)
+    tracing.set_exporter(exporter)
+    try:
+        with tracing.span("POST /api/entries/") as request_span:
+            await match_face_remote(socket_path, gallery, frame)
+    finally:
+        tracing.set_exporter(previous)
+
+    spans = {span.name: span for span in exporter.spans}
+    assert spans["recognition.match"].parent_id == request_span.span_id
+    assert spans["gate.encode"].parent_id == spans["recognition.match"].span_id
+    assert {span.trace_id for span in exporter.spans} == {request_span.trace_id}
+
+
+def test_match_job_returns_its_spans_instead_of_exporting_them(gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+    carrier = {"sampled": True, "trace_id": "a" * 32, "span_id": "b" * 16}
+    header = {
+        "width": frame.width,
+        "height": frame.height,
+        "size": len(frame.data),
+        "gallery_rows": len(gallery),
+        "trace": carrier,
+    }
+    previous = tracing.get_exporter()
+    exporter = tracing.RingBufferExporter(maxlen=100)
+    tracing.set_exporter(exporter)
+    try:
+        reply = match_job(header, frame.data + np.ascontiguousarray(gallery, dtype=np.float32).tobytes())
+    finally:
+        tracing.set_exporter(previous)
+
+    assert len(exporter.spans) == 0
+    spans = {span["name"]: span for span in reply["spans"]}
+    assert spans["recognition.match"]["parent_id"] == carrier["span_id"]
+    assert {span["trace_id"] for span in reply["spans"]} == {carrier["trace_id"]}
+
+
+@pytest.mark.anyio
+async def test_remote_match_with_face_box(socket_path, gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+
+    with metrics.collect_timings() as timings:
+        match = await match_face_remote(socket_path, gallery, frame, (91, 460, 408, 143))
+
+    assert match.distance <= 0.5
+    assert "detect" not in timings
+
+
+@pytest.mark.anyio
+async def test_remote_match_of_other_person(socket_path, gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_2.png").read_bytes())
+
+    assert (await match_face_remote(socket_path, gallery, frame)).distance > 0.5
+
+
+@pytest.mark.anyio
+async def test_remote_match_raises_quality_error(socket_path, gallery):
+    ok, encoded = cv2.imencode(".png", np.zeros((480, 640, 3), dtype=np.uint8))
+    frame = IngestedImage.from_bytes(encoded.tobytes())
+
+    with pytest.raises(FrameQualityError) as excinfo:
+        await match_face_remote(socket_path, gallery, frame)
+
+    assert excinfo.value.reason == "too_dark"
+
+
+@pytest.mark.anyio
+async def test_unreachable_worker_raises(tmp_path, gallery):
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+
+    with pytest.raises(RecognitionUnavailable):
+        await match_face_remote(str(tmp_path / "missing.sock"), gallery, frame)
+
+
+@pytest.fixture
+def blocked_jobs(monkeypatch):
+    """Makes jobs wait for ``release`` and records the ones that ran."""
+    release = threading.Event()
+    ran = []
+
+    def match_job(header, data):
+        ran.append(header["size"])
+        release.wait(5)
+        return {"status": "ok", "match": None}
+
+    monkeypatch.setattr("app.recognition_worker.match_job", match_job)
+    yield release, ran
+    release.set()
+
+
+@pytest.mark.anyio
+async def test_worker_answers_busy_over_job_limit(tmp_path, gallery, blocked_jobs):
+    release, ran = blocked_jobs
+    path = str(tmp_path / "recognition.sock")
+    frame = IngestedImage.from_bytes(b"frame")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        server = await serve(path, executor, max_jobs=1)
+        async with server:
+            first = asyncio.create_task(match_face_remote(path, gallery, frame))
+            await asyncio.sleep(0.1)
+            with pytest.raises(RecognitionUnavailable, match="overloaded"):
+                await match_face_remote(path, gallery, frame)
+            release.set()
+            assert await first is None
+
+
+@pytest.mark.anyio
+async def test_worker_skips_jobs_of_clients_that_gave_up(tmp_path, gallery, blocked_jobs):
+    release, ran = blocked_jobs
+    path = str(tmp_path / "recognition.sock")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        server = await serve(path, executor, max_jobs=2)
+        async with server:
+            running = asyncio.create_task(match_face_remote(path, gallery, IngestedImage.from_bytes(b"running")))
+            await asyncio.sleep(0.1)
+            # Queued behind the running job; the client times out first
+            with pytest.raises(RecognitionUnavailable):
+                await match_face_remote(path, gallery, IngestedImage.from_bytes(b"queued"), timeout=0.2)
+            await asyncio.sleep(0.1)
+            release.set()
+            await running
+            await asyncio.sleep(0.1)
+
+    assert ran == [len(b"running")]
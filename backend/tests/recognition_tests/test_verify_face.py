@@ -1,9 +1,15 @@
 import io
+import cv2
 import numpy as np
+import pytest
 from fastapi import UploadFile
 
+from app import metrics
+from app.gallery import encode_file
+from app.ingest import IngestedImage
 from app.settings import TEST_PHOTOS_DIR
-from app.utils import verify_face
+from app.utils import FrameQualityError, parse_face_hint, verify_face
+from app.utils.face import match_face
 
 # IMPORTANT: Altering names/deleting files in test_uploads directory may break tests below
 
@@ -34,3 +40,86 @@ def test_verify_face_no_match():
     result = verify_face(str(photo_path), file_bytes)
 
     assert result == False
+
+
+def _frame_upload(frame) -> UploadFile:
+    ok, encoded = cv2.imencode(".png", frame)
+    assert ok
+    return UploadFile(file=io.BytesIO(encoded.tobytes()), filename="frame.png")
+
+
+def test_verify_face_rejects_dark_frame():
+    photo_path = TEST_PHOTOS_DIR / "user_1.png"
+    dark = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    with pytest.raises(FrameQualityError) as excinfo:
+        verify_face(str(photo_path), _frame_upload(dark))
+
+    assert excinfo.value.reason == "too_dark"
+
+
+def test_verify_face_rejects_blurry_frame():
+    photo_path = TEST_PHOTOS_DIR / "user_1.png"
+    frame = cv2.imread(str(TEST_PHOTOS_DIR / "user_1_2.png"))
+    blurry = cv2.GaussianBlur(frame, (31, 31), 0)
+
+    with pytest.raises(FrameQualityError) as excinfo:
+        verify_face(str(photo_path), _frame_upload(blurry))
+
+    assert excinfo.value.reason == "too_blurry"
+
+
+def test_verify_face_rejects_frame_without_face():
+    photo_path = TEST_PHOTOS_DIR / "user_1.png"
+    rng = np.random.default_rng(0)
+    noise = rng.integers(60, 200, size=(480, 640, 3), dtype=np.uint8)
+
+    with pytest.raises(FrameQualityError) as excinfo:
+        verify_face(str(photo_path), _frame_upload(noise))
+
+    assert excinfo.value.reason == "no_face"
+
+
+def test_parse_face_hint():
+    assert parse_face_hint(None, False, 600, 600) is None
+    assert parse_face_hint("143,91,317,317", False, 600, 600) == (91, 460, 408, 143)
+    assert parse_face_hint(None, True, 300, 400) == (0, 300, 400, 0)
+
+
+@pytest.mark.parametrize(
+    ("face_box", "aligned_crop", "size"),
+    [
+        ("1,2,3", False, (600, 600)),
+        ("a,b,c,d", False, (600, 600)),
+        ("500,0,200,200", False, (600, 600)),
+        ("0,0,300,50", False, (600, 600)),
+        ("0,0,100,100", True, (600, 600)),
+        ("0,0,100,100", False, (0, 0)),
+    ],
+)
+def test_parse_face_hint_rejects_bad_hints(face_box, aligned_crop, size):
+    with pytest.raises(ValueError):
+        parse_face_hint(face_box, aligned_crop, *size)
+
+
+def test_match_face_with_face_box_skips_detection():
+    gallery = encode_file(str(TEST_PHOTOS_DIR / "user_1.png"))[np.newaxis]
+    frame = IngestedImage.from_bytes((TEST_PHOTOS_DIR / "user_1_2.png").read_bytes())
+    face_box = parse_face_hint("143,91,317,317", False, frame.width, frame.height)
+
+    with metrics.collect_timings() as timings:
+        match = match_face(gallery, frame, face_box)
+
+    assert match.distance <= 0.5
+    assert "detect" not in timings
+
+
+def test_match_face_rejects_face_box_without_face():
+    gallery = encode_file(str(TEST_PHOTOS_DIR / "user_1.png"))[np.newaxis]
+    noise = np.random.default_rng(0).integers(60, 200, size=(480, 640, 3), dtype=np.uint8)
+    frame = IngestedImage.from_bytes(cv2.imencode(".png", noise)[1].tobytes())
+
+    with pytest.raises(FrameQualityError) as excinfo:
+        match_face(gallery, frame, parse_face_hint(None, True, frame.width, frame.height))
+
+    assert excinfo.value.reason == "no_face_at_hint"
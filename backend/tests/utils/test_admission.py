@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_rejects_when_queue_is_full():
+    controller = AdmissionController("test", capacity=1, queue_size=0)
+
+    async with controller.slot("gate-a"):
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with controller.slot("gate-a"):
+                pass
+
+    assert excinfo.value.reason == "queue_full"
+    assert excinfo.value.retry_after >= 1
+    assert controller.in_use == 0
+
+
+@pytest.mark.anyio
+async def test_rejects_after_max_wait():
+    controller = AdmissionController("test", capacity=1, max_wait=0.01)
+
+    async with controller.slot("gate-a"):
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with controller.slot("gate-b"):
+                pass
+
+    assert excinfo.value.reason == "timeout"
+    assert controller.queued == 0
+
+
+@pytest.mark.anyio
+async def test_waiters_are_served_round_robin_across_gates():
+    controller = AdmissionController("test", capacity=1, per_key_queue=8, max_wait=5)
+    order = []
+
+    async def attempt(gate: str) -> None:
+        async with controller.slot(gate):
+            order.append(gate)
+            await asyncio.sleep(0)
+
+    async with controller.slot("gate-a"):
+        tasks = [asyncio.create_task(attempt(g)) for g in ("a", "a", "a", "b", "c")]
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+    assert order == ["a", "b", "c", "a", "a"]
+
+
+@pytest.mark.anyio
+async def test_reserved_slot_is_only_used_by_priority_requests():
+    controller = AdmissionController("test", capacity=2, reserved=1, queue_size=0)
+
+    async with controller.slot("gate-a"):
+        with pytest.raises(AdmissionRejected):
+            async with controller.slot("gate-b"):
+                pass
+        async with controller.slot(priority=True):
+            assert controller.in_use == 2
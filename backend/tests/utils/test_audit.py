@@ -0,0 +1,167 @@
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.audit import AuditWriter, _SpillFile, _decode, _encode
+from app.models import EntryExitRecord
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def writer(engine, tmp_path):
+    writer = AuditWriter(engine, spill_dir=tmp_path / "spill", batch_size=3, flush_interval=60)
+    yield writer
+    writer.stop()
+
+
+def denial(attempt_id: str) -> EntryExitRecord:
+    return EntryExitRecord(
+        attempt_id=attempt_id,
+        employee_id=1,
+        timestamp=datetime(2026, 1, 5, 8, 0),
+        successful=False,
+        is_entry=True,
+        denial_reason="Face verification failed.",
+    )
+
+
+def stored(engine) -> list[str]:
+    with Session(engine) as session:
+        return sorted(session.exec(select(EntryExitRecord.attempt_id)).all())
+
+
+def test_unstarted_writer_writes_immediately(engine, writer):
+    writer.add(denial("a"))
+
+    assert stored(engine) == ["a"]
+
+
+def test_records_are_spilled_until_flushed(engine, writer):
+    writer.start()
+    writer.add(denial("a"))
+    writer.add(denial("b"))
+
+    assert stored(engine) == []
+    assert len(list(writer.spill_dir.glob("audit-*.jsonl"))) == 1
+
+    assert writer.flush() == 2
+    assert stored(engine) == ["a", "b"]
+    assert list(writer.spill_dir.glob("audit-*.jsonl")) == []
+
+
+def test_full_batch_is_flushed_without_waiting(engine, writer):
+    writer.start()
+    for attempt_id in "abc":
+        writer.add(denial(attempt_id))
+
+    deadline = time.monotonic() + 5
+    while stored(engine) != ["a", "b", "c"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stored(engine) == ["a", "b", "c"]
+
+
+def test_failed_batch_is_retried(engine, writer, monkeypatch):
+    writer.start()
+    writer.add(denial("a"))
+    write = writer._write
+
+    def failing(rows):
+        raise OSError("database is down")
+
+    monkeypatch.setattr(writer, "_write", failing)
+    assert writer.flush() == 0
+    assert writer.buffered == 1
+
+    monkeypatch.setattr(writer, "_write", write)
+    writer.add(denial("b"))
+    assert writer.flush() == 2
+    assert stored(engine) == ["a", "b"]
+
+
+def test_rejected_batch_is_dead_lettered_and_does_not_block_the_queue(engine, writer, monkeypatch):
+    writer.start()
+    write = writer._write
+
+    def rejecting(rows):
+        if any(row["attempt_id"] == "bad" for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("constraint failed"))
+        write(rows)
+
+    monkeypatch.setattr(writer, "_write", rejecting)
+    writer.add(denial("bad"))
+    assert writer.flush() == 0
+
+    writer.add(denial("a"))
+    assert writer.flush() == 1
+    assert stored(engine) == ["a"]
+    assert writer.buffered == 0
+    [dead] = writer.spill_dir.glob("dead-*.jsonl")
+    assert [_decode(line)["attempt_id"] for line in dead.read_text().splitlines()] == ["bad"]
+    assert list(writer.spill_dir.glob("audit-*.jsonl")) == []
+
+
+def test_batch_failing_too_often_is_dead_lettered(engine, writer, monkeypatch):
+    writer.start()
+    writer.add(denial("a"))
+
+    def failing(rows):
+        raise OSError("database is down")
+
+    monkeypatch.setattr(writer, "_write", failing)
+    for _ in range(writer.max_attempts):
+        assert writer.flush() == 0
+
+    assert writer.buffered == 0
+    assert len(list(writer.spill_dir.glob("dead-*.jsonl"))) == 1
+
+
+def test_recover_inserts_records_left_by_dead_process(engine, writer):
+    writer.spill_dir.mkdir()
+    rows = [denial(attempt_id).model_dump(exclude={"id"}) for attempt_id in "ab"]
+    (writer.spill_dir / "audit-999-0.jsonl").write_text("".join(_encode(row) for row in rows) + '{"attempt')
+    # "a" was committed before the process died
+    writer.add(denial("a"))
+
+    assert writer.recover() == 1
+    assert stored(engine) == ["a", "b"]
+    assert list(writer.spill_dir.glob("*.jsonl")) == []
+
+
+def test_recover_dead_letters_rejected_files_and_keeps_the_rest(engine, writer, monkeypatch):
+    writer.spill_dir.mkdir()
+    for name, attempt_id in (("audit-999-0.jsonl", "bad"), ("audit-999-1.jsonl", "down")):
+        (writer.spill_dir / name).write_text(_encode(denial(attempt_id).model_dump(exclude={"id"})))
+
+    def failing(rows):
+        if rows[0]["attempt_id"] == "bad":
+            raise IntegrityError("INSERT", {}, Exception("constraint failed"))
+        raise OSError("database is down")
+
+    monkeypatch.setattr(writer, "_write", failing)
+    assert writer.recover() == 0
+
+    assert [p.name for p in writer.spill_dir.glob("audit-*.jsonl")] == ["audit-999-1.jsonl"]
+    assert len(list(writer.spill_dir.glob("dead-*.jsonl"))) == 1
+    monkeypatch.undo()
+    assert writer.recover() == 1
+    assert stored(engine) == ["down"]
+
+
+def test_recover_skips_files_of_live_processes(engine, writer):
+    writer.spill_dir.mkdir()
+    live = _SpillFile.create(writer.spill_dir / "audit-1-0.jsonl")
+    live.append(_encode(denial("a").model_dump(exclude={"id"})))
+
+    assert writer.recover() == 0
+    assert stored(engine) == []
+    live.discard()
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import debounce
+from app.debounce import Decision, DecisionCache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    cache = DecisionCache(maxsize=16)
+    monkeypatch.setattr(debounce, "cache", cache)
+    return cache
+
+
+def attempt(calls: list, outcome):
+    async def decide():
+        calls.append(outcome)
+        await asyncio.sleep(0.01)
+        if isinstance(outcome, HTTPException):
+            raise outcome
+        return outcome
+
+    return decide
+
+
+async def submit(
+    decide, *, request_id=None, gate_id="gate-1", credential="token", recent_grant=lambda: None
+):
+    return await debounce.decide_once(
+        employee_id=1,
+        gate_id=gate_id,
+        credential=credential,
+        request_id=request_id,
+        decide=decide,
+        recent_grant=recent_grant,
+    )
+
+
+@pytest.mark.anyio
+async def test_grant_is_replayed_within_window_per_gate():
+    calls = []
+    grant = {"action": "entry"}
+
+    assert await submit(attempt(calls, grant)) == grant
+    replay = await submit(attempt(calls, grant))
+    other_gate = await submit(attempt(calls, grant), gate_id="gate-2")
+
+    assert replay.status_code == 201
+    assert replay.headers[debounce.REPLAYED_HEADER] == "true"
+    assert other_gate == grant
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_grant_is_not_replayed_to_other_credential():
+    calls = []
+    grant = {"action": "entry"}
+    denied = HTTPException(401, "Invalid QR code token.")
+
+    await submit(attempt(calls, grant), request_id="r1")
+    with pytest.raises(HTTPException):
+        await submit(attempt(calls, denied), credential="guessed")
+    with pytest.raises(HTTPException):
+        await submit(attempt(calls, denied), credential="guessed", request_id="r1")
+
+    assert len(calls) == 3
+
+
+@pytest.mark.anyio
+async def test_concurrent_resubmission_waits_for_first_decision():
+    calls = []
+    grant = {"action": "entry"}
+
+    first, second = await asyncio.gather(
+        submit(attempt(calls, grant)), submit(attempt(calls, grant))
+    )
+
+    assert first == grant
+    assert second.status_code == 201
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_denial_is_replayed_only_for_same_request_id():
+    calls = []
+    denied = HTTPException(401, "Face verification failed.")
+
+    with pytest.raises(HTTPException):
+        await submit(attempt(calls, denied), request_id="r1")
+    replay = await submit(attempt(calls, denied), request_id="r1")
+    with pytest.raises(HTTPException):
+        await submit(attempt(calls, denied))
+
+    assert replay.status_code == 401
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_outage_is_not_replayed():
+    calls = []
+    unavailable = HTTPException(503, "Face recognition is temporarily unavailable.")
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await submit(attempt(calls, unavailable), request_id="r1")
+
+    assert len(calls) == 2
+
+
+@pytest.mark.anyio
+async def test_recent_grant_from_database_is_replayed():
+    calls = []
+    stored = Decision(201, {"action": "entry"})
+
+    replay = await submit(attempt(calls, {}), recent_grant=lambda: stored)
+
+    assert replay.status_code == 201
+    assert calls == []
+
+
+def test_expired_decisions_are_dropped(cache):
+    cache.put("key", Decision(201, {}), ttl=-1)
+    cache.put("other", Decision(201, {}), ttl=0.0001)
+
+    assert asyncio.run(cache.get("key")) is None
+    asyncio.run(asyncio.sleep(0.001))
+    assert asyncio.run(cache.get("other")) is None
@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app import settings
+from app.enrollment import EnrollmentError, normalize
+from app.gallery import encode_file
+from app.ingest import IngestedImage
+
+
+def _image(photo: Image.Image, **save_args) -> IngestedImage:
+    buffer = io.BytesIO()
+    photo.save(buffer, format="JPEG", **save_args)
+    return IngestedImage.from_bytes(buffer.getvalue())
+
+
+def test_normalize_applies_exif_orientation_and_downscales(monkeypatch):
+    monkeypatch.setattr(settings, "ENROLLMENT_MAX_SIDE", 400)
+    upright = Image.open(settings.TEST_PHOTOS_DIR / "user_1_2.png").convert("RGB")
+    # Stored sideways with a tag saying to rotate it back, as phones do
+    exif = Image.Exif()
+    exif[0x0112] = 8
+    sideways = upright.resize((600, 450)).transpose(Image.Transpose.ROTATE_270)
+
+    photo = normalize(_image(sideways, exif=exif))
+
+    stored = Image.open(io.BytesIO(photo.data))
+    assert stored.format == "PNG"
+    assert (photo.width, photo.height) == stored.size == (400, 300)
+    reference = encode_file(str(settings.TEST_PHOTOS_DIR / "user_1.png"))
+    assert np.linalg.norm(photo.encoding - reference) <= settings.FACE_MATCH_TOLERANCE
+
+
+def test_normalize_rejects_several_faces():
+    faces = [
+        Image.open(settings.TEST_PHOTOS_DIR / name).convert("RGB").resize((400, 400))
+        for name in ("user_1_2.png", "user_1.png")
+    ]
+    group = Image.new("RGB", (800, 400))
+    group.paste(faces[0], (0, 0))
+    group.paste(faces[1], (400, 0))
+
+    with pytest.raises(EnrollmentError, match="More than one face"):
+        normalize(_image(group))
+
+
+def test_normalize_rejects_small_face_and_unreadable_data(monkeypatch):
+    monkeypatch.setattr(settings, "ENROLLMENT_MIN_FACE_PX", 1000)
+    photo = _image(Image.open(settings.TEST_PHOTOS_DIR / "user_1_2.png").convert("RGB"))
+
+    with pytest.raises(EnrollmentError, match="too small"):
+        normalize(photo)
+    with pytest.raises(EnrollmentError, match="not a readable image"):
+        normalize(IngestedImage.from_bytes(b"not an image"))
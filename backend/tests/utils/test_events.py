@@ -0,0 +1,84 @@
+import pytest
+
+from app.events import EventBus
+from app.invalidation import LocalHub
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_subscribers_receive_published_events():
+    bus = EventBus(history_size=10, client_buffer=10)
+    first = bus.subscribe()
+    second = bus.subscribe()
+
+    bus.publish("gate.granted", employee_id=1)
+
+    for subscription in (first, second):
+        event = await anext(aiter(subscription))
+        assert (event.type, event.data) == ("gate.granted", {"employee_id": 1})
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_disconnected_after_buffer_fills():
+    bus = EventBus(history_size=10, client_buffer=2)
+    subscription = bus.subscribe()
+
+    for i in range(5):
+        bus.publish("presence.changed", employee_id=i)
+
+    received = [event async for event in subscription]
+    assert [e.data["employee_id"] for e in received] == [0, 1]
+    assert subscription.overflowed
+
+
+@pytest.mark.anyio
+async def test_resume_beyond_history_sends_reset():
+    bus = EventBus(history_size=2, client_buffer=10)
+    first = bus.publish("presence.changed", employee_id=1)
+    for i in range(3):
+        bus.publish("presence.changed", employee_id=i)
+
+    subscription = bus.subscribe(first.id)
+
+    event = await anext(aiter(subscription))
+    assert event.type == "reset"
+
+
+@pytest.mark.anyio
+async def test_events_reach_subscribers_of_every_process(session):
+    hub = LocalHub()
+    listener = hub.listen()
+    publisher = EventBus(history_size=10, client_buffer=10, engine=session.get_bind(), transport=hub)
+    other = EventBus(history_size=10, client_buffer=10, engine=session.get_bind(), transport=hub)
+    subscription = other.subscribe()
+
+    first = publisher.publish("gate.granted", employee_id=1)
+    second = publisher.publish("presence.changed", employee_id=1, is_present=True)
+    for payload in listener.wait(1):
+        publisher.receive(payload)
+        other.receive(payload)
+
+    assert (first.id, second.id) == ("shared-1", "shared-2")
+    event = await anext(aiter(subscription))
+    assert (event.id, event.type, event.data) == (first.id, "gate.granted", {"employee_id": 1})
+    # A client resumes on any process with the ids another one gave it
+    resumed = await anext(aiter(other.subscribe(first.id)))
+    assert (resumed.id, resumed.type) == (second.id, "presence.changed")
+
+
+@pytest.mark.anyio
+async def test_resume_from_before_listening_sends_reset(session):
+    hub = LocalHub()
+    bus = EventBus(history_size=10, client_buffer=10, engine=session.get_bind(), transport=hub)
+    first = bus.publish("presence.changed", employee_id=1)
+    bus.publish("presence.changed", employee_id=2)
+    # The listener (re)connected after both events
+    bus._restart_history()
+
+    event = await anext(aiter(bus.subscribe(first.id)))
+
+    assert (event.id, event.type) == ("shared-2", "reset")
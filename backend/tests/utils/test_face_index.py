@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from app import face_index
+from app.face_index import FaceIndex
+
+
+def _gallery(*values):
+    return np.array([np.full(128, v, dtype=np.float32) for v in values]).reshape(-1, 128)
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "face_index"
+
+
+def test_put_and_get(directory):
+    index = FaceIndex(directory)
+
+    assert index.get(1) is None
+    assert index.put(1, _gallery(0.1, 0.2))
+    assert index.put(2, _gallery(0.3))
+
+    np.testing.assert_array_equal(index.get(1), _gallery(0.1, 0.2))
+    np.testing.assert_array_equal(index.get(2), _gallery(0.3))
+    assert index.get(1).dtype == np.float32
+
+
+def test_stored_galleries_are_not_trusted_by_a_new_process(directory):
+    FaceIndex(directory).put(1, _gallery(0.1))
+    index = FaceIndex(directory)
+
+    # E.g. left over from a database that was reset since
+    assert index.get(1) is None
+    assert not index.put(1, _gallery(0.1))
+    np.testing.assert_array_equal(index.get(1), _gallery(0.1))
+
+
+def test_latest_version_wins_across_processes(directory):
+    writer, reader = FaceIndex(directory), FaceIndex(directory)
+    writer.put(1, _gallery(0.1))
+    # Trusted once the reader has checked it against the database
+    assert not reader.put(1, _gallery(0.1))
+    np.testing.assert_array_equal(reader.get(1), _gallery(0.1))
+
+    writer.put(1, _gallery(0.1, 0.5))
+
+    np.testing.assert_array_equal(reader.get(1), _gallery(0.1, 0.5))
+    assert reader.rows == 3
+    assert reader.live == 2
+
+
+def test_unchanged_gallery_is_not_rewritten(directory):
+    index = FaceIndex(directory)
+    index.put(1, _gallery(0.1))
+
+    assert not index.put(1, _gallery(0.1))
+    assert index.rows == 1
+
+
+def test_remove_leaves_tombstone(directory):
+    writer, reader = FaceIndex(directory), FaceIndex(directory)
+    writer.put(1, _gallery(0.1))
+    reader.put(1, _gallery(0.1))
+    writer.remove(1)
+
+    assert reader.get(1).shape == (0, 128)
+    assert reader.live == 0
+    assert not writer.remove(1)
+
+
+def test_compaction_keeps_live_rows(directory, monkeypatch):
+    monkeypatch.setattr(face_index, "_MIN_COMPACT_ROWS", 8)
+    writer, reader = FaceIndex(directory), FaceIndex(directory)
+    for employee_id in range(4):
+        writer.put(employee_id, _gallery(employee_id))
+        reader.put(employee_id, _gallery(employee_id))
+
+    for value in range(1, 6):
+        writer.put(0, _gallery(value / 10))
+    writer.remove(3)
+
+    # Five of nine rows were superseded, so the file was rewritten before
+    # the tombstone was appended
+    assert writer.rows == 5
+    assert sorted(p.name for p in directory.glob("*.emb")) == ["00000002.emb"]
+    np.testing.assert_array_equal(reader.get(0), _gallery(0.5))
+    np.testing.assert_array_equal(reader.get(2), _gallery(2))
+    assert reader.get(3).shape == (0, 128)
+
+
+def test_float16_storage(directory):
+    index = FaceIndex(directory, dtype="float16")
+    index.put(1, _gallery(0.25))
+
+    assert (directory / "00000001.emb").stat().st_size == 128 * 2
+    np.testing.assert_array_equal(index.get(1), _gallery(0.25))
+
+
+def test_evicted_gallery_is_read_again(directory):
+    index = FaceIndex(directory)
+    index.put(1, _gallery(0.1))
+    index.put(2, _gallery(0.2))
+
+    index.evict("1")
+    assert index.get(1) is None
+    assert index.get(2) is not None
+
+    index.clear()
+    assert index.get(2) is None
+    index.put(2, _gallery(0.2))
+    assert index.get(2) is not None
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import crud, gallery, settings
+from app.face_index import FaceIndex
+from app.utils.face import FaceMatch
+from tests.factories import EmployeeFactory
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def employee(session):
+    employee = crud.create_employee(session=session, employee=EmployeeFactory.build())
+    gallery.enroll(session, employee.id, np.zeros(128))
+    return employee
+
+
+def _age_templates(session, employee_id, seconds):
+    for template in crud.list_face_templates(session=session, employee_id=employee_id):
+        template.created_at -= timedelta(seconds=seconds)
+        session.add(template)
+    session.commit()
+
+
+def test_learn_adds_confident_match(session, employee):
+    _age_templates(session, employee.id, settings.FACE_GALLERY_UPDATE_INTERVAL)
+
+    assert gallery.learn(session, employee.id, FaceMatch(distance=0.2, encoding=np.ones(128)))
+
+    templates = crud.list_face_templates(session=session, employee_id=employee.id)
+    assert [t.source for t in templates] == ["enrollment", "gate"]
+    assert templates[1].quality == pytest.approx(0.8)
+    assert gallery.to_array(templates).shape == (2, 128)
+
+
+def test_learn_skips_weak_or_recent_matches(session, employee):
+    assert not gallery.learn(session, employee.id, FaceMatch(distance=0.2, encoding=np.ones(128)))
+
+    _age_templates(session, employee.id, settings.FACE_GALLERY_UPDATE_INTERVAL)
+    weak = settings.FACE_GALLERY_UPDATE_DISTANCE + 0.05
+    assert not gallery.learn(session, employee.id, FaceMatch(distance=weak, encoding=np.ones(128)))
+    assert len(crud.list_face_templates(session=session, employee_id=employee.id)) == 1
+
+
+def test_full_gallery_drops_oldest_gate_template(session, employee):
+    for i in range(settings.FACE_GALLERY_SIZE + 2):
+        _age_templates(session, employee.id, settings.FACE_GALLERY_UPDATE_INTERVAL)
+        assert gallery.learn(session, employee.id, FaceMatch(distance=0.1, encoding=np.full(128, i)))
+
+    templates = crud.list_face_templates(session=session, employee_id=employee.id)
+    encodings = gallery.to_array(templates)
+    assert len(templates) == settings.FACE_GALLERY_SIZE
+    assert templates[0].source == "enrollment"
+    assert encodings[1:, 0].tolist() == [3, 4, 5, 6]
+
+
+def test_enroll_starts_gallery_over(session, employee):
+    crud.add_face_template(
+        session=session,
+        template=gallery._template(employee.id, np.ones(128), quality=0.9, source="gate"),
+        max_size=settings.FACE_GALLERY_SIZE,
+    )
+
+    gallery.enroll(session, employee.id, np.full(128, 2))
+
+    templates = crud.list_face_templates(session=session, employee_id=employee.id)
+    assert [t.source for t in templates] == ["enrollment"]
+    assert gallery.to_array(templates)[0, 0] == 2
+
+
+@pytest.mark.anyio
+async def test_load_reads_from_index(session, employee, tmp_path, monkeypatch):
+    monkeypatch.setattr(gallery, "index", FaceIndex(tmp_path / "face_index"))
+    gallery.enroll(session, employee.id, np.full(128, 3))
+
+    # The database is not consulted while the index has the gallery
+    monkeypatch.setattr(crud, "list_face_templates", lambda **kwargs: pytest.fail("read the database"))
+    templates = await gallery.load(session, employee)
+
+    assert templates.shape == (1, 128)
+    assert templates[0, 0] == 3
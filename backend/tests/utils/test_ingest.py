@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from app.ingest import IngestedImage, read_image_upload
+
+
+@pytest.fixture
+def anyio_backend():
+    # UploadFile.read goes through the thread pool; exercise it on asyncio only
+    return "asyncio"
+
+
+def _png_upload(width: int, height: int) -> UploadFile:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color="white").save(buffer, format="PNG")
+    buffer.seek(0)
+    return UploadFile(file=buffer, filename="frame.png")
+
+
+@pytest.mark.anyio
+async def test_read_image_upload_reads_dimensions():
+    image = await read_image_upload(_png_upload(64, 32))
+
+    assert (image.width, image.height) == (64, 32)
+    assert image.data.startswith(b"\x89PNG")
+
+
+@pytest.mark.anyio
+async def test_read_image_upload_rejects_too_many_bytes():
+    with pytest.raises(HTTPException) as excinfo:
+        await read_image_upload(_png_upload(64, 64), max_bytes=10)
+
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.anyio
+async def test_read_image_upload_rejects_too_many_pixels():
+    with pytest.raises(HTTPException) as excinfo:
+        await read_image_upload(_png_upload(200, 200), max_pixels=100 * 100)
+
+    assert excinfo.value.status_code == 413
+
+
+def test_ingested_image_decodes_at_reduced_resolution(monkeypatch):
+    monkeypatch.setattr("app.settings.FRAME_DECODE_TARGET_SIDE", 100)
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 200), color="white").save(buffer, format="PNG")
+
+    image = IngestedImage.from_bytes(buffer.getvalue())
+    frame = image.decode()
+
+    assert image.reduction == 4
+    assert frame.shape[:2] == (50, 100)
+
+
+def test_ingested_image_without_data_decodes_to_none():
+    assert IngestedImage(data=b"").decode() is None
@@ -0,0 +1,170 @@
+import os
+import time
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, invalidation
+from app.invalidation import Invalidator, LocalHub, PostgresTransport
+from app.models import CacheVersion
+from app.schemas import EmployeeUpdate
+from tests.factories import EmployeeFactory
+
+
+class RecordingCache:
+    def __init__(self):
+        self.evicted: list[str] = []
+        self.cleared = 0
+
+    def evict(self, key: str) -> None:
+        self.evicted.append(key)
+
+    def clear(self) -> None:
+        self.cleared += 1
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A file database, so that the listener threads see the same data
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def replicas(engine):
+    """Two invalidators sharing a database and a notification hub."""
+    hub = LocalHub()
+    created = []
+    for _ in range(2):
+        invalidator = Invalidator(engine, hub, check_interval=60)
+        cache = RecordingCache()
+        invalidator.register("employee", evict=cache.evict, clear=cache.clear)
+        created.append((invalidator, cache))
+    yield created
+    for invalidator, _ in created:
+        invalidator.close()
+
+
+def test_commit_evicts_in_every_replica(engine, replicas):
+    (first, first_cache), (second, second_cache) = replicas
+    second.start()
+    assert wait_for(lambda: second._seen.get("employee") == 0)
+
+    with Session(engine) as session:
+        first.mark(session, "employee", 7)
+        session.commit()
+
+    # Locally right after commit, elsewhere once the notification arrives
+    assert first_cache.evicted == ["7"]
+    assert wait_for(lambda: second_cache.evicted == ["7"])
+    assert second._seen["employee"] == 1
+    assert second_cache.cleared == 0
+
+
+def test_rollback_evicts_nothing(engine, replicas):
+    (first, first_cache), _ = replicas
+    with Session(engine) as session:
+        session.add(CacheVersion(entity="other"))
+        first.mark(session, "employee", 7)
+        session.rollback()
+        session.commit()
+
+    assert first_cache.evicted == []
+    with Session(engine) as session:
+        assert session.get(CacheVersion, "employee") is None
+
+
+def test_uncached_entities_are_not_versioned(engine, replicas):
+    (first, first_cache), _ = replicas
+    hub = first.transport
+    listener = hub.listen()
+
+    with Session(engine) as session:
+        first.mark(session, "qr_code", 7)
+        session.commit()
+
+    assert listener.wait(0) == []
+    assert first_cache.evicted == []
+    with Session(engine) as session:
+        assert session.get(CacheVersion, "qr_code") is None
+
+
+def test_version_check_clears_after_missed_notification(engine, replicas):
+    (first, _), (second, second_cache) = replicas
+    second.seed()
+    second.check_versions()
+
+    with Session(engine) as session:
+        first.mark(session, "employee", 7)
+        session.commit()
+
+    # second is not listening, so only the version check notices the change
+    second.check_versions()
+    assert second_cache.evicted == []
+    assert second_cache.cleared == 1
+
+    second.check_versions()
+    assert second_cache.cleared == 1
+
+
+def test_large_batches_clear_the_entity(engine, replicas):
+    (first, _), (second, second_cache) = replicas
+    second.start()
+    assert wait_for(lambda: "employee" in second._seen)
+
+    with Session(engine) as session:
+        for key in range(invalidation.MAX_KEYS_PER_MESSAGE + 1):
+            first.mark(session, "employee", key)
+        session.commit()
+
+    assert wait_for(lambda: second_cache.cleared == 1)
+    assert second_cache.evicted == []
+
+
+def test_crud_update_marks_employee(session, monkeypatch):
+    cache = RecordingCache()
+    monkeypatch.setitem(invalidation.invalidator._handlers, "employee", [(cache.evict, cache.clear)])
+    employee = EmployeeFactory.build()
+    employee = crud.create_employee(session=session, employee=employee)
+    cache.evicted.clear()
+
+    crud.update_employee(session=session, employee_id=employee.id, employee_in=EmployeeUpdate(first_name="Ewa"))
+
+    assert cache.evicted == [str(employee.id)]
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"),
+    reason="set TEST_POSTGRES_URL to a scratch Postgres database to run",
+)
+def test_postgres_notify_reaches_other_process():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    SQLModel.metadata.create_all(engine)
+    transport = PostgresTransport(engine, "cache_invalidation_test")
+    first = Invalidator(engine, transport, check_interval=60)
+    second = Invalidator(engine, transport, check_interval=60)
+    cache = RecordingCache()
+    first.register("employee", evict=RecordingCache().evict, clear=RecordingCache().clear)
+    second.register("employee", evict=cache.evict, clear=cache.clear)
+    try:
+        second.start()
+        assert wait_for(lambda: "employee" in second._seen)
+        with Session(engine) as session:
+            first.mark(session, "employee", 7)
+            session.commit()
+        assert wait_for(lambda: cache.evicted == ["7"])
+    finally:
+        first.close()
+        second.close()
+        engine.dispose()
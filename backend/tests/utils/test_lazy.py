@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from app.lazy import LazyModule, lazy_module
+from app.settings import BASE_DIR
+
+
+def test_lazy_module_imports_on_first_attribute_access():
+    sys.modules.pop("colorsys", None)
+    module = lazy_module("colorsys")
+
+    assert isinstance(module, LazyModule)
+    assert "colorsys" not in sys.modules
+    assert module.rgb_to_hsv(1, 0, 0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+
+
+def test_lazy_module_returns_already_imported_module():
+    assert lazy_module("os") is os
+
+
+def test_app_import_does_not_load_recognition_stack():
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('cv2', 'numpy', 'face_recognition', 'reportlab', 'fastapi_mail') "
+        "if m in sys.modules))"
+    )
+    env = {**os.environ, "DATABASE_URL": "sqlite://", "TESTING": "true"}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
@@ -0,0 +1,154 @@
+import gzip
+import os
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlmodel import Session
+
+from app import partitions
+from app.models import Employee, EntryExitRecord
+from app.partitions import PartitionMaintainer
+
+
+def test_month_arithmetic():
+    assert partitions._month(date(2026, 11, 17), 2) == date(2027, 1, 1)
+    assert partitions._month(date(2026, 1, 31), -1) == date(2025, 12, 1)
+    assert partitions.partition_name("entryexitrecord", date(2026, 3, 1)) == "entryexitrecord_y2026m03"
+
+
+def test_partitioned_ddl_includes_partition_key():
+    ddl = {t.name: str(CreateTable(t).compile(dialect=postgresql.dialect())) for t in partitions._partitioned_tables()}
+
+    assert "PRIMARY KEY (id, timestamp)" in ddl["entryexitrecord"]
+    assert "PARTITION BY RANGE (timestamp)" in ddl["entryexitrecord"]
+    assert "id SERIAL" in ddl["entryexitrecord"]
+    assert "PARTITION BY RANGE (entry_time)" in ddl["worktimerecord"]
+    # The models themselves keep their single-column keys
+    assert [c.name for c in EntryExitRecord.__table__.primary_key] == ["id"]
+
+
+def test_sqlite_falls_back_to_plain_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+    partitions.create_tables(engine)
+    maintainer = PartitionMaintainer(
+        engine, months_ahead=3, retention_months=1, archive_dir=tmp_path / "archive", interval=60
+    )
+
+    assert "entryexitrecord" in inspect(engine).get_table_names()
+    assert maintainer.run() == ([], [])
+    assert not (tmp_path / "archive").exists()
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"),
+    reason="set TEST_POSTGRES_URL to a scratch Postgres database to run",
+)
+def test_postgres_partitions_and_archival(tmp_path):
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS entryexitrecord, worktimerecord CASCADE"))
+    partitions.create_tables(engine)
+    maintainer = PartitionMaintainer(
+        engine, months_ahead=1, retention_months=2, archive_dir=tmp_path, interval=60
+    )
+    try:
+        with Session(engine) as session:
+            employee = Employee(email="partitions@example.com", first_name="Jan", last_name="Nowak")
+            session.add(employee)
+            session.commit()
+            # Lands in the default partition, then moves into its month
+            session.add(EntryExitRecord(employee_id=employee.id, timestamp=datetime(2026, 1, 15), successful=True))
+            session.commit()
+
+        created, _ = maintainer.run(today=date(2026, 1, 20))
+        assert created == [
+            "entryexitrecord_y2026m01", "entryexitrecord_y2026m02",
+            "worktimerecord_y2026m01", "worktimerecord_y2026m02",
+        ]
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM entryexitrecord_y2026m01")).scalar() == 1
+
+        _, archived = maintainer.run(today=date(2026, 4, 1))
+        assert [p.name for p in archived] == ["entryexitrecord_y2026m01.csv.gz", "worktimerecord_y2026m01.csv.gz"]
+        with gzip.open(archived[0], "rt") as f:
+            assert len(f.read().splitlines()) == 2
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM entryexitrecord")).scalar() == 0
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS entryexitrecord, worktimerecord CASCADE"))
+            connection.execute(text("DELETE FROM employee WHERE email = 'partitions@example.com'"))
+        engine.dispose()
+
+
+def _columns_and_indexes(engine):
+    inspector = inspect(engine)
+    return (
+        {c["name"] for c in inspector.get_columns("employee")},
+        {c["name"] for c in inspector.get_columns("entryexitrecord")},
+        {i["name"] for i in inspector.get_indexes("entryexitrecord")},
+    )
+
+
+def test_create_tables_adds_columns_missing_from_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    # Tables as created before open_entry_id, attempt_id and gate_id existed
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE employee (id INTEGER NOT NULL PRIMARY KEY, email VARCHAR NOT NULL UNIQUE, "
+            "first_name VARCHAR NOT NULL, last_name VARCHAR NOT NULL, photo_path VARCHAR, "
+            "is_present BOOLEAN NOT NULL)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE entryexitrecord (id INTEGER NOT NULL PRIMARY KEY, "
+            "employee_id INTEGER NOT NULL REFERENCES employee (id), timestamp DATETIME NOT NULL, "
+            "successful BOOLEAN NOT NULL, denial_reason VARCHAR, is_entry BOOLEAN)"
+        ))
+        connection.execute(text(
+            "INSERT INTO employee (id, email, first_name, last_name, is_present) "
+            "VALUES (1, 'old@example.com', 'Jan', 'Nowak', 0)"
+        ))
+
+    partitions.create_tables(engine)
+    partitions.create_tables(engine)
+
+    employee_columns, record_columns, record_indexes = _columns_and_indexes(engine)
+    assert "open_entry_id" in employee_columns
+    assert {"attempt_id", "gate_id"} <= record_columns
+    assert "ix_entryexitrecord_attempt_id" in record_indexes
+    with Session(engine) as session:
+        session.add(EntryExitRecord(
+            employee_id=1, timestamp=datetime(2026, 1, 15), successful=True, attempt_id="a1", gate_id="g1"
+        ))
+        session.commit()
+        assert session.get(Employee, 1).open_entry_id is None
+        assert session.get(EntryExitRecord, 1).attempt_id == "a1"
+    engine.dispose()
+
+
+@pytest.mark.skipif(
+    not os.getenv("TEST_POSTGRES_URL"),
+    reason="set TEST_POSTGRES_URL to a scratch Postgres database to run",
+)
+def test_postgres_create_tables_adds_missing_columns():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    partitions.create_tables(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE employee DROP COLUMN open_entry_id"))
+        connection.execute(text("ALTER TABLE entryexitrecord DROP COLUMN attempt_id, DROP COLUMN gate_id"))
+    try:
+        partitions.create_tables(engine)
+        partitions.create_tables(engine)
+
+        employee_columns, record_columns, _ = _columns_and_indexes(engine)
+        assert "open_entry_id" in employee_columns
+        assert {"attempt_id", "gate_id"} <= record_columns
+        with engine.connect() as connection:
+            assert connection.execute(
+                text("SELECT 1 FROM pg_indexes WHERE indexname = 'ix_entryexitrecord_attempt_id'")
+            ).first() is not None
+    finally:
+        engine.dispose()
@@ -28,7 +28,7 @@ async def test_send_report_email_uses_fastmail(monkeypatch):
         async def send_message(self, message):
             sent["message"] = message
 
-    monkeypatch.setattr("app.utils.FastMail", DummyFastMail)
+    monkeypatch.setattr("app.utils.mail.fastapi_mail.FastMail", DummyFastMail)
 
     pdf_content = b"%PDF-1.4 dummy"
     await send_report_email("admin@example.com", pdf_content, days=3)
@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import tracing
+
+
+@pytest.fixture
+def exporter():
+    previous = tracing.get_exporter()
+    ring = tracing.RingBufferExporter(maxlen=100)
+    tracing.set_exporter(ring)
+    yield ring
+    tracing.set_exporter(previous)
+
+
+def test_child_spans_share_trace_and_parent(exporter):
+    @tracing.traced("child.call")
+    def child():
+        return 42
+
+    with tracing.span("root", **{"entry_exit_record.id": 7}) as root:
+        assert child() == 42
+
+    child_span, root_span = exporter.spans
+    assert child_span.name == "child.call"
+    assert child_span.trace_id == root.trace_id
+    assert child_span.parent_id == root.span_id
+    assert root_span.parent_id is None
+    assert len(exporter.find_traces("entry_exit_record.id", 7)) == 2
+
+
+def test_traced_without_active_trace_records_nothing(exporter):
+    @tracing.traced()
+    def work():
+        return "done"
+
+    assert work() == "done"
+    assert len(exporter.spans) == 0
+
+
+def test_unsampled_trace_records_nothing(exporter, monkeypatch):
+    monkeypatch.setattr("app.settings.TRACE_SAMPLE_RATE", 0.0)
+
+    with tracing.span("root") as root:
+        with tracing.span("child") as child:
+            pass
+
+    assert root is None and child is None
+    assert len(exporter.spans) == 0
+
+
+def test_propagate_continues_trace_in_thread_pool(exporter):
+    def work():
+        with tracing.span("pool.work", root=False) as s:
+            return s
+
+    with tracing.span("root") as root:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pooled = pool.submit(tracing.propagate(work)).result()
+
+    assert pooled is not None
+    assert pooled.trace_id == root.trace_id
+    assert pooled.parent_id == root.span_id
+
+
+def test_carrier_continues_trace_across_processes(exporter):
+    with tracing.span("root") as root:
+        carrier = tracing.inject()
+
+    with tracing.span("remote.work", carrier=carrier) as remote:
+        pass
+
+    assert remote.trace_id == root.trace_id
+    assert remote.parent_id == root.span_id
+
+
+def test_collected_spans_are_recorded_by_the_caller(exporter):
+    with tracing.span("root") as root:
+        carrier = tracing.inject()
+
+        with tracing.collect_spans() as collected:
+            with tracing.span("remote.work", carrier=carrier):
+                with tracing.span("remote.stage", root=False):
+                    pass
+        assert len(exporter.spans) == 0
+
+        tracing.record_spans([span.to_dict() for span in collected])
+
+    stage, work, root_span = exporter.spans
+    assert (stage.name, work.name) == ("remote.stage", "remote.work")
+    assert work.parent_id == root.span_id
+    assert stage.parent_id == work.span_id
+    assert {s.trace_id for s in exporter.spans} == {root.trace_id}
+
+
+def test_span_records_errors(exporter):
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+
+    assert "boom" in exporter.spans[0].error
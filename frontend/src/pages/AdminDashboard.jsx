@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate, Link } from 'react-router-dom';
-import { employeesApi, authApi, entriesApi } from '../services/api';
+import { employeesApi, authApi, entriesApi, eventsApi } from '../services/api';
 
 const AdminDashboard = () => {
   const [employees, setEmployees] = useState([]);
@@ -26,6 +26,20 @@ const AdminDashboard = () => {
     loadEmployees();
   }, [navigate]);
 
+  // Obecność na żywo ze strumienia zdarzeń zamiast odpytywania całej listy
+  useEffect(() => {
+    if (!localStorage.getItem('adminLoggedIn')) return;
+    return eventsApi.subscribe({
+      'presence.changed': ({ employee_id, is_present }) => {
+        setEmployees(current => current.map(e => (
+          e.id === employee_id ? { ...e, is_present } : e
+        )));
+      },
+      // Serwer nie ma już pominiętych zdarzeń - pełne przeładowanie
+      reset: () => loadEmployees(),
+    });
+  }, []);
+
   const loadEmployees = async () => {
     setIsLoading(true);
     setError('');
@@ -282,7 +296,10 @@ const AdminDashboard = () => {
                     {employee.first_name} {employee.last_name}
                   </h3>
                   <p className="text-sm text-slate-400">{employee.email}</p>
-                  <p className="text-xs text-slate-500 mb-4">ID: {employee.id}</p>
+                  <p className="text-xs text-slate-500">ID: {employee.id}</p>
+                  <p className={`text-xs mb-4 ${employee.is_present ? 'text-emerald-400' : 'text-slate-500'}`}>
+                    {employee.is_present ? 'Obecny' : 'Nieobecny'}
+                  </p>
                   
                   {/* Actions */}
                   <div className="space-y-2">
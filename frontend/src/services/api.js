@@ -153,8 +153,25 @@ export const entriesApi = {
   },
 };
 
+// ============ EVENTS ============
+
+export const eventsApi = {
+  // Subskrypcja strumienia zdarzeń bramki (SSE); EventSource sam wznawia
+  // połączenie z nagłówkiem Last-Event-ID. Zwraca funkcję zamykającą.
+  subscribe: (handlers) => {
+    const source = new EventSource(`${API_BASE_URL}/api/events/stream`, {
+      withCredentials: true,
+    });
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data)));
+    });
+    return () => source.close();
+  },
+};
+
 export default {
   auth: authApi,
   employees: employeesApi,
   entries: entriesApi,
+  events: eventsApi,
 };